@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Measurement, Filtering and Figure-Rendering Hot Paths
+
+Runs fixed, seeded synthetic workloads and reports one JSON document of
+metrics, so two runs on the same machine can be compared:
+
+    filter     outlier rejection + median (outlier_filter.burst_median)
+               over FILTER_BURSTS bursts for each N of the averaging
+               panel in create_accuracy_chart(), in bursts/s
+    pipeline   durations to water level for FLEET_STATIONS stations
+               (measurement.process_in_batches on uint16 durations as
+               stored in telemetry logs), in bursts/s
+    render     every create_* function in a fresh process: best wall
+               time of the renders and the peak RSS growth over the
+               imported modules while rendering (Linux resets the peak
+               through /proc), with output going to a scratch directory
+
+Timings are the best of --repeat (--render-repeat for figures) runs.
+--save writes the results; --baseline compares against a saved run and
+exits with status 1 when a metric is worse than the baseline by more
+than --tolerance, a figure fails to render, or a baseline metric of the
+suites being run is missing:
+
+    python benchmarks.py --save baseline.json
+    python benchmarks.py --baseline baseline.json
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from measurement import (MULTISHOT_SAMPLES, echo_distance, process_in_batches,
+                         simulate_durations)
+from outlier_filter import burst_median
+
+SUITES = ('filter', 'pipeline', 'render')
+FILTER_BURSTS = 200_000
+FLEET_STATIONS = 1_000_000
+SEED = 2024
+DEFAULT_REPEAT = 5
+RENDER_REPEAT = 3
+DEFAULT_TOLERANCE = 0.15
+
+
+def _best_time(func, repeat):
+    func()                                          # warm up
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _metric(value, unit, better):
+    """One result; value None marks a benchmark that failed"""
+    return {'value': None if value is None else float(value), 'unit': unit, 'better': better}
+
+
+def bench_filter(repeat, bursts=FILTER_BURSTS):
+    """Filtered-median throughput for each burst size of the averaging panel"""
+    results = {}
+    for n in MULTISHOT_SAMPLES:
+        durations, temperature, _, _ = simulate_durations(bursts, n, SEED)
+        samples = echo_distance(durations, temperature)
+        elapsed = _best_time(lambda: burst_median(samples), repeat)
+        results[f'filter/N={n}'] = _metric(bursts / elapsed, 'bursts/s', 'higher')
+    return results
+
+
+def bench_pipeline(repeat, stations=FLEET_STATIONS):
+    """End-to-end water level throughput over a fleet of stations"""
+    durations, temperature, height, _ = simulate_durations(stations, seed=SEED)
+    durations = np.rint(durations).astype(np.uint16)
+    elapsed = _best_time(lambda: process_in_batches(durations, temperature, height), repeat)
+    return {'pipeline/fleet': _metric(stations / elapsed, 'bursts/s', 'higher')}
+
+
+def _render_worker(module_name, func_name, output_dir, repeat):
+    """Render one figure repeatedly in this (fresh) process
+
+    Returns (best time, peak RSS growth in MB, error traceback or None).
+    """
+    import figure_settings
+    from build_figures import render_figure
+    from render_profile import reset_peak_rss, rss_mb
+
+    figure_settings.set_images_dir(output_dir)
+    importlib.import_module(module_name)
+    resettable = reset_peak_rss()
+    before = rss_mb('VmRSS') if resettable else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    best, error = float('inf'), None
+    with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+        for _ in range(repeat):
+            _, elapsed, _, error = render_figure(module_name, func_name)
+            if error:
+                break
+            best = min(best, elapsed)
+    if resettable:
+        return best, rss_mb('VmHWM') - before, error
+    # Without a resettable peak, growth past the import peak is the best
+    # available; ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 << 20 if sys.platform == 'darwin' else 1 << 10
+    return best, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / scale, error
+
+
+def bench_render(repeat, figures=None):
+    """Render time and peak memory of every figure, one fresh process each"""
+    from build_figures import discover_figures
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as output_dir:
+        for module_name, func_name in discover_figures():
+            if figures and func_name not in figures:
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                best, peak_mb, error = pool.submit(
+                    _render_worker, module_name, func_name, output_dir, repeat).result()
+            if error:
+                # Kept with no value, so a broken figure counts as a regression
+                print(f'{func_name} failed:\n{error}', file=sys.stderr)
+                best = peak_mb = None
+            results[f'render/{func_name}/time'] = _metric(best, 's', 'lower')
+            results[f'render/{func_name}/peak_memory'] = _metric(peak_mb, 'MB', 'lower')
+    return results
+
+
+def environment():
+    """Where and on what the results were measured"""
+    import matplotlib
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'matplotlib': matplotlib.__version__,
+        'machine': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Rows of (metric, baseline, current, relative change, regressed)
+
+    The change is signed so that positive is always an improvement. A
+    failed benchmark (current None) and a baseline metric missing from
+    results are regressions.
+    """
+    rows = []
+    for name, metric in results.items():
+        base = baseline.get(name)
+        base_value = base['value'] if base is not None else None
+        if metric['value'] is None:
+            rows.append((name, base_value, None, None, True))
+            continue
+        if not base_value:
+            rows.append((name, None, metric['value'], None, False))
+            continue
+        change = metric['value'] / base['value'] - 1
+        if metric['better'] == 'lower':
+            change = -change
+        rows.append((name, base['value'], metric['value'], change, change < -tolerance))
+    for name in sorted(baseline.keys() - results.keys()):
+        rows.append((name, baseline[name]['value'], None, None, True))
+    return rows
+
+
+def _in_run(name, suites, figures):
+    """True if metric name belongs to the suites (and figures) being run"""
+    suite, _, rest = name.partition('/')
+    if suite not in suites:
+        return False
+    return suite != 'render' or not figures or rest.split('/')[0] in figures
+
+
+def run(suites=SUITES, repeat=DEFAULT_REPEAT, render_repeat=RENDER_REPEAT, figures=None):
+    """Run the chosen suites and return {'environment': ..., 'results': ...}"""
+    results = {}
+    if 'filter' in suites:
+        results.update(bench_filter(repeat))
+    if 'pipeline' in suites:
+        results.update(bench_pipeline(repeat))
+    if 'render' in suites:
+        results.update(bench_render(render_repeat, figures))
+    return {'environment': environment(), 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--suites', default=','.join(SUITES))
+    parser.add_argument('--figures', nargs='*', default=None,
+                        help='create_* functions to render (default: all)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--render-repeat', type=int, default=RENDER_REPEAT)
+    parser.add_argument('--save', default=None, help='write the results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed relative slowdown before a metric counts as a regression')
+    args = parser.parse_args()
+
+    suites = [s for s in args.suites.split(',') if s]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+    report = run(suites, args.repeat, args.render_repeat, args.figures)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        baseline = {name: metric for name, metric in baseline.items()
+                    if _in_run(name, suites, args.figures)}
+    rows = compare(report['results'], baseline, args.tolerance)
+    print(f"{'Metric':<48}{'Baseline':>12}{'Current':>12}  {'Unit':<9}{'Change':>8}")
+    print('-' * 89)
+    for name, base, value, change, regressed in rows:
+        unit = (report['results'].get(name) or baseline[name])['unit']
+        base_text = '' if base is None else f'{base:.4g}'
+        if value is not None:
+            value_text = f'{value:.4g}'
+        else:
+            value_text = 'failed' if name in report['results'] else 'missing'
+        change_text = '' if change is None else f'{change:+.1%}'
+        flag = '  REGRESSED' if regressed else ''
+        print(f'{name:<48}{base_text:>12}{value_text:>12}  {unit:<9}{change_text:>8}{flag}')
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f'\n{len(regressions)} regression(s): slower than {args.tolerance:.0%}, failed or missing',
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
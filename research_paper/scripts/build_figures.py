@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Build All Research Paper Figures in Parallel
+
+Finds every create_* function in the generate_*.py scripts and renders
+them concurrently in a process pool (one worker per core by default).
+Figures whose cache key is unchanged since the last build are skipped,
+except with --profile, which renders everything.
+
+Figures are found by parsing the scripts, and the scripts load pyplot
+lazily, so listing figures or a build with nothing to do only imports
+what the cache keys need. A single stale figure (or -j 1) renders in
+this process rather than a pool. --serve keeps one warm interpreter:
+each line read from stdin names the figures to build (empty for all),
+and scripts edited since the previous line are reloaded first, along
+with every script that imports them; watch_figures.py does the same
+whenever a script or data file changes. build_figures.py and
+watch_figures.py themselves are not reloaded.
+"""
+
+import argparse
+import ast
+import graphlib
+import importlib
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+import figure_cache
+import figure_settings
+
+
+def discover_figures():
+    """Return (module_name, function_name) for every create_* figure function
+
+    The scripts are parsed, not imported.
+    """
+    figures = []
+    for script in sorted(SCRIPTS_DIR.glob('generate_*.py')):
+        tree = ast.parse(script.read_text(encoding='utf-8'), str(script))
+        names = sorted(node.name for node in tree.body
+                       if isinstance(node, ast.FunctionDef) and node.name.startswith('create_'))
+        figures.extend((script.stem, name) for name in names)
+    return figures
+
+
+def select_figures(names=None, figures=None):
+    """The discovered figures restricted to names (all if empty)"""
+    figures = discover_figures() if figures is None else figures
+    if not names:
+        return figures
+    unknown = set(names) - {func_name for _, func_name in figures}
+    if unknown:
+        raise ValueError(f"unknown figure(s): {', '.join(sorted(unknown))}")
+    return [f for f in figures if f[1] in names]
+
+
+def render_figure(module_name, func_name):
+    """Render one figure in the current process
+
+    Returns (name, wall time, written paths, error traceback or None);
+    the create_* functions return the paths save_figure wrote.
+    """
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    try:
+        module = importlib.import_module(module_name)
+        func = getattr(module, func_name)
+        if figure_settings.profile_dir():
+            import render_profile
+
+            with render_profile.profiling(func_name, module):
+                outputs = func()
+        else:
+            outputs = func()
+    except Exception:
+        return func_name, time.perf_counter() - start, [], traceback.format_exc()
+    finally:
+        plt.close('all')
+    return func_name, time.perf_counter() - start, list(outputs or []), None
+
+
+def build(figures, jobs=None):
+    """Render figures and return their render_figure results
+
+    One figure, or a single job, renders in this process; more use a
+    process pool.
+    """
+    jobs = jobs or os.cpu_count()
+    if jobs == 1 or len(figures) <= 1:
+        return [render_figure(*figure) for figure in figures]
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(render_figure, module_name, func_name)
+                   for module_name, func_name in figures]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return results
+
+
+def build_stale(figures, force=False, jobs=None):
+    """Render the figures whose cache key changed and update the manifest
+
+    Returns (render_figure results, names of up-to-date figures, wall time).
+    """
+    # Through the module, so a reloaded figure_cache takes effect
+    settings = figure_cache.render_settings()
+    keys = {func_name: figure_cache.figure_key(
+                getattr(importlib.import_module(module_name), func_name), settings)
+            for module_name, func_name in figures}
+    cache = figure_cache.FigureCache(figure_settings.images_dir() / figure_cache.MANIFEST_NAME)
+
+    # A profiling run has to render, so it ignores the cache like --force
+    force = force or figure_settings.profile_dir() is not None
+    stale = [f for f in figures if force or not cache.is_fresh(f[1], keys[f[1]])]
+
+    start = time.perf_counter()
+    results = build(stale, jobs) if stale else []
+    total = time.perf_counter() - start
+
+    for func_name, _, outputs, error in results:
+        if error:
+            cache.forget(func_name)
+        else:
+            cache.record(func_name, keys[func_name], outputs)
+    cache.save()
+    return results, [f[1] for f in figures if f not in stale], total
+
+
+def script_mtimes():
+    return {path.stem: path.stat().st_mtime_ns for path in SCRIPTS_DIR.glob('*.py')}
+
+
+def script_imports(name):
+    """Modules a script imports at module level, i.e. outside function bodies"""
+    path = SCRIPTS_DIR / f'{name}.py'
+    pending = list(ast.parse(path.read_text(encoding='utf-8'), str(path)).body)
+    imported = set()
+    while pending:
+        node = pending.pop()
+        if isinstance(node, ast.Import):
+            imported.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.module and not node.level:
+                imported.add(node.module)
+        elif not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            pending.extend(ast.iter_child_nodes(node))
+    return imported
+
+
+def reload_changed(mtimes):
+    """Reload loaded scripts modified since mtimes were taken; returns current mtimes
+
+    Every loaded script that imports a modified one, directly or through
+    other scripts, is reloaded as well, dependencies first, so names
+    bound by `from helper import ...` point at the new code. This module
+    and the scripts that import it (watch_figures) are left alone.
+    """
+    current = script_mtimes()
+    loaded = [name for name in sorted(current) if name in sys.modules and name != __name__]
+    imports = {name: script_imports(name) & current.keys() for name in loaded}
+    loaded = [name for name in loaded if __name__ not in imports[name]]
+    stale = {name for name in loaded if current[name] != mtimes.get(name)}
+    while True:
+        dependents = {name for name in loaded if imports[name] & stale} - stale
+        if not dependents:
+            break
+        stale |= dependents
+    order = graphlib.TopologicalSorter({name: imports[name] & stale for name in sorted(stale)})
+    for name in order.static_order():
+        importlib.reload(sys.modules[name])
+    return current
+
+
+def report(results, up_to_date, total):
+    """Print the build table; returns the number of failed figures"""
+    for func_name in up_to_date:
+        print(f'{func_name}: up to date')
+    print()
+    print(f"{'Figure':<32}{'Time (s)':>10}  Status")
+    print('-' * 50)
+    for func_name, elapsed, _, error in sorted(results, key=lambda r: -r[1]):
+        print(f"{func_name:<32}{elapsed:>10.2f}  {'FAILED' if error else 'ok'}")
+    print('-' * 50)
+    print(f"{'Total wall time':<32}{total:>10.2f}")
+
+    failures = [r for r in results if r[3]]
+    for func_name, _, _, error in failures:
+        print(f'\n{func_name} failed:\n{error}', file=sys.stderr)
+    return len(failures)
+
+
+def serve(force=False, jobs=1):
+    """Build the figures named on each line of stdin in this warm interpreter"""
+    mtimes = script_mtimes()
+    for line in sys.stdin:
+        try:
+            figures = select_figures(line.split())
+        except ValueError as error:
+            print(error, file=sys.stderr, flush=True)
+            continue
+        mtimes = reload_changed(mtimes)
+        report(*build_stale(figures, force, jobs))
+        sys.stdout.flush()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('figures', nargs='*',
+                        help='create_* function names to build (default: all)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: one per core)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='ignore the build cache and re-render every figure')
+    parser.add_argument('--list', action='store_true',
+                        help='list the discovered figure functions and exit')
+    parser.add_argument('--serve', action='store_true',
+                        help='stay running and build the figures named on each stdin line')
+    figure_settings.add_output_arguments(parser)
+    args = parser.parse_args(argv)
+    figure_settings.apply_output_arguments(args)
+
+    if args.serve:
+        return serve(args.force, args.jobs or 1)
+
+    try:
+        figures = select_figures(args.figures)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.list:
+        for module_name, func_name in figures:
+            print(f'{module_name}.{func_name}')
+        return 0
+
+    return 1 if report(*build_stale(figures, args.force, args.jobs)) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Columnar Test Data Loader for the Chart Scripts
+
+Charts read their test results through load_dataset() instead of inline
+arrays. Columns are opened lazily and memory-mapped wherever the format
+allows, so a multi-gigabyte field log costs only the pages a chart
+actually touches:
+
+    .csv      converted once, streaming, into one .npy file per column
+              in a .<name>.columns/ cache beside it; later loads memmap
+              those files (the cache is rebuilt when the CSV changes)
+    .npz      members stored uncompressed are memmapped in place inside
+              the archive; compressed members are read on first access
+    .parquet  read column by column with pyarrow (optional dependency)
+    .ulog     binary telemetry log (telemetry.py), fields memmapped
+    dir/      a directory of <column>.npy files, memmapped
+
+Relative names resolve against figure_settings.data_dir(), falling back
+to the default data directory for files it doesn't override.
+write_csv() stores computed datasets (e.g. from monte_carlo.py).
+"""
+
+import csv
+import json
+import os
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+from figure_settings import DEFAULT_DATA_DIR, data_dir
+
+CSV_CHUNK_ROWS = 1 << 16
+_CACHE_VERSION = 1
+
+
+def dataset_path(name):
+    """Resolve a dataset name against the data directory, then the default one"""
+    path = Path(name)
+    if path.is_absolute():
+        return path
+    override = data_dir() / path
+    return override if override.exists() else DEFAULT_DATA_DIR / path
+
+
+class Dataset:
+    """Named columns loaded on first access"""
+
+    def __init__(self, path, loaders):
+        self.path = Path(path)
+        self._loaders = loaders
+        self._columns = {}
+
+    @property
+    def columns(self):
+        return list(self._loaders)
+
+    def __contains__(self, column):
+        return column in self._loaders
+
+    def __getitem__(self, column):
+        if column not in self._columns:
+            try:
+                loader = self._loaders[column]
+            except KeyError:
+                raise KeyError(f'{self.path.name} has no column {column!r}; '
+                               f'columns are {self.columns}') from None
+            self._columns[column] = loader()
+        return self._columns[column]
+
+    def __len__(self):
+        return len(self[self.columns[0]]) if self._loaders else 0
+
+    def get(self, *columns):
+        """Return several columns as a tuple"""
+        return tuple(self[c] for c in columns)
+
+
+def _npy_loader(path):
+    return lambda: np.load(path, mmap_mode='r')
+
+
+def _load_column_dir(path):
+    return Dataset(path, {p.stem: _npy_loader(p) for p in sorted(path.glob('*.npy'))})
+
+
+# -- NPZ --------------------------------------------------------------------
+
+def _npz_member_loader(path, info):
+    """Memmap an uncompressed .npy member of a zip archive in place"""
+    def load():
+        with open(path, 'rb') as f:
+            f.seek(info.header_offset)
+            local = f.read(30)
+            name_length = int.from_bytes(local[26:28], 'little')
+            extra_length = int.from_bytes(local[28:30], 'little')
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            offset = f.tell()
+        if dtype.hasobject:
+            raise ValueError(f'{path.name}:{info.filename} holds Python objects')
+        return np.memmap(path, dtype=dtype, mode='r', shape=shape, offset=offset,
+                         order='F' if fortran else 'C')
+    return load
+
+
+def _npz_loader(path, name):
+    def load():
+        with np.load(path, allow_pickle=False) as archive:
+            return archive[name]
+    return load
+
+
+def _load_npz(path):
+    loaders = {}
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if not info.filename.endswith('.npy'):
+                continue
+            name = info.filename[:-4]
+            if info.compress_type == zipfile.ZIP_STORED:
+                loaders[name] = _npz_member_loader(path, info)
+            else:
+                loaders[name] = _npz_loader(path, name)
+    return Dataset(path, loaders)
+
+
+# -- Parquet ----------------------------------------------------------------
+
+def _load_parquet(path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError(f'reading {path.name} needs pyarrow (pip install pyarrow)') from exc
+
+    parquet = pq.ParquetFile(path, memory_map=True)
+
+    def loader(name):
+        return lambda: parquet.read(columns=[name]).column(0).to_numpy()
+    return Dataset(path, {name: loader(name) for name in parquet.schema_arrow.names})
+
+
+# -- CSV --------------------------------------------------------------------
+
+def _parse_float(value):
+    try:
+        return float(value) if value.strip() else np.nan
+    except ValueError:
+        return None
+
+
+def _csv_profile(path):
+    """First pass: header, row count, and which columns are numeric"""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader)]
+        numeric = [True] * len(header)
+        text_length = [1] * len(header)
+        rows = 0
+        for row in reader:
+            if not row:
+                continue
+            rows += 1
+            if len(row) > len(header):
+                raise ValueError(f'{path}:{reader.line_num}: {len(row)} fields, '
+                                 f'header has {len(header)}')
+            for i, value in enumerate(row):
+                text_length[i] = max(text_length[i], len(value))
+                if numeric[i] and _parse_float(value) is None:
+                    numeric[i] = False
+    return header, rows, numeric, text_length
+
+
+def _convert_csv(path, cache):
+    """Second pass: stream the CSV into one memmappable .npy file per column"""
+    header, rows, numeric, text_length = _csv_profile(path)
+    cache.mkdir(exist_ok=True)
+    # Columns are written under per-process names and renamed into place,
+    # so parallel figure builds converting the same file never collide
+    suffix = f'.{os.getpid()}.tmp'
+    columns = [np.lib.format.open_memmap(
+        cache / f'{name}.npy{suffix}', mode='w+', shape=(rows,),
+        dtype=np.float64 if numeric[i] else f'<U{text_length[i]}')
+        for i, name in enumerate(header)]
+
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)
+        start = 0
+        chunk = []
+        for row in reader:
+            if row:
+                chunk.append(row)
+            if len(chunk) == CSV_CHUNK_ROWS:
+                _write_chunk(columns, numeric, chunk, start)
+                start += len(chunk)
+                chunk = []
+        _write_chunk(columns, numeric, chunk, start)
+    for column in columns:
+        column.flush()
+    del columns
+    for name in header:
+        os.replace(cache / f'{name}.npy{suffix}', cache / f'{name}.npy')
+    return header
+
+
+def _write_chunk(columns, numeric, chunk, start):
+    if not chunk:
+        return
+    for i, column in enumerate(columns):
+        values = [row[i] if i < len(row) else '' for row in chunk]
+        if numeric[i]:
+            values = [_parse_float(v) for v in values]
+        column[start:start + len(chunk)] = values
+
+
+def _load_csv(path):
+    cache = path.with_name(f'.{path.stem}.columns')
+    stat = path.stat()
+    stamp = {'version': _CACHE_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    manifest = cache / 'manifest.json'
+    try:
+        with open(manifest) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        saved = None
+    if saved is None or saved['stamp'] != stamp:
+        header = _convert_csv(path, cache)
+        tmp = manifest.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'stamp': stamp, 'columns': header}, f)
+        os.replace(tmp, manifest)
+    else:
+        header = saved['columns']
+    return Dataset(path, {name: _npy_loader(cache / f'{name}.npy') for name in header})
+
+
+# -- Telemetry logs ---------------------------------------------------------
+
+def _load_telemetry(path):
+    from telemetry import TelemetryLog
+
+    log = TelemetryLog(path)
+    loaders = {name: (lambda name=name: log.records[name]) for name in log.dtype.names}
+    loaders['temperature_c'] = lambda: log.temperature_c
+    return Dataset(path, loaders)
+
+
+_LOADERS = {'.csv': _load_csv, '.npz': _load_npz, '.parquet': _load_parquet,
+            '.pq': _load_parquet, '.ulog': _load_telemetry}
+
+
+def load_dataset(name):
+    """Open a dataset by file name (relative to the data directory) or path"""
+    path = dataset_path(name)
+    if path.is_dir():
+        return _load_column_dir(path)
+    try:
+        loader = _LOADERS[path.suffix.lower()]
+    except KeyError:
+        raise ValueError(f'unsupported dataset format {path.suffix!r} ({path})') from None
+    if not path.exists():
+        raise FileNotFoundError(f'dataset {path} not found')
+    return loader(path)
+
+
+def write_csv(path, header, rows):
+    """Write a dataset CSV atomically (readers never see a partial file)"""
+    path = Path(path)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    os.replace(tmp, path)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Pixel-Aware Downsampling for Long Time-Series Panels
+
+A line can't show more detail than the pixels it is drawn across, so
+long series are reduced before they reach ax.plot:
+
+    minmax_envelope()  per-bucket min and max, so every spike survives
+                       exactly; drawn as a band or an up/down polyline
+    lttb()             largest-triangle-three-buckets, picks the one
+                       point per bucket that best preserves the shape
+                       of the line (peaks included) for a clean trace
+
+The number of buckets comes from the axes' width in output pixels at
+the export dpi, so a panel gets the same visual fidelity whether the
+log holds a hundred readings or a hundred million.
+"""
+
+import numpy as np
+
+EXPORT_DPI = 300
+
+
+def axes_pixel_width(ax, dpi=EXPORT_DPI):
+    """Width of ax in output pixels at the export dpi"""
+    fig = ax.get_figure()
+    return max(1, int(ax.get_position().width * fig.get_figwidth() * dpi))
+
+
+def _finite(x, y):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = np.isfinite(x) & np.isfinite(y)
+    return (x, y) if keep.all() else (x[keep], y[keep])
+
+
+def _bucket_edges(n, buckets):
+    return np.linspace(0, n, buckets + 1).astype(np.intp)
+
+
+def minmax_envelope(x, y, buckets):
+    """Return (x, low, high) with the min and max of y in each index bucket
+
+    x is the bucket's first sample time. Series with no more samples than
+    buckets come back unchanged (low = high = y).
+    """
+    x, y = _finite(x, y)
+    if len(y) <= buckets:
+        return x, y, y
+    starts = _bucket_edges(len(y), buckets)[:-1]
+    return x[starts], np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)
+
+
+def minmax_downsample(x, y, buckets):
+    """Polyline through each bucket's min and max in time order (2 points per bucket)"""
+    x, y = _finite(x, y)
+    if len(y) <= 2 * buckets:
+        return x, y
+    edges = _bucket_edges(len(y), buckets)
+    starts = edges[:-1]
+    # reduceat gives each bucket's extreme values; the first sample equal
+    # to each extreme is where it occurred
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    index = np.arange(len(y))
+    picks = []
+    for extreme in (np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)):
+        hit = y == extreme[bucket]
+        first = np.full(buckets, len(y))
+        np.minimum.at(first, bucket[hit], index[hit])
+        picks.append(first)
+    picks = np.sort(np.stack(picks, axis=1), axis=1).ravel()
+    picks = picks[np.r_[True, picks[1:] != picks[:-1]]]
+    return x[picks], y[picks]
+
+
+def lttb(x, y, n_out):
+    """Largest-triangle-three-buckets downsampling of y(x) to n_out points
+
+    The first and last points are always kept; each middle bucket keeps
+    the point forming the largest triangle with the point kept from the
+    previous bucket and the mean of the next bucket.
+    """
+    x, y = _finite(x, y)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    # Mean of every middle bucket, used as the third triangle vertex
+    sums_x = np.add.reduceat(x[:n - 1], edges[:-1])
+    sums_y = np.add.reduceat(y[:n - 1], edges[:-1])
+    counts = np.diff(edges)
+    mean_x = np.append(sums_x / counts, x[-1])
+    mean_y = np.append(sums_y / counts, y[-1])
+
+    picks = np.empty(n_out, dtype=np.intp)
+    picks[0], picks[-1] = 0, n - 1
+    prev_x, prev_y = x[0], y[0]
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        cx, cy = mean_x[b + 1], mean_y[b + 1]
+        # Twice the triangle area; the constant factor doesn't change argmax
+        area = np.abs((prev_x - cx) * (by - prev_y) - (prev_x - bx) * (cy - prev_y))
+        best = lo + int(np.argmax(area))
+        picks[b + 1] = best
+        prev_x, prev_y = x[best], y[best]
+    return x[picks], y[picks]
+
+
+def downsample_for_axes(ax, x, y, method='lttb', dpi=EXPORT_DPI, points_per_pixel=1):
+    """Downsample y(x) to the pixel width of ax: method is 'lttb' or 'minmax'"""
+    pixels = axes_pixel_width(ax, dpi) * points_per_pixel
+    if method == 'lttb':
+        return lttb(x, y, pixels)
+    if method == 'minmax':
+        return minmax_downsample(x, y, max(1, pixels // 2))
+    raise ValueError(f'unknown downsampling method {method!r}')
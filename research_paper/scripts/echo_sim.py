@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Batched Ultrasonic Echo Simulator for the Receive Chain
+
+Synthesises what the comparator sees after each 40 kHz ping, for
+thousands of pings at once, and reports the time of flight the firmware
+would measure. The model follows the circuit (Figure schematic) and the
+attenuation model of Equation eq:attenuation:
+
+    TX burst      BURST_CYCLES square-wave cycles from the TC4427
+    transducers   TCT40-16T/R, each a resonator at 40 kHz with Q = 20
+                  (40 kHz +/- 1 kHz); 115 dB SPL at 30 cm, -65 dB re
+                  1 V/ubar receive sensitivity
+    path          spherical spreading over the 2d round trip plus
+                  1.2 dB/m absorption; surface turbulence scatters part
+                  of the echo (Rayleigh roughness) and jitters its range;
+                  a weaker double-bounce echo arrives at 2 x 2d
+    rain          drops between sensor and water return small echoes
+                  (Poisson in number, log-normal in strength)
+    RX amplifier  two LM324 non-inverting stages, gain 1 + R2/R1 = 11
+                  each, 100 nF / 10 kOhm input coupling, 1 MHz GBW,
+                  input-referred noise, output clipped at the rails
+    comparator    LM393, first crossing of the threshold after the
+                  blanking interval that hides TX ring-down
+
+The chain is linear up to the rails, so its response to one echo is
+computed once (at SUBSAMPLE fractional delays) and every echo in a batch
+is a scaled, shifted copy added in with a single bincount; receiver
+noise is a random window of one long precomputed noise record. Detected
+times are corrected by the fixed detection delay at the calibration
+distance, as the firmware does, so what remains is the physical error:
+threshold walk on weak echoes, turbulence jitter and rain/multipath
+false echoes. simulate_bursts() is a drop-in for
+measurement.simulate_durations() with ground truth attached.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from compensation import speed_of_sound_humid
+
+CARRIER_HZ = 40e3
+BURST_CYCLES = 8
+TRANSDUCER_Q = 20.0
+TX_SPL_DB = 115.0               # dB SPL at TX_REFERENCE_M
+TX_REFERENCE_M = 0.3
+RX_SENSITIVITY_DB = -65.0       # dB re 1 V/ubar
+ABSORPTION_DB_PER_M = 1.2
+SURFACE_REFLECTION = 0.99       # air/water amplitude reflection coefficient
+MULTIPATH_LOSS = 0.3            # sensor face re-reflection of the double bounce
+
+STAGE_GAIN = 1 + 100e3 / 10e3   # R2 / R1
+GAIN_STAGES = 2
+OPAMP_GBW_HZ = 1e6              # LM324
+COUPLING_HZ = 1 / (2 * np.pi * 10e3 * 100e-9)
+NOISE_V_RMS = 20e-6             # input-referred
+RAIL_V = 1.5                    # output swing either side of the mid-rail bias
+THRESHOLD_V = 0.03              # comparator threshold above the bias
+
+SAMPLE_RATE_HZ = 400e3
+SUBSAMPLE = 16                  # fractional-delay phases of the echo template
+NOISE_POOL = 1 << 22            # samples of precomputed receiver noise
+TEMPLATE_S = 2e-3
+BLANKING_US = 1000.0            # ignore TX ring-down (0.17 m)
+MAX_RANGE_M = 6.0
+CALIBRATION_M = 2.5             # mid-range, so threshold walk is split either side
+
+RAIN_DROPS_PER_M = 0.0015       # echoing drops per metre of path per mm/h
+RAIN_STRENGTH_MEDIAN = 0.05     # drop echo relative to a full reflector at its range
+RAIN_STRENGTH_SIGMA = 1.0
+# With these, per-ping accuracy in rain tracks the field results of
+# Figure environmental_results (99.3/97.9/94.8/89.9% at 2/10/25/50 mm/h)
+
+
+def _resonator(f, f0=CARRIER_HZ, q=TRANSDUCER_Q):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nan_to_num(1 / (1 + 1j * q * (f / f0 - f0 / f)))
+
+
+def amplifier_response(f):
+    """Complex gain of the two-stage RX amplifier at frequencies f (Hz)"""
+    coupling = (1j * f / COUPLING_HZ) / (1 + 1j * f / COUPLING_HZ)
+    stage = STAGE_GAIN / (1 + 1j * f * STAGE_GAIN / OPAMP_GBW_HZ)
+    return (coupling * stage) ** GAIN_STAGES
+
+
+def _spl_to_volts(spl_db):
+    """Receiver output amplitude (V peak) for a sound pressure level"""
+    pressure_ubar = 20e-6 * 10 ** (spl_db / 20) * 10 * np.sqrt(2)
+    return pressure_ubar * 10 ** (RX_SENSITIVITY_DB / 20)
+
+
+def echo_amplitude(path_m, reflection=1.0):
+    """Peak receiver voltage for an echo that travelled path_m in total"""
+    path_m = np.maximum(np.asarray(path_m, dtype=float), TX_REFERENCE_M)
+    loss_db = (20 * np.log10(path_m / TX_REFERENCE_M)
+               + ABSORPTION_DB_PER_M * (path_m - TX_REFERENCE_M))
+    return reflection * _spl_to_volts(TX_SPL_DB - loss_db)
+
+
+def echo_templates(sample_rate=SAMPLE_RATE_HZ, subsample=SUBSAMPLE):
+    """Amplifier output for a unit-peak echo arriving at t = 0, at `subsample` fractional delays
+
+    Row p is the response delayed by p / subsample of a sample; row 0 is
+    the reference shape a matched filter correlates against.
+    """
+    n = int(TEMPLATE_S * sample_rate)
+    n_fft = 8 * n
+    f = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+    t = np.arange(n_fft) / sample_rate
+    burst = np.where(t < BURST_CYCLES / CARRIER_HZ,
+                     np.sign(np.sin(2 * np.pi * CARRIER_HZ * t)), 0.0)
+    acoustic = np.fft.rfft(burst) * _resonator(f) ** 2
+    # Normalise so the echo at the receiver terminals peaks at 1 V
+    acoustic /= np.abs(np.fft.irfft(acoustic, n_fft)).max()
+    shaped = acoustic * amplifier_response(f)
+    phases = np.arange(subsample)[:, None] / subsample
+    delayed = shaped * np.exp(-2j * np.pi * f * phases / sample_rate)
+    return np.fft.irfft(delayed, n_fft, axis=1)[:, :n].astype(np.float32)
+
+
+class EchoSimulator:
+    """Batched waveform model of the ping -> echo -> amplifier -> comparator chain"""
+
+    def __init__(self, sample_rate=SAMPLE_RATE_HZ, threshold_v=THRESHOLD_V, noise_v=NOISE_V_RMS,
+                 max_range_m=MAX_RANGE_M, blanking_us=BLANKING_US, seed=0):
+        self.sample_rate = sample_rate
+        self.threshold_v = threshold_v
+        self.noise_v = noise_v
+        self.blanking_us = blanking_us
+        self.window = int(2 * max_range_m / 340.0 * sample_rate) + 1
+        self.templates = echo_templates(sample_rate)
+        self.length = self.templates.shape[1]
+        self.noise = self._noise_pool(seed) if noise_v else None
+        self.offset_us = 0.0
+        self.offset_us = self._detection_delay()
+
+    def _noise_pool(self, seed):
+        """A long record of amplifier-shaped noise that pings take windows of"""
+        n = NOISE_POOL
+        f = np.fft.rfftfreq(n, 1 / self.sample_rate)
+        rng = np.random.default_rng(seed)
+        spectrum = rng.standard_normal(len(f)) + 1j * rng.standard_normal(len(f))
+        noise = np.fft.irfft(spectrum * np.abs(amplifier_response(f)), n)
+        # noise_v is input-referred: the output RMS is noise_v times the mid-band gain
+        noise *= self.noise_v * STAGE_GAIN ** GAIN_STAGES / noise.std()
+        return np.concatenate([noise, noise[:self.window]]).astype(np.float32)
+
+    def _detection_delay(self):
+        """Comparator delay past the true arrival for a clean echo at CALIBRATION_M"""
+        noise, self.noise = self.noise, None
+        detected, true = self.detect(np.array([CALIBRATION_M]), 25.0, rng=np.random.default_rng(0))
+        self.noise = noise
+        return float(detected[0] - true[0])
+
+    def waveforms(self, delays_us, amplitudes, rng=None):
+        """Amplifier output for rows of echoes: delays/amplitudes shaped (pings, echoes)"""
+        rng = np.random.default_rng() if rng is None else rng
+        delays = np.asarray(delays_us, dtype=float) * 1e-6 * self.sample_rate
+        amplitudes = np.asarray(amplitudes, dtype=float)
+        pings = len(delays)
+        keep = np.isfinite(delays) & (amplitudes != 0) & (delays < self.window)
+        rows = np.broadcast_to(np.arange(pings)[:, None], delays.shape)[keep]
+        delays, amplitudes = delays[keep], amplitudes[keep]
+        start = delays.astype(np.intp)
+        phase = np.minimum(((delays - start) * SUBSAMPLE).round().astype(np.intp), SUBSAMPLE - 1)
+
+        # Every echo adds a scaled copy of its template; one bincount sums them all
+        index = start[:, None] + np.arange(self.length)
+        weights = amplitudes[:, None] * self.templates[phase]
+        inside = index < self.window
+        flat = (rows[:, None] * self.window + index)[inside]
+        echoes = np.bincount(flat, weights[inside], minlength=pings * self.window)
+
+        if self.noise is not None:
+            # Independent noise per ping: a window of the pool at a random offset
+            windows = np.lib.stride_tricks.sliding_window_view(self.noise, self.window)
+            signal = windows[rng.integers(0, NOISE_POOL, pings)]
+        else:
+            signal = np.zeros((pings, self.window), dtype=np.float32)
+        signal += echoes.reshape(pings, self.window)
+        return np.clip(signal, -RAIL_V, RAIL_V, out=signal)
+
+    def comparator(self, signal):
+        """First threshold crossing after blanking, in µs (NaN if none)"""
+        first = int(self.blanking_us * 1e-6 * self.sample_rate)
+        above = signal[:, first:] > self.threshold_v
+        hit = above.argmax(axis=1)
+        found = above[np.arange(len(signal)), hit]
+        k = first + np.maximum(hit, 1)
+        rows = np.arange(len(signal))
+        lo, hi = signal[rows, k - 1], signal[rows, k]
+        # Linear interpolation between the samples either side of the crossing
+        frac = np.clip((self.threshold_v - lo) / np.where(hi > lo, hi - lo, 1.0), 0, 1)
+        crossing_us = (k - 1 + frac) * 1e6 / self.sample_rate
+        return np.where(found, crossing_us - self.offset_us, np.nan)
+
+    def capture(self, distance_m, temperature_c=25.0, humidity=0.0, rain_mm_h=0.0,
+                turbulence_m=0.0, multipath=True, rng=None):
+        """Receiver waveforms for one ping per distance; returns (waveforms, true_us)"""
+        rng = np.random.default_rng() if rng is None else rng
+        distance_m = np.asarray(distance_m, dtype=float)
+        pings = len(distance_m)
+        speed = np.broadcast_to(speed_of_sound_humid(temperature_c, humidity), (pings,))
+        true_us = 2e6 * distance_m / speed
+
+        # Surface echo: turbulence jitters the range and, through Rayleigh
+        # roughness, trades coherent reflection for a random diffuse part
+        surface = distance_m + (rng.normal(0, turbulence_m, pings) if turbulence_m else 0.0)
+        k = 2 * np.pi * CARRIER_HZ / speed
+        coherent = np.exp(-2 * (k * turbulence_m) ** 2)
+        diffuse = np.sqrt(1 - coherent ** 2) * rng.rayleigh(np.sqrt(0.5), pings)
+        strength = SURFACE_REFLECTION * np.abs(coherent + diffuse * np.exp(
+            2j * np.pi * rng.random(pings)))
+        delays = [2e6 * surface / speed]
+        amplitudes = [echo_amplitude(2 * surface, strength)]
+        if multipath:
+            delays.append(4e6 * surface / speed)
+            amplitudes.append(echo_amplitude(4 * surface, strength ** 2 * MULTIPATH_LOSS))
+
+        if rain_mm_h:
+            drops = rng.poisson(RAIN_DROPS_PER_M * rain_mm_h * distance_m)
+            width = max(int(drops.max()), 1)
+            ranges = rng.uniform(0, 1, (pings, width)) * distance_m[:, None]
+            present = np.arange(width) < drops[:, None]
+            strengths = RAIN_STRENGTH_MEDIAN * rng.lognormal(0, RAIN_STRENGTH_SIGMA, (pings, width))
+            delays.append(np.where(present, 2e6 * ranges / speed[:, None], np.nan))
+            amplitudes.append(np.where(present, echo_amplitude(2 * ranges, strengths), 0.0))
+
+        delays = np.column_stack([np.reshape(d, (pings, -1)) for d in delays])
+        amplitudes = np.column_stack([np.reshape(a, (pings, -1)) for a in amplitudes])
+        return self.waveforms(delays, amplitudes, rng), true_us
+
+    def detect(self, distance_m, temperature_c=25.0, rng=None, **conditions):
+        """Simulate one ping per distance; returns (detected_us, true_us)"""
+        signal, true_us = self.capture(distance_m, temperature_c, rng=rng, **conditions)
+        return self.comparator(signal), true_us
+
+    def detect_in_batches(self, distance_m, temperature_c=25.0, batch_size=1024, seed=0,
+                          **conditions):
+        """detect() over many pings in batches to bound waveform memory"""
+        rng = np.random.default_rng(seed)
+        distance_m = np.asarray(distance_m, dtype=float)
+        temperature_c = np.broadcast_to(np.asarray(temperature_c, dtype=float), distance_m.shape)
+        detected = np.empty(len(distance_m))
+        true = np.empty(len(distance_m))
+        for start in range(0, len(distance_m), batch_size):
+            rows = slice(start, start + batch_size)
+            detected[rows], true[rows] = self.detect(distance_m[rows], temperature_c[rows],
+                                                     rng=rng, **conditions)
+        return detected, true
+
+
+def simulate_bursts(stations, samples=15, seed=0, rain_mm_h=0.0, turbulence_m=0.0002,
+                    simulator=None, quantize=True):
+    """Waveform-level echo bursts: returns (durations_us, temperature_c, sensor_height, level)
+
+    Same shapes and meaning as measurement.simulate_durations(); missed
+    echoes are NaN and, with quantize, times are whole µs like the
+    firmware's pulse timer.
+    """
+    rng = np.random.default_rng(seed)
+    simulator = EchoSimulator() if simulator is None else simulator
+    sensor_height = rng.uniform(3.0, 4.0, stations)
+    level = rng.uniform(0.0, 2.5, stations)
+    temperature_c = rng.uniform(20.0, 45.0, stations)
+    distance = np.repeat(sensor_height - level, samples)
+    detected, _ = simulator.detect_in_batches(
+        distance, np.repeat(temperature_c, samples), seed=rng.integers(1 << 63),
+        rain_mm_h=rain_mm_h, turbulence_m=turbulence_m)
+    durations_us = detected.reshape(stations, samples)
+    if quantize:
+        durations_us = np.rint(durations_us)
+    return durations_us, temperature_c, sensor_height, level
+
+
+def main():
+    from measurement import water_level
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--stations', type=int, default=2000)
+    parser.add_argument('--samples', type=int, default=15)
+    parser.add_argument('--rain', type=float, default=0.0, help='rain rate, mm/h')
+    parser.add_argument('--turbulence', type=float, default=0.0002, help='surface RMS height, m')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log', help='also write the bursts to this telemetry log')
+    args = parser.parse_args()
+
+    simulator = EchoSimulator()
+    start = time.perf_counter()
+    durations, temperature, height, level = simulate_bursts(
+        args.stations, args.samples, args.seed, args.rain, args.turbulence, simulator)
+    elapsed = time.perf_counter() - start
+
+    true_us = 2e6 * (height - level)[:, None] / speed_of_sound_humid(temperature, 0)[:, None]
+    error_us = durations - true_us
+    missing = np.isnan(durations)
+    spurious = np.abs(error_us) > 2e6 * 0.05 / 343     # off by more than 5 cm
+    estimate = water_level(durations, temperature, height)
+    error = np.abs(estimate - level)
+    print(f'{durations.size} pings in {elapsed:.2f} s ({durations.size / elapsed:.0f} pings/s)')
+    print(f'detection delay {simulator.offset_us:.1f} µs (calibrated out)')
+    print(f'missed echoes {missing.mean() * 100:.2f}%, false echoes {spurious.mean() * 100:.2f}%')
+    print(f'raw echo error: median {np.nanmedian(np.abs(error_us)) * 0.1715:.2f} mm')
+    print(f'filtered level error: median {np.nanmedian(error) * 100:.2f} cm, '
+          f'95th percentile {np.nanpercentile(error, 95) * 100:.2f} cm')
+    if args.log:
+        from telemetry import TelemetryWriter, encode_bursts
+
+        with TelemetryWriter(args.log, args.samples) as writer:
+            writer.append(encode_bursts(np.arange(args.stations, dtype=float),
+                                        np.arange(args.stations), durations, temperature))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Energy and Battery-Life Model for Scheduler Activity
+
+Turns what the firmware does into energy drawn from the pack, and
+projects the battery state of charge with the solar panel of the
+mounting diagram charging it:
+
+    activity    bursts fired (each a wake-up and N pings), DS18B20
+                temperature reads and LoRa transmissions, counted per
+                (time step, station): from a fixed interval, from the
+                adaptive policy applied to hydrographs, from a
+                sampling_sim run, or from telemetry logs
+    load        sleep floor plus a fixed energy per activity; the split
+                is estimated from the parts, and calibrated so that one
+                burst per interval reproduces the measured averages the
+                scheduler simulation was fitted to (45 mW at 10 s,
+                5 mW at 300 s)
+    solar       clear-sky panel output from the sun's elevation at the
+                site, scaled by a daily clearness index: a seasonal mean
+                (wet season June-November), a regional anomaly that
+                persists over several days, and per-station scatter
+    battery     state of charge integrated step by step, clipped to the
+                pack's usable capacity; energy is lost when the pack is
+                full and the station browns out when it is empty
+
+Load and solar input are computed as whole (time steps, stations)
+arrays, and the state of charge advances one time step at a time for
+a block of stations at once, so a year of hourly steps for 10,000
+stations takes a few seconds.
+
+Run directly for the power-vs-interval table and a fleet projection;
+with --data-dir the table is written as the chart's power_vs_interval
+dataset, and --render redraws the environmental charts from it.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import figure_settings
+from datasets import write_csv
+from measurement import DEFAULT_SAMPLES
+from sampling_sim import (SAMPLE_ENERGY_J, SLEEP_POWER_W, adaptive_intervals,
+                          synthetic_hydrographs)
+
+# Energy per activity at the battery terminals (J). The radio term takes
+# the remainder of the fitted per-sample energy.
+WAKE_ENERGY_J = 0.06            # boot from deep sleep, ~250 ms at 240 mW
+PING_ENERGY_J = 0.012           # burst drive and 35 ms listening window
+TEMPERATURE_READ_J = 0.0375     # 750 ms DS18B20 conversion, MCU in light sleep
+RADIO_TX_J = SAMPLE_ENERGY_J - WAKE_ENERGY_J - TEMPERATURE_READ_J - DEFAULT_SAMPLES * PING_ENERGY_J
+
+BATTERY_MAH = 10_000
+BATTERY_VOLTAGE_V = 3.7         # cell rating, as packs are specified
+USABLE_FRACTION = 0.8           # kept between cut-off and full charge
+CHARGE_EFFICIENCY = 0.75        # charge controller and cell losses
+
+PANEL_PEAK_W = 2.0
+LATITUDE_DEG = 14.84            # Malolos, Bulacan
+CLEAR_SKY_INDEX = 0.75          # clearness index of a cloudless day
+MONTHLY_CLEARNESS = (0.58, 0.62, 0.64, 0.63, 0.56, 0.46,
+                     0.41, 0.39, 0.43, 0.49, 0.53, 0.55)
+WEATHER_PERSISTENCE = 0.7       # day-to-day correlation of regional cloudiness
+WEATHER_SPREAD = 0.12
+STATION_SPREAD = 0.06
+
+INTERVALS_S = (10, 30, 60, 120, 300, 600)
+CHUNK_STATIONS = 1024
+
+
+class Activity:
+    """Scheduler activity per (time step, station)
+
+    bursts, temperature_reads and transmissions are (steps, stations)
+    counts (fractional counts are expected values); reads and
+    transmissions default to one per burst. start_s is the start of the
+    first step in seconds since 1 January, local solar time.
+    """
+
+    def __init__(self, bursts, step_s, start_s=0.0, temperature_reads=None,
+                 transmissions=None, pings=DEFAULT_SAMPLES):
+        self.bursts = bursts
+        self.temperature_reads = bursts if temperature_reads is None else temperature_reads
+        self.transmissions = bursts if transmissions is None else transmissions
+        self.step_s = step_s
+        self.start_s = start_s
+        self.pings = pings
+
+    @property
+    def shape(self):
+        return self.bursts.shape
+
+    def select(self, columns):
+        """The same activity for a subset of stations"""
+        return Activity(self.bursts[:, columns], self.step_s, self.start_s,
+                        self.temperature_reads[:, columns], self.transmissions[:, columns],
+                        self.pings)
+
+    @classmethod
+    def fixed(cls, interval_s, steps, stations, step_s=3600, start_s=0.0, tx_every=1):
+        """Every station bursting every interval_s (no memory per station)"""
+        per_step = step_s / interval_s
+        bursts = np.broadcast_to(np.float64(per_step), (steps, stations))
+        transmissions = np.broadcast_to(np.float64(per_step / tx_every), (steps, stations))
+        return cls(bursts, step_s, start_s, transmissions=transmissions)
+
+    @classmethod
+    def scheduled(cls, hydrographs, steps, step_s=3600, start_s=0.0, policy=adaptive_intervals,
+                  tx_every=1):
+        """Expected bursts per step with the policy applied to the step's level and rise
+
+        The interval is taken from the level at the end of each step and
+        the rise over it, so activity changes at the step resolution.
+        """
+        edges = np.arange(steps + 1) * step_s
+        levels = _levels_at(hydrographs, edges)
+        fraction = levels[1:] / hydrographs.capacity
+        rise_cm_per_min = np.diff(levels, axis=0) * 6000.0 / step_s
+        bursts = step_s / policy(fraction, rise_cm_per_min)
+        return cls(bursts, step_s, start_s,
+                   transmissions=bursts / tx_every if tx_every != 1 else None)
+
+    @classmethod
+    def from_simulation(cls, result, start_s=0.0):
+        """Activity recorded by sampling_sim.simulate(..., activity_step_s=...)"""
+        if result.activity is None:
+            raise ValueError('simulate() was run without activity_step_s')
+        return cls(result.activity, result.activity_step_s, start_s)
+
+    @classmethod
+    def from_logs(cls, logs, step_s=3600, t0=None, t1=None, stations=None,
+                  utc_offset_h=8.0):
+        """Bursts per step and station from telemetry logs (one record per burst)
+
+        Columns are the given station numbers, or all stations in the logs,
+        in ascending order.
+        """
+        from telemetry_query import TelemetryArchive
+
+        archive = TelemetryArchive(logs)
+        spans = [(log.t_min, log.t_max) for log in archive.logs if len(log.log)]
+        if not spans and (t0 is None or t1 is None):
+            raise ValueError(f'no telemetry records in {logs}')
+        t0 = min(t for t, _ in spans) if t0 is None else t0
+        t1 = max(t for _, t in spans) + 1e-6 if t1 is None else t1
+        steps = int(np.ceil((t1 - t0) / step_s))
+        chunks = list(archive.iter_query(t0, t1))
+        if stations is None:
+            stations = np.unique(np.concatenate([c['station'] for c in chunks])) if chunks else []
+        stations = np.sort(np.asarray(stations))
+        counts = np.zeros(steps * len(stations))
+        for chunk in chunks:
+            column = np.searchsorted(stations, chunk['station'])
+            known = column < len(stations)
+            known[known] = stations[column[known]] == chunk['station'][known]
+            step = ((np.asarray(chunk['time'][known]) - t0) // step_s).astype(np.intp)
+            counts += np.bincount(step * len(stations) + column[known], minlength=len(counts))
+        pings = archive.logs[0].log.samples if archive.logs else DEFAULT_SAMPLES
+        return cls(counts.reshape(steps, len(stations)), step_s,
+                   _seconds_into_year(t0, utc_offset_h), pings=pings)
+
+
+def _levels_at(hydrographs, times):
+    """Piecewise-linear levels at shared times: (len(times), stations)"""
+    levels = np.empty((len(hydrographs), len(times)))
+    for s, (t, h) in enumerate(zip(hydrographs.times, hydrographs.levels)):
+        levels[s] = np.interp(times, t, h)
+    return levels.T
+
+
+def _seconds_into_year(epoch_s, utc_offset_h):
+    """Unix time -> seconds since 1 January 00:00 in the given time zone"""
+    local = np.datetime64(int(epoch_s + utc_offset_h * 3600), 's')
+    return float((local - local.astype('datetime64[Y]')) / np.timedelta64(1, 's'))
+
+
+class PowerModel:
+    """Energy drawn from the battery by each activity and the sleep floor"""
+
+    def __init__(self, sleep_w=SLEEP_POWER_W, wake_j=WAKE_ENERGY_J, ping_j=PING_ENERGY_J,
+                 temperature_j=TEMPERATURE_READ_J, radio_j=RADIO_TX_J):
+        self.sleep_w = sleep_w
+        self.wake_j = wake_j
+        self.ping_j = ping_j
+        self.temperature_j = temperature_j
+        self.radio_j = radio_j
+
+    def burst_j(self, pings=DEFAULT_SAMPLES):
+        return self.wake_j + pings * self.ping_j
+
+    def load_j(self, activity):
+        """Energy used in each (step, station) of activity"""
+        # Counts shared between activities (one read and one transmission
+        # per burst, say) are multiplied once by their summed energy
+        weights = {}
+        for counts, joules in ((activity.bursts, self.burst_j(activity.pings)),
+                               (activity.temperature_reads, self.temperature_j),
+                               (activity.transmissions, self.radio_j)):
+            weights[id(counts)] = (counts, weights.get(id(counts), (None, 0.0))[1] + joules)
+        load = self.sleep_w * activity.step_s
+        for counts, joules in weights.values():
+            load = load + counts * joules
+        return load
+
+    def average_power_w(self, interval_s, pings=DEFAULT_SAMPLES, tx_every=1):
+        """Mean power sampling every interval_s and transmitting every tx_every-th burst"""
+        interval_s = np.asarray(interval_s, dtype=float)
+        per_burst = self.burst_j(pings) + self.temperature_j + self.radio_j / tx_every
+        return self.sleep_w + per_burst / interval_s
+
+
+class Battery:
+    """Usable capacity of the pack and the state it starts in"""
+
+    def __init__(self, capacity_mah=BATTERY_MAH, voltage_v=BATTERY_VOLTAGE_V,
+                 usable_fraction=USABLE_FRACTION, charge_efficiency=CHARGE_EFFICIENCY,
+                 initial_soc=1.0):
+        self.capacity_mah = capacity_mah
+        self.capacity_j = capacity_mah * 1e-3 * voltage_v * 3600 * usable_fraction
+        self.charge_efficiency = charge_efficiency
+        self.initial_soc = initial_soc
+
+    def life_h(self, power_w):
+        """Hours from full to empty at a constant draw, without charging"""
+        return self.capacity_j / np.asarray(power_w, dtype=float) / 3600
+
+
+class SolarInput:
+    """Panel output per (time step, station) at one site"""
+
+    def __init__(self, panel_w=PANEL_PEAK_W, latitude_deg=LATITUDE_DEG, seed=0):
+        self.panel_w = panel_w
+        self.latitude = np.radians(latitude_deg)
+        self.seed = seed
+        self._clearness = None
+
+    def clearness(self, days, stations):
+        """Daily clearness index (days, stations); the same for any chunking"""
+        cached = self._clearness
+        if cached is not None and cached.shape[0] >= days and cached.shape[1] >= stations:
+            return cached[:days, :stations]
+        rng = np.random.default_rng(self.seed)
+        shocks = rng.normal(0, WEATHER_SPREAD * np.sqrt(1 - WEATHER_PERSISTENCE ** 2), days)
+        regional = np.empty(days)
+        anomaly = rng.normal(0, WEATHER_SPREAD)
+        for d in range(days):
+            anomaly = WEATHER_PERSISTENCE * anomaly + shocks[d]
+            regional[d] = anomaly
+        scatter = rng.normal(0, STATION_SPREAD, (days, stations))
+        self._clearness = regional[:, None] + scatter
+        return self._clearness
+
+    def power_w(self, times_s, stations, columns=slice(None)):
+        """Mean panel output (W) around each time for the given station columns
+
+        times_s are seconds since 1 January, local solar time; stations is
+        the fleet size, so each station keeps its weather in any subset.
+        """
+        times_s = np.asarray(times_s, dtype=float)
+        day = times_s // 86400
+        declination = np.radians(23.44) * np.sin(2 * np.pi * (284 + day % 365 + 1) / 365)
+        hour_angle = 2 * np.pi * (times_s % 86400 / 86400 - 0.5)
+        sin_elevation = (np.sin(self.latitude) * np.sin(declination)
+                         + np.cos(self.latitude) * np.cos(declination) * np.cos(hour_angle))
+        first = int(day.min())
+        anomaly = self.clearness(int(day.max()) - first + 1, stations)[:, columns]
+        month = np.minimum(((day % 365) * 12 // 365).astype(int), 11)
+        index = np.clip(np.take(MONTHLY_CLEARNESS, month)[:, None]
+                        + anomaly[(day - first).astype(int)], 0.05, CLEAR_SKY_INDEX)
+        return self.panel_w * np.maximum(sin_elevation, 0)[:, None] * index / CLEAR_SKY_INDEX
+
+
+def integrate_soc(net_j, capacity_j, initial_j):
+    """Charge (J) after each step of x -> clip(x + net, 0, capacity), per station"""
+    soc = np.empty_like(net_j)
+    x = np.broadcast_to(np.asarray(initial_j, dtype=float), net_j.shape[1:]).copy()
+    maximum, minimum = np.maximum, np.minimum
+    for t in range(len(net_j)):
+        x += net_j[t]
+        maximum(x, 0.0, out=x)
+        minimum(x, capacity_j, out=x)
+        soc[t] = x
+    return soc
+
+
+class Projection:
+    """Per-station outcome and fleet state of charge over a projection"""
+
+    def __init__(self, stations, steps, step_s, capacity_j):
+        self.step_s = step_s
+        self.capacity_j = capacity_j
+        self.load_j = np.zeros(stations)
+        self.harvest_j = np.zeros(stations)
+        self.spilled_j = np.zeros(stations)
+        self.min_soc = np.ones(stations)
+        self.final_soc = np.ones(stations)
+        self.empty_steps = np.zeros(stations, dtype=np.int64)
+        self.first_empty_s = np.full(stations, np.nan)
+        # Fleet-wide state of charge at the end of each step
+        self.soc_mean = np.zeros(steps)
+        self.soc_min = np.ones(steps)
+        self.empty_share = np.zeros(steps)
+
+    def summary(self):
+        stations = len(self.load_j)
+        duration = len(self.soc_mean) * self.step_s
+        empty = np.isfinite(self.first_empty_s)
+        return {
+            'stations': stations,
+            'days': duration / 86400,
+            'average_load_mw_mean': float(self.load_j.mean() / duration * 1e3),
+            'average_load_mw_max': float(self.load_j.max() / duration * 1e3),
+            'harvest_used_pct': (float(100 * (1 - self.spilled_j.sum() / self.harvest_j.sum()))
+                                 if self.harvest_j.sum() > 0 else None),
+            'soc_min_pct': float(100 * self.min_soc.min()),
+            'soc_final_pct_mean': float(100 * self.final_soc.mean()),
+            'stations_emptied': int(empty.sum()),
+            'first_empty_day_min': float(self.first_empty_s[empty].min() / 86400) if empty.any() else None,
+            'outage_hours_mean': float(self.empty_steps.mean() * self.step_s / 3600),
+            'outage_hours_max': float(self.empty_steps.max() * self.step_s / 3600),
+        }
+
+
+def project(activity, battery=None, model=None, solar=None, chunk=CHUNK_STATIONS):
+    """Battery state of charge for every station under activity
+
+    activity is an Activity, or a function returning the Activity of a
+    slice of station columns (so large fleets are never built whole);
+    solar=None projects without charging.
+    """
+    battery = battery or Battery()
+    model = model or PowerModel()
+    source = activity.select if isinstance(activity, Activity) else activity
+    probe = source(slice(0, 1))
+    steps, step_s = probe.shape[0], probe.step_s
+    stations = activity.shape[1] if isinstance(activity, Activity) else activity.stations
+    times = probe.start_s + (np.arange(steps) + 0.5) * step_s
+    result = Projection(stations, steps, step_s, battery.capacity_j)
+
+    for start in range(0, stations, chunk):
+        columns = slice(start, min(start + chunk, stations))
+        block = source(columns)
+        load = np.broadcast_to(model.load_j(block), block.shape)
+        harvest = (solar.power_w(times, stations, columns) * step_s if solar is not None
+                   else np.zeros(block.shape))
+        charge = harvest * battery.charge_efficiency
+        initial = battery.initial_soc * battery.capacity_j
+        net = charge - load
+        soc = integrate_soc(net, battery.capacity_j, initial)
+        # Unclipped charge: above capacity the surplus is lost, below zero
+        # the load went unserved
+        net[0] += initial
+        net[1:] += soc[:-1]
+        spilled = np.maximum(net - battery.capacity_j, 0).sum(axis=0) / battery.charge_efficiency
+        empty = net < 0
+
+        result.load_j[columns] = load.sum(axis=0)
+        result.harvest_j[columns] = harvest.sum(axis=0)
+        result.spilled_j[columns] = spilled
+        capacity = battery.capacity_j
+        result.min_soc[columns] = soc.min(axis=0) / capacity
+        result.final_soc[columns] = soc[-1] / capacity
+        result.empty_steps[columns] = empty.sum(axis=0)
+        ever = np.flatnonzero(empty.any(axis=0))
+        result.first_empty_s[start + ever] = empty[:, ever].argmax(axis=0) * step_s
+        result.soc_mean += soc.sum(axis=1) / (capacity * stations)
+        np.minimum(result.soc_min, soc.min(axis=1) / capacity, out=result.soc_min)
+        result.empty_share += empty.sum(axis=1) / stations
+    return result
+
+
+class ScheduledFleet:
+    """Adaptive-policy activity for hydrographs, built one block of stations at a time"""
+
+    def __init__(self, hydrographs, steps, step_s=3600, start_s=0.0, tx_every=1):
+        self.hydrographs = hydrographs
+        self.steps = steps
+        self.step_s = step_s
+        self.start_s = start_s
+        self.tx_every = tx_every
+        self.stations = len(hydrographs)
+
+    def __call__(self, columns):
+        h = self.hydrographs
+        subset = type(h)(h.times[columns], h.levels[columns], h.capacity[columns])
+        return Activity.scheduled(subset, self.steps, self.step_s, self.start_s,
+                                  tx_every=self.tx_every)
+
+
+def power_table(model=None, battery=None, intervals=INTERVALS_S):
+    """(interval s, average power mW, battery life h) rows for the chart"""
+    model = model or PowerModel()
+    battery = battery or Battery()
+    power = model.average_power_w(intervals)
+    return [(interval, round(float(p * 1e3), 1), round(float(h)))
+            for interval, p, h in zip(intervals, power, battery.life_h(power))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    figure_settings.add_output_arguments(parser)
+    parser.add_argument('--stations', type=int, default=10_000)
+    parser.add_argument('--days', type=float, default=365)
+    parser.add_argument('--step', type=float, default=3600, help='time step (s)')
+    parser.add_argument('--start-day', type=int, default=0, help='day of year the run starts')
+    parser.add_argument('--fixed', type=float, default=None,
+                        help='fixed sampling interval (s) instead of the adaptive policy')
+    parser.add_argument('--flood-fraction', type=float, default=0.5)
+    parser.add_argument('--logs', default=None,
+                        help='take activity from telemetry logs (.ulog file or directory)')
+    parser.add_argument('--tx-every', type=int, default=1, help='bursts per LoRa transmission')
+    parser.add_argument('--battery-mah', type=float, default=BATTERY_MAH)
+    parser.add_argument('--panel-w', type=float, default=PANEL_PEAK_W,
+                        help='solar panel peak power, 0 for battery only')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--render', action='store_true',
+                        help='redraw the environmental charts from the power table')
+    args = parser.parse_args()
+    figure_settings.apply_output_arguments(args)
+
+    model = PowerModel()
+    battery = Battery(args.battery_mah)
+    table = power_table(model, battery)
+    print(f'{"interval s":>10s} {"power mW":>9s} {"life h":>7s}  ({args.battery_mah:.0f} mAh, no solar)')
+    for row in table:
+        print(f'{row[0]:10d} {row[1]:9.1f} {row[2]:7d}')
+
+    steps = int(np.ceil(args.days * 86400 / args.step))
+    start_s = args.start_day * 86400.0
+    if args.logs:
+        try:
+            activity = Activity.from_logs(args.logs, args.step)
+        except ValueError as error:
+            parser.error(str(error))
+    elif args.fixed:
+        activity = Activity.fixed(args.fixed, steps, args.stations, args.step, start_s,
+                                  args.tx_every)
+    else:
+        hydrographs = synthetic_hydrographs(args.stations, steps * args.step,
+                                            args.flood_fraction, args.seed)
+        activity = ScheduledFleet(hydrographs, steps, args.step, start_s, args.tx_every)
+    solar = SolarInput(args.panel_w, seed=args.seed) if args.panel_w > 0 else None
+    start = time.perf_counter()
+    result = project(activity, battery, model, solar)
+    elapsed = time.perf_counter() - start
+    for key, value in result.summary().items():
+        print(f'{key:28s} {value:.2f}' if isinstance(value, float) else f'{key:28s} {value}')
+    print(f'{"projected in":28s} {elapsed:.2f} s')
+
+    directory = figure_settings.data_dir()
+    if directory.resolve() == figure_settings.DEFAULT_DATA_DIR.resolve():
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    write_csv(directory / 'power_vs_interval.csv',
+              ['interval_s', 'power_mw', 'battery_life_h'], table)
+    print(f'power table written to {directory}')
+    if args.render:
+        from generate_charts import create_environmental_tests
+
+        create_environmental_tests()
+
+
+if __name__ == "__main__":
+    main()
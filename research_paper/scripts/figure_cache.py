@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Build Cache for Research Paper Figures
+
+A figure's cache key hashes the source of its create_* function (and of
+every helper function and class it uses from the scripts directory), the
+module constants it reads, any declared input data files and the
+matplotlib render settings. Figures whose key matches the stored manifest and whose
+output files still exist are skipped.
+"""
+
+import hashlib
+import inspect
+import json
+import sys
+import types
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+MANIFEST_NAME = '.figure_cache.json'
+
+
+def figure_inputs(*paths):
+    """Decorator declaring data files a figure reads, so edits invalidate it
+
+    Relative paths are resolved against the data directory when the key
+    is computed, so --data-dir can point a build at another data set.
+    """
+    def decorate(func):
+        func.figure_inputs = tuple(str(p) for p in paths)
+        return func
+    return decorate
+
+
+def _referenced_names(code):
+    """Yield global names used by a code object and its nested functions"""
+    yield from code.co_names
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            yield from _referenced_names(const)
+
+
+def is_local(obj):
+    """True for functions and classes defined in the scripts directory"""
+    module = sys.modules.get(getattr(obj, '__module__', None))
+    module_file = getattr(module, '__file__', None)
+    return ((inspect.isfunction(obj) or inspect.isclass(obj)) and module_file is not None
+            and Path(module_file).resolve().parent == SCRIPTS_DIR)
+
+
+def _is_plain_data(value):
+    """True for constants whose repr is stable across processes"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return True
+    if isinstance(value, (tuple, list)):
+        return all(_is_plain_data(v) for v in value)
+    if isinstance(value, dict):
+        return all(_is_plain_data(k) and _is_plain_data(v) for k, v in value.items())
+    return False
+
+
+def _local_code(value):
+    """Yield the local functions and classes a global refers to
+
+    That is the value itself, the function a decorator (functools.wraps,
+    lru_cache) wraps, or the entries of a table of helpers, e.g.
+    {kind: (helper, width, height)}.
+    """
+    if isinstance(value, (tuple, list, dict)):
+        for item in (value.values() if isinstance(value, dict) else value):
+            yield from _local_code(item)
+        return
+    value = inspect.unwrap(value) if callable(value) else value
+    if is_local(value):
+        yield value
+
+
+def _code_of(obj):
+    """(code object, globals) of a function, or of every method of a class"""
+    if not inspect.isclass(obj):
+        return [(obj.__code__, obj.__globals__)]
+    code = []
+    for attr in vars(obj).values():
+        if isinstance(attr, property):
+            attr = attr.fget
+        attr = getattr(attr, '__func__', attr)      # staticmethod, classmethod
+        if inspect.isfunction(attr):
+            code.append((attr.__code__, attr.__globals__))
+    return code
+
+
+def _source_closure(func):
+    """Return {qualified name: source} for func and the local helpers it uses
+
+    Helpers are the functions it calls and the classes it uses (with their
+    methods and local base classes) from the scripts directory.
+    """
+    sources = {}
+    pending = [func]
+    while pending:
+        current = pending.pop()
+        qualname = f'{current.__module__}.{current.__qualname__}'
+        if qualname in sources:
+            continue
+        sources[qualname] = inspect.getsource(current)
+        if inspect.isclass(current):
+            pending.extend(base for base in current.__bases__ if is_local(base))
+        for code, namespace in _code_of(current):
+            for name in set(_referenced_names(code)):
+                value = namespace.get(name)
+                if isinstance(value, types.ModuleType):
+                    # Checked first: any other test would load a lazy module
+                    continue
+                if _is_plain_data(value):
+                    sources[f'{current.__module__}.{name}'] = repr(value)
+                else:
+                    pending.extend(_local_code(value))
+    return sources
+
+
+def render_settings():
+    """Return the matplotlib/NumPy state that affects rendered output"""
+    import matplotlib
+    import numpy as np
+    from figure_settings import export_formats
+
+    rc = {key: repr(value) for key, value in sorted(matplotlib.rcParams.items())
+          if not key.startswith(('backend', 'interactive', 'webagg', 'keymap'))}
+    return {
+        'matplotlib': matplotlib.__version__,
+        'numpy': np.__version__,
+        'backend': matplotlib.get_backend().lower(),
+        'rcParams': rc,
+        'formats': list(export_formats()),
+    }
+
+
+def _input_path(path):
+    from datasets import dataset_path
+
+    return dataset_path(path)
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def figure_key(func, settings=None):
+    """Return the hex cache key for a create_* figure function"""
+    payload = {
+        'sources': _source_closure(func),
+        'inputs': {str(path): _file_digest(path) if path.is_file() else None
+                   for path in map(_input_path, getattr(func, 'figure_inputs', ()))},
+        'settings': settings if settings is not None else render_settings(),
+    }
+    blob = json.dumps(payload, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(blob).hexdigest()
+
+
+class FigureCache:
+    """Manifest of the cache key each figure was last rendered with"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def is_fresh(self, name, key):
+        """True if name was last built with key and all its outputs still exist"""
+        entry = self.entries.get(name)
+        return (entry is not None and entry['key'] == key
+                and all(Path(p).exists() for p in entry['outputs']))
+
+    def record(self, name, key, outputs):
+        self.entries[name] = {'key': key, 'outputs': list(outputs)}
+
+    def forget(self, name):
+        self.entries.pop(name, None)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        tmp.replace(self.path)
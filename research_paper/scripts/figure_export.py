@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Shared Figure Export Helper
+
+Lays out a figure and computes its tight bounding box once, then writes
+every requested format from that layout. Raster formats (PNG, WebP, JPEG)
+share a single Agg rasterization; vector formats (PDF, SVG) each need
+their own backend pass but reuse the precomputed bbox.
+"""
+
+import io
+
+from figure_settings import export_formats, images_dir
+
+RASTER_FORMATS = ('png', 'webp', 'jpg', 'jpeg')
+
+
+def tight_bbox(fig, dpi, pad_inches=0.1):
+    """Return the padded tight bounding box (in inches) of fig at dpi"""
+    original_dpi = fig.dpi
+    fig.dpi = dpi
+    try:
+        fig.draw_without_rendering()
+        bbox = fig.get_tightbbox(fig.canvas.get_renderer())
+    finally:
+        fig.dpi = original_dpi
+    return bbox.padded(pad_inches)
+
+
+def save_figure(fig, name, formats=None, dpi=300, pad_inches=0.1,
+                facecolor='white', **kwargs):
+    """Save fig as <images dir>/name.<fmt> for each format, laying it out once
+
+    Returns the paths written, which the create_* functions pass on to
+    the build cache.
+    """
+    formats = [fmt.lower().strip() for fmt in (formats or export_formats())]
+    output_dir = images_dir()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    bbox = tight_bbox(fig, dpi, pad_inches)
+    options = dict(bbox_inches=bbox, facecolor=facecolor, **kwargs)
+
+    written = []
+    raster = [fmt for fmt in formats if fmt in RASTER_FORMATS]
+    if raster:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi, **options)
+        image = None
+        for fmt in raster:
+            path = output_dir / f'{name}.{fmt}'
+            if fmt == 'png':
+                path.write_bytes(buffer.getvalue())
+            else:
+                if image is None:
+                    # Only WebP and JPEG need Pillow, to re-encode the PNG
+                    from PIL import Image
+
+                    buffer.seek(0)
+                    image = Image.open(buffer).convert('RGB')
+                image.save(path, quality=95, dpi=(dpi, dpi))
+            written.append(str(path))
+
+    for fmt in formats:
+        if fmt not in RASTER_FORMATS:
+            path = output_dir / f'{name}.{fmt}'
+            fig.savefig(path, format=fmt, **options)
+            written.append(str(path))
+    return written
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Shared Settings for the Figure Scripts
+
+Import this module before matplotlib.pyplot: it pins the non-interactive
+Agg backend so builds never start a GUI, and resolves where figures are
+written. The output directory comes from --output-dir, then the
+ULTRAMAN_IMAGES_DIR environment variable, then research_paper/images;
+test data is read from --data-dir, ULTRAMAN_DATA_DIR or research_paper/data
+(a data directory only needs the files it overrides; the rest are read
+from research_paper/data). --profile DIR or ULTRAMAN_PROFILE_DIR turns on
+render profiling (render_profile.py). Because the settings live in the
+environment, worker processes inherit them and concurrent builds can
+each point at their own temporary root.
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+OUTPUT_DIR_ENV = 'ULTRAMAN_IMAGES_DIR'
+FORMATS_ENV = 'FIGURE_FORMATS'
+DATA_DIR_ENV = 'ULTRAMAN_DATA_DIR'
+PROFILE_DIR_ENV = 'ULTRAMAN_PROFILE_DIR'
+DEFAULT_IMAGES_DIR = Path(__file__).resolve().parent.parent / 'images'
+DEFAULT_DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+DEFAULT_FORMATS = ('png', 'pdf')
+
+
+def lazy_import(name):
+    """Return module name, executed on its first attribute access
+
+    The figure scripts import pyplot and the patch, path and collection
+    modules this way, so importing them to list figures or check the
+    build cache doesn't pay for it.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def images_dir():
+    """Return the directory figures are written to"""
+    return Path(os.environ.get(OUTPUT_DIR_ENV) or DEFAULT_IMAGES_DIR)
+
+
+def set_images_dir(path):
+    """Point this process (and any workers it starts) at another output root"""
+    os.environ[OUTPUT_DIR_ENV] = str(Path(path).expanduser().resolve())
+
+
+def data_dir():
+    """Return the directory test data files are read from"""
+    return Path(os.environ.get(DATA_DIR_ENV) or DEFAULT_DATA_DIR)
+
+
+def set_data_dir(path):
+    """Point this process (and any workers it starts) at another data root"""
+    os.environ[DATA_DIR_ENV] = str(Path(path).expanduser().resolve())
+
+
+def profile_dir():
+    """Return the directory render profiles are written to, or None if not profiling"""
+    value = os.environ.get(PROFILE_DIR_ENV)
+    return Path(value) if value else None
+
+
+def export_formats():
+    """Return the file formats every figure is exported in"""
+    value = os.environ.get(FORMATS_ENV)
+    if not value:
+        return DEFAULT_FORMATS
+    return tuple(fmt.strip().lower() for fmt in value.split(',') if fmt.strip())
+
+
+def add_output_arguments(parser):
+    """Add the shared --output-dir, --formats, --data-dir and --profile options to a parser"""
+    parser.add_argument('-o', '--output-dir', default=None,
+                        help=f'directory for generated images (default: ${OUTPUT_DIR_ENV} '
+                             f'or {DEFAULT_IMAGES_DIR})')
+    parser.add_argument('--formats', default=None,
+                        help=f"comma-separated export formats (default: ${FORMATS_ENV} "
+                             f"or {','.join(DEFAULT_FORMATS)})")
+    parser.add_argument('--data-dir', default=None,
+                        help=f'directory of test data files (default: ${DATA_DIR_ENV} '
+                             f'or {DEFAULT_DATA_DIR})')
+    parser.add_argument('--profile', default=None, metavar='DIR',
+                        help=f'write per-figure render profiles to DIR (default: '
+                             f'${PROFILE_DIR_ENV}, or no profiling)')
+    return parser
+
+
+def apply_output_arguments(args):
+    """Apply parsed --output-dir/--formats/--data-dir/--profile options to the environment"""
+    if args.output_dir:
+        set_images_dir(args.output_dir)
+    if args.data_dir:
+        set_data_dir(args.data_dir)
+    if args.formats:
+        os.environ[FORMATS_ENV] = args.formats
+    if args.profile:
+        os.environ[PROFILE_DIR_ENV] = str(Path(args.profile).expanduser().resolve())
+
+
+def parse_script_args(description=None, argv=None):
+    """Parse the command line of a standalone generate_*.py script"""
+    parser = add_output_arguments(argparse.ArgumentParser(description=description))
+    args = parser.parse_args(argv)
+    apply_output_arguments(args)
+    if profile_dir():
+        import render_profile
+
+        render_profile.install(sys.modules['__main__'])
+    return args
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Declarative Flowchart Layout Engine
+
+A flowchart is described as a graph of typed nodes (terminal, process,
+decision, io) joined by edges. Decision branches leave sideways, and
+loop-back edges are routed up a lane beside the chart. layout() assigns
+each node a row (longest path over the forward edges) and a column
+(side branches are pushed outward until their whole subtree fits), then
+computes node positions and orthogonal arrow routes with NumPy. draw()
+renders the result through the shape helpers the caller passes in, so
+adding a step never means re-placing everything below it by hand.
+"""
+
+import numpy as np
+
+from shape_batch import flush_shapes, shape_batch
+
+SIDE_DIRECTIONS = {'down': 0, 'left': -1, 'right': 1}
+NODE_KINDS = ('terminal', 'process', 'decision', 'io')
+
+
+class FlowchartLayout:
+    """Node positions and arrow routes computed by Flowchart.layout()"""
+
+    def __init__(self, keys, kinds, texts, x, y, width, height, routes):
+        self.keys = keys
+        self.kinds = kinds
+        self.texts = texts
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        # Each route is (points array of shape (k, 2), label, edge kind)
+        self.routes = routes
+
+    def position(self, key):
+        i = self.keys.index(key)
+        return self.x[i], self.y[i]
+
+    def bounds(self):
+        """Return (xmin, xmax, ymin, ymax) covering every node and route"""
+        points = np.concatenate([r[0] for r in self.routes] + [
+            np.column_stack([self.x - self.width / 2, self.y - self.height / 2]),
+            np.column_stack([self.x + self.width / 2, self.y + self.height / 2])])
+        return points[:, 0].min(), points[:, 0].max(), points[:, 1].min(), points[:, 1].max()
+
+
+class Flowchart:
+    """Graph of flowchart steps that lays itself out"""
+
+    def __init__(self, column_gap=0.9, row_gap=0.5, lane_gap=0.45):
+        self.column_gap = column_gap
+        self.row_gap = row_gap
+        self.lane_gap = lane_gap
+        self.nodes = []
+        self.edges = []
+        self._index = {}
+
+    # -- building -----------------------------------------------------------
+
+    def add_node(self, key, kind, text, under=None):
+        """Add a step; under=<key> stacks a merge node below another node's column"""
+        if kind not in NODE_KINDS:
+            raise ValueError(f'unknown flowchart node kind {kind!r}')
+        if key in self._index:
+            raise ValueError(f'duplicate flowchart node {key!r}')
+        self._index[key] = len(self.nodes)
+        self.nodes.append({'key': key, 'kind': kind, 'text': text, 'under': under})
+        return key
+
+    def terminal(self, key, text, **options):
+        return self.add_node(key, 'terminal', text, **options)
+
+    def process(self, key, text, **options):
+        return self.add_node(key, 'process', text, **options)
+
+    def decision(self, key, text, **options):
+        return self.add_node(key, 'decision', text, **options)
+
+    def io(self, key, text, **options):
+        return self.add_node(key, 'io', text, **options)
+
+    def edge(self, src, dst, label='', side='down'):
+        """Connect two steps; side='left'/'right' branches out of a decision"""
+        if side not in SIDE_DIRECTIONS:
+            raise ValueError(f'unknown edge side {side!r}')
+        self.edges.append({'src': src, 'dst': dst, 'label': label, 'side': side, 'loop': False})
+
+    def chain(self, *keys):
+        """Connect consecutive steps top to bottom"""
+        for src, dst in zip(keys, keys[1:]):
+            self.edge(src, dst)
+
+    def loop(self, src, dst, label='', side='right'):
+        """Add a loop-back edge routed up a lane on the given side of the chart"""
+        if side not in ('left', 'right'):
+            raise ValueError(f'loop side must be left or right, not {side!r}')
+        self.edges.append({'src': src, 'dst': dst, 'label': label, 'side': side, 'loop': True})
+
+    # -- layout -------------------------------------------------------------
+
+    def _edge_arrays(self, edges):
+        src = np.array([self._index[e['src']] for e in edges], dtype=int)
+        dst = np.array([self._index[e['dst']] for e in edges], dtype=int)
+        return src, dst
+
+    def _rows(self, forward):
+        """Longest-path layering over the forward (non-loop) edges
+
+        Down edges advance one row; side branches stay on the decision's
+        row so their arrow runs straight across.
+        """
+        n = len(self.nodes)
+        src, dst = self._edge_arrays(forward)
+        step = np.array([e['side'] == 'down' for e in forward], dtype=int)
+        rows = np.zeros(n, dtype=int)
+        for _ in range(n + 1):
+            relaxed = rows.copy()
+            np.maximum.at(relaxed, dst, rows[src] + step)
+            if np.array_equal(relaxed, rows):
+                return rows
+            rows = relaxed
+        raise ValueError('flowchart has a cycle; mark loop-back edges with loop()')
+
+    def _tree(self, forward):
+        """Pick one parent per node: its 'under' target, else its first incoming edge"""
+        children = {i: [] for i in range(len(self.nodes))}
+        has_parent = set()
+        for node in self.nodes:
+            if node['under'] is not None:
+                child = self._index[node['key']]
+                children[self._index[node['under']]].append((child, 'down'))
+                has_parent.add(child)
+        for e in forward:
+            child = self._index[e['dst']]
+            if child not in has_parent:
+                children[self._index[e['src']]].append((child, e['side']))
+                has_parent.add(child)
+        roots = [i for i in range(len(self.nodes)) if i not in has_parent]
+        return children, roots
+
+    def _place(self, node, rows, children):
+        """Return {node: column} for node's subtree with node at column 0
+
+        Down children share the parent's column; side children are shifted
+        outward until neither their subtree nor the route to them (across
+        the parent's row, then down the child's column) overlaps a cell
+        (row, column) that is already taken.
+        """
+        placed = {node: 0}
+        cells = {(rows[node], 0)}
+        order = sorted(children[node], key=lambda c: c[1] != 'down')
+        for child, side in order:
+            sub = self._place(child, rows, children)
+            direction = SIDE_DIRECTIONS[side]
+            shift = 0 if direction == 0 else direction
+            while True:
+                shifted = {(rows[n], c + shift) for n, c in sub.items()}
+                run = {(rows[node], c) for c in range(min(0, shift) + 1, max(0, shift))}
+                run |= {(r, shift) for r in range(rows[node], rows[child]) if shift}
+                if not (shifted | run) & cells:
+                    break
+                shift += direction or 1
+            placed.update({n: c + shift for n, c in sub.items()})
+            cells |= shifted
+        return placed
+
+    def layout(self, sizes):
+        """Compute positions and routes; sizes maps node kind to (width, height)"""
+        n = len(self.nodes)
+        forward = [e for e in self.edges if not e['loop']]
+        rows = self._rows(forward)
+        children, roots = self._tree(forward)
+
+        # Independent subgraphs (one per start node) sit side by side
+        cols = np.zeros(n, dtype=int)
+        next_col = 0
+        for root in roots:
+            placed = self._place(root, rows, children)
+            shift = next_col - min(placed.values())
+            for i, c in placed.items():
+                cols[i] = c + shift
+            next_col = cols[list(placed)].max() + 1
+
+        kinds = [node['kind'] for node in self.nodes]
+        width = np.array([sizes[k][0] for k in kinds], dtype=float)
+        height = np.array([sizes[k][1] for k in kinds], dtype=float)
+
+        # Row pitch follows the tallest node in each pair of adjacent rows
+        row_height = np.zeros(rows.max() + 1)
+        np.maximum.at(row_height, rows, height)
+        pitch = (row_height[:-1] + row_height[1:]) / 2 + self.row_gap
+        row_y = -np.concatenate([[0.0], np.cumsum(pitch)])
+        column_pitch = width.max() + self.column_gap
+        x = cols * column_pitch
+        y = row_y[rows]
+
+        routes = self._routes(forward, rows, cols, x, y, width, height)
+        return FlowchartLayout([node['key'] for node in self.nodes], kinds,
+                               [node['text'] for node in self.nodes],
+                               x, y, width, height, routes)
+
+    def _routes(self, forward, rows, cols, x, y, width, height):
+        routes = []
+        occupied = set(zip(rows.tolist(), cols.tolist()))
+        src, dst = self._edge_arrays(forward)
+        # Anchor points for every forward edge at once
+        bottom = np.column_stack([x[src], y[src] - height[src] / 2])
+        top = np.column_stack([x[dst], y[dst] + height[dst] / 2])
+        direction = np.array([SIDE_DIRECTIONS[e['side']] for e in forward])
+        exit_side = np.column_stack([x[src] + direction * width[src] / 2, y[src]])
+        toward_src = np.sign(x[src] - x[dst])
+        enter_side = np.column_stack([x[dst] + toward_src * width[dst] / 2, y[dst]])
+
+        for k, e in enumerate(forward):
+            s, d = src[k], dst[k]
+            if direction[k] != 0 and rows[s] == rows[d]:
+                points = [exit_side[k], enter_side[k]]
+            elif direction[k] != 0:
+                points = [exit_side[k], (x[d], y[s]), top[k]]
+            elif cols[s] == cols[d]:
+                points = [bottom[k], top[k]]
+            elif any((r, cols[s]) in occupied for r in range(rows[s] + 1, rows[d] + 1)):
+                # Boxes below the source: merge along a bus outside its column
+                away = np.sign(x[s] - x[d])
+                bus = x[s] + away * (width[s] / 2 + self.lane_gap)
+                points = [(x[s] + away * width[s] / 2, y[s]), (bus, y[s]), (bus, y[d]),
+                          enter_side[k]]
+            else:
+                points = [bottom[k], (x[s], y[d]), enter_side[k]]
+            routes.append((np.array(points, dtype=float), e['label'], 'forward'))
+
+        lanes = {'left': 0, 'right': 0}
+        for e in (e for e in self.edges if e['loop']):
+            s, d = self._index[e['src']], self._index[e['dst']]
+            sign = SIDE_DIRECTIONS[e['side']]
+            lo, hi = sorted((rows[s], rows[d]))
+            span = (rows >= lo) & (rows <= hi)
+            edge = (x + sign * width / 2)[span]
+            lanes[e['side']] += 1
+            lane = (edge.max() if sign > 0 else edge.min()) + sign * self.lane_gap * lanes[e['side']]
+            below = y[s] - height[s] / 2 - self.row_gap / 2
+            points = [(x[s], y[s] - height[s] / 2), (x[s], below), (lane, below),
+                      (lane, y[d]), (x[d] + sign * width[d] / 2, y[d])]
+            routes.append((np.array(points, dtype=float), e['label'], 'loop'))
+        return routes
+
+    # -- drawing ------------------------------------------------------------
+
+    def draw(self, ax, layout, shapes, draw_arrow):
+        """Draw nodes with shapes[kind](ax, x, y, text) and routes with draw_arrow"""
+        for kind, text, x, y in zip(layout.kinds, layout.texts, layout.x, layout.y):
+            shapes[kind](ax, x, y, text)
+        lines = shape_batch(ax)
+        for points, label, _ in layout.routes:
+            if len(points) > 2:
+                # Connector runs sit under the shapes, so merge buses can
+                # pass behind boxes in the same column; the arrow is drawn
+                # over the final run
+                lines.line(points[:, 0], points[:, 1], 'k-', linewidth=1.5, zorder=0.5)
+            (x1, y1), (x2, y2) = points[-2], points[-1]
+            draw_arrow(ax, x1, y1, x2, y2)
+            if label:
+                (lx1, ly1), (lx2, ly2) = points[0], points[1]
+                if lx1 == lx2:
+                    ax.text(lx1 + 0.15, (ly1 + ly2) / 2, label, fontsize=7, color='red')
+                else:
+                    ax.text(lx1 + 0.12 * np.sign(lx2 - lx1), ly1 + 0.1, label, fontsize=7,
+                            color='red', ha='left' if lx2 > lx1 else 'right')
+        flush_shapes(ax)
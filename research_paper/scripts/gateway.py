@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Asyncio Ingestion Gateway for Station Echo Bursts
+
+The receiving end of the ESP32-S3's data link: stations send each
+measurement burst as one packed telemetry record (telemetry.record_dtype,
+46 bytes for 15 echoes) over UDP, several records per datagram allowed,
+or as a stream of records over TCP. The gateway
+
+    - copies incoming bytes into a fixed pool of batch buffers
+    - hands each full (or, after flush_interval, partial) buffer to the
+      batch worker, which appends the records to the telemetry log and
+      runs the 2-sigma outlier / median pipeline to update every
+      station's latest water level
+    - applies backpressure when all buffers are waiting: TCP readers stop
+      reading (so senders block in their socket), UDP datagrams are
+      dropped and counted
+
+Memory is bounded by the buffer pool, whatever the offered load.
+
+SensorEmulator plays back a synthetic fleet (measurement.simulate_durations)
+at a chosen reading rate, over loopback UDP/TCP or straight into the
+gateway in-process, so the service can be load-tested without a network:
+
+    python gateway.py loadtest --stations 10000 --rate 50000 --seconds 10
+    python gateway.py serve --udp 0.0.0.0:9750 --log field.ulog
+"""
+
+import argparse
+import asyncio
+import collections
+import resource
+import signal
+import socket
+import sys
+import time
+import traceback
+
+import numpy as np
+
+from measurement import DEFAULT_SAMPLES, simulate_durations, water_level
+from outlier_filter import DEFAULT_SIGMA
+from telemetry import TelemetryWriter, encode_bursts, record_dtype
+
+DEFAULT_PORT = 9750
+BATCH_RECORDS = 8192
+MAX_PENDING_BATCHES = 4
+FLUSH_INTERVAL = 0.5            # seconds before a partial batch is processed
+MAX_STATIONS = 1 << 20
+UDP_RECEIVE_BUFFER = 4 << 20
+
+
+class GatewayStats:
+    """Counters reported by the gateway"""
+
+    def __init__(self):
+        self.received = 0           # records accepted into a buffer
+        self.processed = 0          # records written and filtered
+        self.failed = 0             # records in batches whose processing raised
+        self.failed_batches = 0
+        self.dropped = 0            # records lost to UDP backpressure
+        self.malformed = 0          # datagrams/streams not a whole number of records
+        self.unknown_station = 0    # records with station >= max_stations
+        self.batches = 0
+        self.stalls = 0             # times a TCP reader waited for a free buffer
+        self.batch_seconds = 0.0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class IngestGateway:
+    """Batching, filtering and logging of incoming telemetry records"""
+
+    def __init__(self, writer=None, sensor_height=3.5, samples=DEFAULT_SAMPLES,
+                 sigma=DEFAULT_SIGMA, batch_records=BATCH_RECORDS,
+                 max_pending=MAX_PENDING_BATCHES, flush_interval=FLUSH_INTERVAL,
+                 max_stations=MAX_STATIONS, on_batch=None):
+        self.writer = writer
+        self.dtype = record_dtype(samples)
+        self.record_size = self.dtype.itemsize
+        self.sigma = sigma
+        self.sensor_height = np.asarray(sensor_height, dtype=float)
+        self.flush_interval = flush_interval
+        self.max_stations = max_stations
+        self.on_batch = on_batch
+        self.stats = GatewayStats()
+        self.latest_level = np.full(0, np.nan)
+        self.latest_time = np.full(0, np.nan)
+
+        self._capacity = batch_records * self.record_size
+        self._free = collections.deque(bytearray(self._capacity) for _ in range(max_pending + 1))
+        self._current = self._free.popleft()
+        self._fill = 0
+        self._ready = collections.deque()
+        self._work = asyncio.Event()
+        self._space = asyncio.Event()
+        self._tasks = []
+
+    # -- intake --------------------------------------------------------------
+
+    def _has_room(self, n):
+        """True if n bytes fit in the current buffer and the free ones"""
+        if self._current is None:
+            return False
+        spill = self._fill + n - self._capacity
+        return spill <= 0 or -(-spill // self._capacity) <= len(self._free)
+
+    def _write(self, data):
+        """Copy whole records into the buffers, sealing each one that fills up
+
+        Payloads longer than a buffer (a datagram larger than
+        batch_records) are split, so no buffer grows past its capacity.
+        """
+        n = len(data)
+        data = memoryview(data)
+        while data:
+            take = min(len(data), self._capacity - self._fill)
+            self._current[self._fill:self._fill + take] = data[:take]
+            self._fill += take
+            data = data[take:]
+            if self._fill == self._capacity:
+                self._seal()
+        self.stats.received += n // self.record_size
+
+    def _seal(self):
+        if self._fill:
+            self._ready.append((self._current, self._fill))
+            self._work.set()
+            self._current = self._free.popleft() if self._free else None
+            self._fill = 0
+
+    def offer(self, data):
+        """Accept bytes if there is room (UDP path); returns False if dropped"""
+        if len(data) % self.record_size:
+            self.stats.malformed += 1
+            return False
+        if not self._has_room(len(data)):
+            self.stats.dropped += len(data) // self.record_size
+            return False
+        self._write(data)
+        return True
+
+    async def put(self, data):
+        """Accept bytes, waiting for a free buffer if necessary (TCP path)"""
+        for start in range(0, len(data), self._capacity):
+            chunk = data[start:start + self._capacity]
+            while not self._has_room(len(chunk)):
+                self.stats.stalls += 1
+                self._space.clear()
+                await self._space.wait()
+            self._write(chunk)
+
+    # -- batch worker --------------------------------------------------------
+
+    def _grow_stations(self, top):
+        size = min(self.max_stations, max(top + 1, 2 * len(self.latest_level)))
+        for name in ('latest_level', 'latest_time'):
+            old = getattr(self, name)
+            new = np.full(size, np.nan)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def process(self, records):
+        """Log a batch of records and update per-station water levels"""
+        if self.writer is not None:
+            self.writer.append(records)
+        stations = records['station']
+        known = stations < self.max_stations
+        if not known.all():
+            self.stats.unknown_station += int((~known).sum())
+            records, stations = records[known], stations[known]
+        if not len(records):
+            return np.zeros(0)
+        top = int(stations.max())
+        if top >= len(self.latest_level):
+            self._grow_stations(top)
+        durations = records['durations'].astype(float)
+        durations[durations == 0] = np.nan
+        height = self.sensor_height[stations] if self.sensor_height.ndim else self.sensor_height
+        levels = water_level(durations, records['temperature'] * (1 / 16), height, self.sigma)
+        # Keep each station's newest reading (a batch may hold several)
+        order = np.argsort(records['time'], kind='stable')
+        self.latest_level[stations[order]] = levels[order]
+        self.latest_time[stations[order]] = records['time'][order]
+        if self.on_batch is not None:
+            self.on_batch(records, levels)
+        return levels
+
+    async def _worker(self):
+        while True:
+            await self._work.wait()
+            self._work.clear()
+            while self._ready:
+                buffer, fill = self._ready.popleft()
+                start = time.perf_counter()
+                records = np.frombuffer(buffer, dtype=self.dtype, count=fill // self.record_size)
+                try:
+                    self.process(records)
+                    self.stats.processed += len(records)
+                except Exception:
+                    # e.g. a full disk: count the batch and keep serving
+                    self.stats.failed += len(records)
+                    self.stats.failed_batches += 1
+                    traceback.print_exc(file=sys.stderr)
+                finally:
+                    self.stats.batches += 1
+                    self.stats.batch_seconds += time.perf_counter() - start
+                    del records
+                    if self._current is None:
+                        self._current, self._fill = buffer, 0
+                    else:
+                        self._free.append(buffer)
+                    self._space.set()
+                # Let readers refill between batches
+                await asyncio.sleep(0)
+
+    async def _flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._seal()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()), asyncio.create_task(self._flusher())]
+
+    async def drain(self):
+        """Process everything received so far; re-raises if the worker died"""
+        self._seal()
+        stats = self.stats
+        while self._ready or stats.processed + stats.failed < stats.received:
+            worker = self._tasks[0] if self._tasks else None
+            if worker is not None and worker.done():
+                # Nothing will process the rest: surface why the worker ended
+                if not worker.cancelled() and worker.exception() is not None:
+                    raise worker.exception()
+                raise RuntimeError('gateway worker stopped')
+            await asyncio.sleep(0.001)
+            self._seal()
+
+    async def stop(self):
+        await self.drain()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.writer is not None:
+            self.writer.flush()
+
+    # -- network -------------------------------------------------------------
+
+    async def serve_udp(self, host='0.0.0.0', port=DEFAULT_PORT):
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER)
+        sock.bind((host, port))
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _UdpProtocol(self), sock=sock)
+        return transport
+
+    async def serve_tcp(self, host='0.0.0.0', port=DEFAULT_PORT):
+        return await asyncio.start_server(self._handle_stream, host, port)
+
+    async def _handle_stream(self, reader, writer):
+        pending = b''
+        try:
+            while True:
+                data = await reader.read(1 << 16)
+                if not data:
+                    break
+                if pending:
+                    data = pending + data
+                whole = len(data) - len(data) % self.record_size
+                pending = data[whole:]
+                if whole:
+                    await self.put(memoryview(data)[:whole])
+        finally:
+            if pending:
+                self.stats.malformed += 1
+            writer.close()
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, gateway):
+        self.offer = gateway.offer
+
+    def datagram_received(self, data, addr):
+        self.offer(data)
+
+
+class SensorEmulator:
+    """Synthetic fleet that plays back echo bursts at a fixed total rate"""
+
+    def __init__(self, stations, rate, samples=DEFAULT_SAMPLES, seed=0):
+        self.stations = stations
+        self.rate = rate
+        durations, temperature, self.sensor_height, self.level = simulate_durations(
+            stations, samples, seed)
+        self.records = encode_bursts(0.0, np.arange(stations), durations, temperature)
+        self.sent = 0
+
+    def _tick(self, now, count):
+        """The next `count` readings, round-robin over stations, stamped `now`"""
+        rows = (self.sent + np.arange(count)) % self.stations
+        batch = self.records[rows]
+        batch['time'] = now
+        self.sent += count
+        return batch
+
+    async def _paced(self, seconds, send, tick=0.01):
+        """Call send(records) every tick with the readings due since the start"""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        while (elapsed := loop.time() - start) < seconds:
+            due = int(elapsed * self.rate) - self.sent
+            if due > 0:
+                await send(self._tick(time.time(), due))
+            await asyncio.sleep(tick)
+
+    async def feed(self, gateway, seconds):
+        """In-process playback through the UDP intake path (no sockets)"""
+        size = gateway.record_size
+
+        async def send(records):
+            data = memoryview(records.tobytes())
+            for start in range(0, len(data), size):
+                gateway.offer(data[start:start + size])
+        await self._paced(seconds, send)
+
+    async def run_udp(self, host, port, seconds, per_datagram=1):
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=(host, port))
+        step = per_datagram * self.records.dtype.itemsize
+
+        async def send(records):
+            data = memoryview(records.tobytes())
+            for i, start in enumerate(range(0, len(data), step)):
+                transport.sendto(data[start:start + step])
+                # Sharing the loop with the gateway: let it drain the socket
+                if i % 256 == 255:
+                    await asyncio.sleep(0)
+        try:
+            await self._paced(seconds, send)
+        finally:
+            transport.close()
+
+    async def run_tcp(self, host, port, seconds, connections=8):
+        streams = [await asyncio.open_connection(host, port) for _ in range(connections)]
+
+        async def send(records):
+            # Each connection carries a fixed share of the stations, like a
+            # set of field concentrators
+            for i, (_, writer) in enumerate(streams):
+                writer.write(records[records['station'] % connections == i].tobytes())
+            await asyncio.gather(*(writer.drain() for _, writer in streams))
+        try:
+            await self._paced(seconds, send)
+        finally:
+            for _, writer in streams:
+                writer.close()
+                await writer.wait_closed()
+
+
+def _address(text, default_host='127.0.0.1'):
+    host, _, port = text.rpartition(':')
+    return host or default_host, int(port)
+
+
+async def _serve(args):
+    writer = TelemetryWriter(args.log, args.samples) if args.log else None
+    gateway = IngestGateway(writer, args.sensor_height, args.samples,
+                            batch_records=args.batch)
+    gateway.start()
+    servers = []
+    if args.udp:
+        servers.append(await gateway.serve_udp(*_address(args.udp, '0.0.0.0')))
+    if args.tcp:
+        servers.append(await gateway.serve_tcp(*_address(args.tcp, '0.0.0.0')))
+    # SIGTERM/SIGINT stop the gateway cleanly so buffered records reach the log
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), 10)
+            except asyncio.TimeoutError:
+                print(gateway.stats.as_dict(), flush=True)
+    finally:
+        for server in servers:
+            server.close()
+        await gateway.stop()
+        if writer is not None:
+            writer.close()
+
+
+async def _loadtest(args):
+    emulator = SensorEmulator(args.stations, args.rate, args.samples, args.seed)
+    writer = TelemetryWriter(args.log, args.samples) if args.log else None
+    gateway = IngestGateway(writer, emulator.sensor_height, args.samples,
+                            batch_records=args.batch)
+    gateway.start()
+    start = time.perf_counter()
+    if args.transport == 'inproc':
+        await emulator.feed(gateway, args.seconds)
+    elif args.transport == 'udp':
+        transport = await gateway.serve_udp('127.0.0.1', args.port)
+        await emulator.run_udp('127.0.0.1', args.port, args.seconds, args.per_datagram)
+        await asyncio.sleep(0.1)
+        transport.close()
+    else:
+        server = await gateway.serve_tcp('127.0.0.1', args.port)
+        await emulator.run_tcp('127.0.0.1', args.port, args.seconds)
+        await asyncio.sleep(0.1)
+        server.close()
+    await gateway.stop()
+    elapsed = time.perf_counter() - start
+    if writer is not None:
+        writer.close()
+
+    stats = gateway.stats
+    seen = np.isfinite(gateway.latest_level[:args.stations])
+    error = np.abs(gateway.latest_level[:args.stations][seen] - emulator.level[seen])
+    print(f'{"transport":20s} {args.transport}')
+    print(f'{"offered":20s} {emulator.sent} readings ({emulator.sent / args.seconds:.0f}/s)')
+    print(f'{"processed":20s} {stats.processed} readings ({stats.processed / elapsed:.0f}/s)')
+    print(f'{"dropped":20s} {stats.dropped + emulator.sent - stats.received}')
+    print(f'{"batches":20s} {stats.batches} ({stats.batch_seconds * 1e3 / max(stats.batches, 1):.2f} ms each)')
+    print(f'{"tcp stalls":20s} {stats.stalls}')
+    if len(error):
+        print(f'{"median |error|":20s} {np.median(error) * 100:.2f} cm over {seen.sum()} stations')
+    print(f'{"peak RSS":20s} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='run the gateway')
+    serve.add_argument('--udp', help='[HOST:]PORT to receive datagrams on')
+    serve.add_argument('--tcp', help='[HOST:]PORT to accept record streams on')
+    serve.add_argument('--log', help='telemetry log to append to')
+    serve.add_argument('--sensor-height', type=float, default=3.5)
+
+    load = commands.add_parser('loadtest', help='gateway plus emulated fleet in one process')
+    load.add_argument('--stations', type=int, default=10_000)
+    load.add_argument('--rate', type=float, default=50_000, help='readings per second')
+    load.add_argument('--seconds', type=float, default=10.0)
+    load.add_argument('--transport', choices=['inproc', 'udp', 'tcp'], default='inproc')
+    load.add_argument('--port', type=int, default=DEFAULT_PORT)
+    load.add_argument('--per-datagram', type=int, default=1, help='records per UDP datagram')
+    load.add_argument('--log', help='telemetry log to append to')
+    load.add_argument('--seed', type=int, default=0)
+
+    for command in (serve, load):
+        command.add_argument('--samples', type=int, default=DEFAULT_SAMPLES)
+        command.add_argument('--batch', type=int, default=BATCH_RECORDS,
+                             help='records per processing batch')
+    args = parser.parse_args()
+    if args.command == 'serve' and not (args.udp or args.tcp):
+        parser.error('serve needs --udp and/or --tcp')
+    asyncio.run(_serve(args) if args.command == 'serve' else _loadtest(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,17 @@
 Generate Block Diagram for Ultrasonic Sensor System
 """
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from matplotlib.patches import FancyBboxPatch, FancyArrowPatch
-import numpy as np
+import figure_settings
+plt = figure_settings.lazy_import('matplotlib.pyplot')
+mpatches = figure_settings.lazy_import('matplotlib.patches')
+from figure_export import save_figure
+from primitives import draw_shapes, rounded_box
+from shape_batch import flush_shapes
+
+def draw_block(ax, x, y, width, height, color):
+    """Draw a rounded block with its lower left corner at (x, y)"""
+    draw_shapes(ax, rounded_box(width, height, 0.05), x + width/2, y + height/2,
+                facecolor=color, edgecolor='black', linewidth=2, joinstyle='miter')
 
 def create_block_diagram():
     fig, ax = plt.subplots(1, 1, figsize=(14, 10))
@@ -31,55 +38,39 @@ def create_block_diagram():
     
     # === ULTRASONIC TRANSDUCER SECTION ===
     # Transmitter
-    tx_box = FancyBboxPatch((0.5, 6.5), 2.5, 1.5, boxstyle="round,pad=0.05",
-                            facecolor=colors['sensor'], edgecolor='black', linewidth=2)
-    ax.add_patch(tx_box)
+    draw_block(ax, 0.5, 6.5, 2.5, 1.5, colors['sensor'])
     ax.text(1.75, 7.25, 'Ultrasonic\nTransmitter\n(40kHz)', fontsize=9, ha='center', va='center', color='white', fontweight='bold')
     
     # Receiver
-    rx_box = FancyBboxPatch((0.5, 4.5), 2.5, 1.5, boxstyle="round,pad=0.05",
-                            facecolor=colors['sensor'], edgecolor='black', linewidth=2)
-    ax.add_patch(rx_box)
+    draw_block(ax, 0.5, 4.5, 2.5, 1.5, colors['sensor'])
     ax.text(1.75, 5.25, 'Ultrasonic\nReceiver\n(40kHz)', fontsize=9, ha='center', va='center', color='white', fontweight='bold')
     
     # === DRIVER/AMPLIFIER SECTION ===
     # TX Driver
-    tx_driver = FancyBboxPatch((4, 6.5), 2.5, 1.5, boxstyle="round,pad=0.05",
-                               facecolor=colors['driver'], edgecolor='black', linewidth=2)
-    ax.add_patch(tx_driver)
+    draw_block(ax, 4, 6.5, 2.5, 1.5, colors['driver'])
     ax.text(5.25, 7.25, 'TX Driver\nCircuit\n(MAX232/TC4427)', fontsize=8, ha='center', va='center', color='white', fontweight='bold')
     
     # RX Amplifier
-    rx_amp = FancyBboxPatch((4, 4.5), 2.5, 1.5, boxstyle="round,pad=0.05",
-                            facecolor=colors['driver'], edgecolor='black', linewidth=2)
-    ax.add_patch(rx_amp)
+    draw_block(ax, 4, 4.5, 2.5, 1.5, colors['driver'])
     ax.text(5.25, 5.25, 'RX Amplifier\n+ Comparator\n(LM324/LM393)', fontsize=8, ha='center', va='center', color='white', fontweight='bold')
     
     # === LEVEL SHIFTER ===
-    level_shift = FancyBboxPatch((7.5, 5.25), 2, 1.5, boxstyle="round,pad=0.05",
-                                 facecolor=colors['protection'], edgecolor='black', linewidth=2)
-    ax.add_patch(level_shift)
+    draw_block(ax, 7.5, 5.25, 2, 1.5, colors['protection'])
     ax.text(8.5, 6, 'Level Shifter\n3.3V ↔ 5V\n(BSS138)', fontsize=8, ha='center', va='center', color='white', fontweight='bold')
     
     # === MICROCONTROLLER ===
-    mcu_box = FancyBboxPatch((10.5, 4.5), 3, 3, boxstyle="round,pad=0.05",
-                             facecolor=colors['mcu'], edgecolor='black', linewidth=2)
-    ax.add_patch(mcu_box)
+    draw_block(ax, 10.5, 4.5, 3, 3, colors['mcu'])
     ax.text(12, 6, 'ESP32-S3\nMicrocontroller', fontsize=11, ha='center', va='center', color='white', fontweight='bold')
     ax.text(12, 5.2, '• GPIO Trigger\n• GPIO Echo\n• Timer/Counter\n• ADC (Temp)', fontsize=7, ha='center', va='center', color='white')
     
     # === POWER MANAGEMENT ===
-    power_box = FancyBboxPatch((4, 1), 5.5, 2, boxstyle="round,pad=0.05",
-                               facecolor=colors['power'], edgecolor='black', linewidth=2)
-    ax.add_patch(power_box)
+    draw_block(ax, 4, 1, 5.5, 2, colors['power'])
     ax.text(6.75, 2, 'Power Management', fontsize=10, ha='center', va='center', color='white', fontweight='bold')
     ax.text(6.75, 1.4, '5V Regulator (LM7805) → 5V Rail | 3.3V Regulator (AMS1117) → 3.3V Rail', 
             fontsize=7, ha='center', va='center', color='white')
     
     # === TEMPERATURE SENSOR ===
-    temp_box = FancyBboxPatch((10.5, 1), 3, 1.5, boxstyle="round,pad=0.05",
-                              facecolor=colors['interface'], edgecolor='black', linewidth=2)
-    ax.add_patch(temp_box)
+    draw_block(ax, 10.5, 1, 3, 1.5, colors['interface'])
     ax.text(12, 1.75, 'Temperature Sensor\n(DS18B20/NTC)', fontsize=8, ha='center', va='center', color='white', fontweight='bold')
     
     # === WATER SURFACE ===
@@ -148,13 +139,13 @@ def create_block_diagram():
         mpatches.Patch(color=colors['interface'], label='Temperature Compensation')
     ]
     ax.legend(handles=legend_elements, loc='upper left', fontsize=8)
+    flush_shapes(ax)
     
     plt.tight_layout()
-    plt.savefig('/workspaces/ultraman/research_paper/images/block_diagram.png', dpi=300, bbox_inches='tight', 
-                facecolor='white', edgecolor='none')
-    plt.savefig('/workspaces/ultraman/research_paper/images/block_diagram.pdf', bbox_inches='tight',
-                facecolor='white', edgecolor='none')
+    outputs = save_figure(fig, 'block_diagram', edgecolor='none')
     print("Block diagram saved!")
+    return outputs
 
 if __name__ == "__main__":
+    figure_settings.parse_script_args(__doc__.strip().splitlines()[0])
     create_block_diagram()
@@ -3,10 +3,16 @@
 Generate Test Results Charts and Graphs
 """
 
-import matplotlib.pyplot as plt
+import figure_settings
+plt = figure_settings.lazy_import('matplotlib.pyplot')
 import numpy as np
 from matplotlib.ticker import MaxNLocator
+from datasets import load_dataset
+from downsample import axes_pixel_width, downsample_for_axes, minmax_envelope
+from figure_cache import figure_inputs
+from figure_export import save_figure
 
+@figure_inputs('distance_accuracy.csv', 'temperature_compensation.csv', 'multishot_averaging.csv')
 def create_accuracy_chart():
     """Create accuracy test results chart"""
     fig, axes = plt.subplots(2, 2, figsize=(14, 10))
@@ -16,10 +22,8 @@ def create_accuracy_chart():
     # =====================================================
     ax1 = axes[0, 0]
     
-    # Simulated test data
-    actual_distances = np.array([0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0])
-    measured_distances = actual_distances + np.random.normal(0, 0.005, len(actual_distances))
-    measured_distances = np.array([0.502, 0.998, 1.506, 2.003, 2.495, 3.008, 3.502, 3.997, 4.509, 5.004])
+    actual_distances, measured_distances = load_dataset('distance_accuracy.csv').get(
+        'actual_m', 'measured_m')
     
     ax1.plot(actual_distances, actual_distances, 'b--', linewidth=2, label='Ideal (Perfect Accuracy)')
     ax1.scatter(actual_distances, measured_distances, c='red', s=100, zorder=5, label='Measured Values')
@@ -59,9 +63,10 @@ def create_accuracy_chart():
     # =====================================================
     ax3 = axes[1, 0]
     
-    temperatures = np.array([20, 25, 30, 35, 40, 45])
-    error_without_comp = np.array([0.8, 0.4, 0.1, -0.3, -0.7, -1.2])  # cm
-    error_with_comp = np.array([0.1, 0.05, 0.02, -0.03, -0.08, -0.15])  # cm
+    temperatures, error_without_comp, error_with_comp = load_dataset(
+        'temperature_compensation.csv').get(
+        'temperature_c', 'error_without_comp_cm', 'error_with_comp_cm')  # °C, cm, cm
+    temperatures = temperatures.astype(int)
     
     x = np.arange(len(temperatures))
     width = 0.35
@@ -82,8 +87,8 @@ def create_accuracy_chart():
     # =====================================================
     ax4 = axes[1, 1]
     
-    num_samples = [1, 3, 5, 10, 15, 20]
-    std_deviation = [1.5, 0.9, 0.6, 0.35, 0.25, 0.2]  # cm
+    num_samples, std_deviation = load_dataset('multishot_averaging.csv').get(
+        'samples', 'std_cm')
     
     ax4.plot(num_samples, std_deviation, 'bo-', linewidth=2, markersize=8)
     ax4.fill_between(num_samples, std_deviation, alpha=0.3)
@@ -98,12 +103,12 @@ def create_accuracy_chart():
     ax4.set_ylim(0, 2)
     
     plt.tight_layout()
-    plt.savefig('/workspaces/ultraman/research_paper/images/accuracy_results.png', dpi=300, 
-                bbox_inches='tight', facecolor='white')
-    plt.savefig('/workspaces/ultraman/research_paper/images/accuracy_results.pdf', 
-                bbox_inches='tight', facecolor='white')
+    outputs = save_figure(fig, 'accuracy_results')
     print("Accuracy results chart saved!")
+    return outputs
 
+@figure_inputs('rain_conditions.csv', 'surface_types.csv', 'stability_24h.csv',
+               'power_vs_interval.csv')
 def create_environmental_tests():
     """Create environmental test results"""
     fig, axes = plt.subplots(2, 2, figsize=(14, 10))
@@ -113,9 +118,8 @@ def create_environmental_tests():
     # =====================================================
     ax1 = axes[0, 0]
     
-    conditions = ['Clear', 'Light Rain\n(2mm/hr)', 'Moderate Rain\n(10mm/hr)', 'Heavy Rain\n(25mm/hr)', 'Typhoon\n(50mm/hr)']
-    accuracy = [99.5, 98.8, 97.2, 94.5, 89.0]
-    colors = ['green', 'lightgreen', 'yellow', 'orange', 'red']
+    conditions, accuracy, colors = load_dataset('rain_conditions.csv').get(
+        'condition', 'accuracy_pct', 'color')
     
     bars = ax1.bar(conditions, accuracy, color=colors, edgecolor='black', linewidth=1.5)
     ax1.axhline(y=90, color='red', linestyle='--', linewidth=2, label='Minimum Acceptable (90%)')
@@ -136,8 +140,8 @@ def create_environmental_tests():
     # =====================================================
     ax2 = axes[0, 1]
     
-    surface_types = ['Still Water', 'Slow Flow\n(<0.5m/s)', 'Moderate Flow\n(0.5-1m/s)', 'Fast Flow\n(>1m/s)', 'Turbulent']
-    success_rate = [99.8, 99.2, 97.5, 93.0, 88.5]
+    surface_types, success_rate = load_dataset('surface_types.csv').get(
+        'surface', 'success_rate_pct')
     
     ax2.barh(surface_types, success_rate, color='steelblue', edgecolor='black', linewidth=1.5)
     ax2.axvline(x=90, color='red', linestyle='--', linewidth=2, label='Minimum Acceptable')
@@ -153,10 +157,16 @@ def create_environmental_tests():
     # =====================================================
     ax3 = axes[1, 0]
     
-    hours = np.arange(0, 25, 1)
     actual_level = 1.5  # meters
-    measured_levels = actual_level + np.random.normal(0, 0.008, len(hours))
-    measured_levels = np.clip(measured_levels, actual_level - 0.02, actual_level + 0.02)
+    log_hours, log_levels = load_dataset('stability_24h.csv').get('hours', 'level_m')
+    
+    # Field logs can hold millions of readings: draw an LTTB trace sized
+    # to the panel's pixel width, over a min/max band that keeps spikes
+    if len(log_levels) > axes_pixel_width(ax3):
+        band_hours, band_low, band_high = minmax_envelope(
+            log_hours, log_levels, axes_pixel_width(ax3))
+        ax3.fill_between(band_hours, band_low, band_high, color='blue', alpha=0.15, linewidth=0)
+    hours, measured_levels = downsample_for_axes(ax3, log_hours, log_levels)
     
     ax3.plot(hours, measured_levels, 'b-', linewidth=1.5, label='Measured Level')
     ax3.axhline(y=actual_level, color='green', linestyle='--', linewidth=2, label='Actual Level (1.5m)')
@@ -175,9 +185,9 @@ def create_environmental_tests():
     # =====================================================
     ax4 = axes[1, 1]
     
-    sampling_interval = [10, 30, 60, 120, 300, 600]  # seconds
-    power_consumption = [45, 28, 18, 12, 8, 5]  # mW average
-    battery_life = [48, 78, 120, 180, 270, 430]  # hours (with 10000mAh battery)
+    # seconds, mW average, hours (with 10000mAh battery)
+    sampling_interval, power_consumption, battery_life = load_dataset(
+        'power_vs_interval.csv').get('interval_s', 'power_mw', 'battery_life_h')
     
     ax4_twin = ax4.twinx()
     
@@ -196,12 +206,11 @@ def create_environmental_tests():
     ax4.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    plt.savefig('/workspaces/ultraman/research_paper/images/environmental_results.png', dpi=300, 
-                bbox_inches='tight', facecolor='white')
-    plt.savefig('/workspaces/ultraman/research_paper/images/environmental_results.pdf', 
-                bbox_inches='tight', facecolor='white')
+    outputs = save_figure(fig, 'environmental_results')
     print("Environmental test results saved!")
+    return outputs
 
+@figure_inputs('feature_scores.csv', 'sensor_costs.csv')
 def create_comparison_chart():
     """Create comparison with commercial sensors"""
     fig, axes = plt.subplots(1, 2, figsize=(14, 6))
@@ -211,13 +220,14 @@ def create_comparison_chart():
     # =====================================================
     ax1 = axes[0]
     
-    categories = ['Accuracy', 'Range', 'Cost\n(Inverse)', 'Power\nEfficiency', 'Waterproof\nRating', 'Local\nAvailability']
+    scores = load_dataset('feature_scores.csv')
+    categories = scores['category'].tolist()
     N = len(categories)
     
     # Values for each sensor (normalized 0-10 scale)
-    custom_sensor = [9, 8, 9, 8, 9, 10]  # Our sensor
-    maxbotix = [9, 8, 4, 7, 9, 3]  # MaxBotix MB7389
-    generic = [6, 7, 10, 6, 5, 8]  # Generic JSN-SR04T
+    custom_sensor = scores['custom'].tolist()  # Our sensor
+    maxbotix = scores['maxbotix'].tolist()  # MaxBotix MB7389
+    generic = scores['generic'].tolist()  # Generic JSN-SR04T
     
     angles = np.linspace(0, 2*np.pi, N, endpoint=False).tolist()
     
@@ -248,9 +258,8 @@ def create_comparison_chart():
     # =====================================================
     ax2 = plt.subplot(122)
     
-    sensors = ['Custom Sensor\n(This Study)', 'MaxBotix\nMB7389', 'Senix\nToughSonic', 'Generic\nJSN-SR04T', 'Generic\nA02YYUW']
-    costs = [850, 4500, 12000, 180, 350]  # Philippine Peso
-    colors = ['steelblue', 'coral', 'salmon', 'lightgreen', 'lightgreen']
+    sensors, costs, colors = load_dataset('sensor_costs.csv').get('sensor', 'cost_php', 'color')
+    costs = costs.astype(int)  # Philippine Peso
     
     bars = ax2.bar(sensors, costs, color=colors, edgecolor='black', linewidth=1.5)
     
@@ -269,13 +278,12 @@ def create_comparison_chart():
                 fontsize=9, color='green', fontweight='bold')
     
     plt.tight_layout()
-    plt.savefig('/workspaces/ultraman/research_paper/images/comparison_chart.png', dpi=300, 
-                bbox_inches='tight', facecolor='white')
-    plt.savefig('/workspaces/ultraman/research_paper/images/comparison_chart.pdf', 
-                bbox_inches='tight', facecolor='white')
+    outputs = save_figure(fig, 'comparison_chart')
     print("Comparison chart saved!")
+    return outputs
 
 if __name__ == "__main__":
+    figure_settings.parse_script_args(__doc__.strip().splitlines()[0])
     create_accuracy_chart()
     create_environmental_tests()
     create_comparison_chart()
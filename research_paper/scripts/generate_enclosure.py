@@ -3,12 +3,11 @@
 Generate Enclosure Design for Ultrasonic Sensor
 """
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from matplotlib.patches import Rectangle, FancyBboxPatch, Polygon, Circle, Arc, Wedge
+import figure_settings
+plt = figure_settings.lazy_import('matplotlib.pyplot')
+mpatches = figure_settings.lazy_import('matplotlib.patches')
 import numpy as np
-from mpl_toolkits.mplot3d import Axes3D
-from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+from figure_export import save_figure
 
 def create_enclosure_2d():
     """Create 2D cross-section and top view of enclosure"""
@@ -29,63 +28,63 @@ def create_enclosure_2d():
     ax1.axvline(x=0, color='k', linewidth=0.5)
     
     # Main enclosure body (rectangular top)
-    body = Rectangle((-2, 0), 4, 1.5, facecolor='#4a4a4a', edgecolor='black', linewidth=2)
+    body = mpatches.Rectangle((-2, 0), 4, 1.5, facecolor='#4a4a4a', edgecolor='black', linewidth=2)
     ax1.add_patch(body)
     
     # Cone section
-    cone = Polygon([(-2, 0), (2, 0), (0.8, -2.5), (-0.8, -2.5)],
+    cone = mpatches.Polygon([(-2, 0), (2, 0), (0.8, -2.5), (-0.8, -2.5)],
                    facecolor='#4a4a4a', edgecolor='black', linewidth=2)
     ax1.add_patch(cone)
     
     # Sensor opening at bottom
-    opening = Rectangle((-0.6, -2.5), 1.2, 0.15, facecolor='black', edgecolor='white', linewidth=1)
+    opening = mpatches.Rectangle((-0.6, -2.5), 1.2, 0.15, facecolor='black', edgecolor='white', linewidth=1)
     ax1.add_patch(opening)
     
     # PCB inside
-    pcb = Rectangle((-1.5, 0.3), 3, 0.15, facecolor='green', edgecolor='darkgreen', linewidth=1)
+    pcb = mpatches.Rectangle((-1.5, 0.3), 3, 0.15, facecolor='green', edgecolor='darkgreen', linewidth=1)
     ax1.add_patch(pcb)
     ax1.text(0, 0.37, 'PCB', fontsize=7, ha='center', va='center', color='white')
     
     # Ultrasonic transducers
-    tx = Circle((-0.5, -0.3), 0.3, facecolor='silver', edgecolor='black', linewidth=1)
+    tx = mpatches.Circle((-0.5, -0.3), 0.3, facecolor='silver', edgecolor='black', linewidth=1)
     ax1.add_patch(tx)
     ax1.text(-0.5, -0.3, 'TX', fontsize=6, ha='center', va='center')
     
-    rx = Circle((0.5, -0.3), 0.3, facecolor='silver', edgecolor='black', linewidth=1)
+    rx = mpatches.Circle((0.5, -0.3), 0.3, facecolor='silver', edgecolor='black', linewidth=1)
     ax1.add_patch(rx)
     ax1.text(0.5, -0.3, 'RX', fontsize=6, ha='center', va='center')
     
     # Sound wave representation
     for i in range(4):
-        arc = Arc((0, -2.5), 1 + i*0.5, 0.8 + i*0.3, angle=0, theta1=30, theta2=150,
+        arc = mpatches.Arc((0, -2.5), 1 + i*0.5, 0.8 + i*0.3, angle=0, theta1=30, theta2=150,
                  linewidth=1, color='blue', linestyle='--', alpha=0.5)
         ax1.add_patch(arc)
     ax1.text(0, -3.5, 'Ultrasonic Waves', fontsize=8, ha='center', color='blue', style='italic')
     
     # O-ring seal
-    oring = Rectangle((-2.1, -0.05), 0.15, 0.1, facecolor='red', edgecolor='darkred')
+    oring = mpatches.Rectangle((-2.1, -0.05), 0.15, 0.1, facecolor='red', edgecolor='darkred')
     ax1.add_patch(oring)
-    oring2 = Rectangle((1.95, -0.05), 0.15, 0.1, facecolor='red', edgecolor='darkred')
+    oring2 = mpatches.Rectangle((1.95, -0.05), 0.15, 0.1, facecolor='red', edgecolor='darkred')
     ax1.add_patch(oring2)
     
     # Cable gland
-    gland = FancyBboxPatch((1.8, 0.8), 0.6, 0.5, boxstyle="round,pad=0.02",
+    gland = mpatches.FancyBboxPatch((1.8, 0.8), 0.6, 0.5, boxstyle="round,pad=0.02",
                            facecolor='gray', edgecolor='black', linewidth=1)
     ax1.add_patch(gland)
     ax1.text(2.5, 1.05, 'Cable\nGland', fontsize=6, va='center')
     
     # Mounting bracket
-    bracket = Polygon([(-2.3, 1.5), (-2.3, 1.8), (-1.5, 1.8), (-1.5, 1.5)],
+    bracket = mpatches.Polygon([(-2.3, 1.5), (-2.3, 1.8), (-1.5, 1.8), (-1.5, 1.5)],
                      facecolor='gray', edgecolor='black', linewidth=1)
     ax1.add_patch(bracket)
-    bracket2 = Polygon([(2.3, 1.5), (2.3, 1.8), (1.5, 1.8), (1.5, 1.5)],
+    bracket2 = mpatches.Polygon([(2.3, 1.5), (2.3, 1.8), (1.5, 1.8), (1.5, 1.5)],
                       facecolor='gray', edgecolor='black', linewidth=1)
     ax1.add_patch(bracket2)
     
     # Mounting holes
-    hole1 = Circle((-1.9, 1.65), 0.1, facecolor='white', edgecolor='black')
+    hole1 = mpatches.Circle((-1.9, 1.65), 0.1, facecolor='white', edgecolor='black')
     ax1.add_patch(hole1)
-    hole2 = Circle((1.9, 1.65), 0.1, facecolor='white', edgecolor='black')
+    hole2 = mpatches.Circle((1.9, 1.65), 0.1, facecolor='white', edgecolor='black')
     ax1.add_patch(hole2)
     
     # Dimension lines
@@ -116,37 +115,37 @@ def create_enclosure_2d():
     ax2.grid(True, alpha=0.3)
     
     # Outer body
-    outer = Rectangle((-2, -2), 4, 4, facecolor='#4a4a4a', edgecolor='black', linewidth=2)
+    outer = mpatches.Rectangle((-2, -2), 4, 4, facecolor='#4a4a4a', edgecolor='black', linewidth=2)
     ax2.add_patch(outer)
     
     # Mounting tabs
-    tab1 = Rectangle((-2.3, 1.5), 0.8, 0.3, facecolor='gray', edgecolor='black', linewidth=1)
+    tab1 = mpatches.Rectangle((-2.3, 1.5), 0.8, 0.3, facecolor='gray', edgecolor='black', linewidth=1)
     ax2.add_patch(tab1)
-    tab2 = Rectangle((1.5, 1.5), 0.8, 0.3, facecolor='gray', edgecolor='black', linewidth=1)
+    tab2 = mpatches.Rectangle((1.5, 1.5), 0.8, 0.3, facecolor='gray', edgecolor='black', linewidth=1)
     ax2.add_patch(tab2)
-    tab3 = Rectangle((-2.3, -1.8), 0.8, 0.3, facecolor='gray', edgecolor='black', linewidth=1)
+    tab3 = mpatches.Rectangle((-2.3, -1.8), 0.8, 0.3, facecolor='gray', edgecolor='black', linewidth=1)
     ax2.add_patch(tab3)
-    tab4 = Rectangle((1.5, -1.8), 0.8, 0.3, facecolor='gray', edgecolor='black', linewidth=1)
+    tab4 = mpatches.Rectangle((1.5, -1.8), 0.8, 0.3, facecolor='gray', edgecolor='black', linewidth=1)
     ax2.add_patch(tab4)
     
     # Mounting holes
     for hx, hy in [(-1.9, 1.65), (1.9, 1.65), (-1.9, -1.65), (1.9, -1.65)]:
-        hole = Circle((hx, hy), 0.12, facecolor='white', edgecolor='black', linewidth=1)
+        hole = mpatches.Circle((hx, hy), 0.12, facecolor='white', edgecolor='black', linewidth=1)
         ax2.add_patch(hole)
     
     # Inner cavity
-    inner = Rectangle((-1.5, -1.5), 3, 3, facecolor='#606060', edgecolor='gray', linewidth=1, linestyle='--')
+    inner = mpatches.Rectangle((-1.5, -1.5), 3, 3, facecolor='#606060', edgecolor='gray', linewidth=1, linestyle='--')
     ax2.add_patch(inner)
     ax2.text(0, 0, 'Internal\nCavity', fontsize=8, ha='center', va='center', color='white')
     
     # Cable gland position
-    gland_pos = Circle((1.8, 0), 0.25, facecolor='gray', edgecolor='black', linewidth=2)
+    gland_pos = mpatches.Circle((1.8, 0), 0.25, facecolor='gray', edgecolor='black', linewidth=2)
     ax2.add_patch(gland_pos)
     ax2.text(2.5, 0, 'Cable\nGland', fontsize=6, va='center')
     
     # Lid screws
     for sx, sy in [(-1.3, 1.3), (1.3, 1.3), (-1.3, -1.3), (1.3, -1.3)]:
-        screw = Circle((sx, sy), 0.1, facecolor='silver', edgecolor='black', linewidth=1)
+        screw = mpatches.Circle((sx, sy), 0.1, facecolor='silver', edgecolor='black', linewidth=1)
         ax2.add_patch(screw)
     
     # Dimensions
@@ -159,14 +158,15 @@ def create_enclosure_2d():
     ax2.text(2.7, 0, '8 cm', fontsize=8, ha='center', color='red', rotation=90)
     
     plt.tight_layout()
-    plt.savefig('/workspaces/ultraman/research_paper/images/enclosure_2d.png', dpi=300, 
-                bbox_inches='tight', facecolor='white')
-    plt.savefig('/workspaces/ultraman/research_paper/images/enclosure_2d.pdf', 
-                bbox_inches='tight', facecolor='white')
+    outputs = save_figure(fig, 'enclosure_2d')
     print("2D enclosure design saved!")
+    return outputs
 
 def create_enclosure_3d():
     """Create 3D isometric view of enclosure"""
+    # Only this figure needs the 3D toolkit
+    from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+
     fig = plt.figure(figsize=(12, 10))
     ax = fig.add_subplot(111, projection='3d')
     
@@ -297,11 +297,9 @@ def create_enclosure_3d():
     ax.set_zlim(-4, 3)
     
     plt.tight_layout()
-    plt.savefig('/workspaces/ultraman/research_paper/images/enclosure_3d.png', dpi=300, 
-                bbox_inches='tight', facecolor='white')
-    plt.savefig('/workspaces/ultraman/research_paper/images/enclosure_3d.pdf', 
-                bbox_inches='tight', facecolor='white')
+    outputs = save_figure(fig, 'enclosure_3d')
     print("3D enclosure design saved!")
+    return outputs
 
 def create_mounting_diagram():
     """Create pole mounting installation diagram"""
@@ -313,32 +311,32 @@ def create_mounting_diagram():
     ax.set_title('Installation Diagram - Pole Mounting', fontsize=14, fontweight='bold')
     
     # Ground level
-    ground = Rectangle((-3, 0), 10, 0.3, facecolor='#8B4513', edgecolor='black', linewidth=2)
+    ground = mpatches.Rectangle((-3, 0), 10, 0.3, facecolor='#8B4513', edgecolor='black', linewidth=2)
     ax.add_patch(ground)
     ax.text(2, -0.3, 'Ground Level', fontsize=9, ha='center')
     
     # Water surface (flood level)
-    water = Rectangle((-3, 0.3), 10, 2, facecolor='#87CEEB', edgecolor='blue', linewidth=1, alpha=0.6)
+    water = mpatches.Rectangle((-3, 0.3), 10, 2, facecolor='#87CEEB', edgecolor='blue', linewidth=1, alpha=0.6)
     ax.add_patch(water)
     ax.text(2, 1.3, 'Flood Water Level', fontsize=9, ha='center', color='darkblue')
     
     # Mounting pole
-    pole = Rectangle((0, 0.3), 0.4, 10, facecolor='gray', edgecolor='black', linewidth=2)
+    pole = mpatches.Rectangle((0, 0.3), 0.4, 10, facecolor='gray', edgecolor='black', linewidth=2)
     ax.add_patch(pole)
     ax.text(0.7, 5, 'Steel/Concrete\nPole (3-4m)', fontsize=8, va='center')
     
     # Sensor enclosure
-    enclosure_body = Rectangle((-0.8, 8), 2, 1.2, facecolor='#4a4a4a', edgecolor='black', linewidth=2)
+    enclosure_body = mpatches.Rectangle((-0.8, 8), 2, 1.2, facecolor='#4a4a4a', edgecolor='black', linewidth=2)
     ax.add_patch(enclosure_body)
     
     # Cone
-    cone = Polygon([(-0.8, 8), (1.2, 8), (0.6, 6.5), (-0.2, 6.5)],
+    cone = mpatches.Polygon([(-0.8, 8), (1.2, 8), (0.6, 6.5), (-0.2, 6.5)],
                    facecolor='#4a4a4a', edgecolor='black', linewidth=2)
     ax.add_patch(cone)
     ax.text(0.2, 8.6, 'Sensor', fontsize=8, ha='center', va='center', color='white')
     
     # Mounting bracket
-    bracket = Rectangle((-0.2, 9.2), 0.6, 0.3, facecolor='silver', edgecolor='black', linewidth=1)
+    bracket = mpatches.Rectangle((-0.2, 9.2), 0.6, 0.3, facecolor='silver', edgecolor='black', linewidth=1)
     ax.add_patch(bracket)
     
     # Cable going up
@@ -346,14 +344,14 @@ def create_mounting_diagram():
     ax.text(1.8, 9.5, 'Power/Data\nCable', fontsize=7)
     
     # Solar panel (on top)
-    solar = Polygon([(0, 10.5), (-1, 11.5), (1.5, 11.5), (0.5, 10.5)],
+    solar = mpatches.Polygon([(0, 10.5), (-1, 11.5), (1.5, 11.5), (0.5, 10.5)],
                     facecolor='darkblue', edgecolor='black', linewidth=2)
     ax.add_patch(solar)
     ax.text(0.25, 11.7, 'Solar Panel', fontsize=8, ha='center')
     
     # Sound waves
     for i in range(5):
-        arc = Arc((0.2, 6.5), 1 + i*0.6, 0.6 + i*0.3, angle=0, theta1=20, theta2=160,
+        arc = mpatches.Arc((0.2, 6.5), 1 + i*0.6, 0.6 + i*0.3, angle=0, theta1=20, theta2=160,
                  linewidth=1, color='blue', linestyle='--', alpha=0.5)
         ax.add_patch(arc)
     
@@ -385,13 +383,12 @@ def create_mounting_diagram():
             bbox=dict(boxstyle='round', facecolor='lightyellow', alpha=0.8))
     
     plt.tight_layout()
-    plt.savefig('/workspaces/ultraman/research_paper/images/mounting_diagram.png', dpi=300, 
-                bbox_inches='tight', facecolor='white')
-    plt.savefig('/workspaces/ultraman/research_paper/images/mounting_diagram.pdf', 
-                bbox_inches='tight', facecolor='white')
+    outputs = save_figure(fig, 'mounting_diagram')
     print("Mounting diagram saved!")
+    return outputs
 
 if __name__ == "__main__":
+    figure_settings.parse_script_args(__doc__.strip().splitlines()[0])
     create_enclosure_2d()
     create_enclosure_3d()
     create_mounting_diagram()
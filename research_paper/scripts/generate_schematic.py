@@ -4,64 +4,54 @@ Generate Circuit Schematic for Custom Ultrasonic Sensor
 Using matplotlib for professional-looking schematic
 """
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from matplotlib.patches import Rectangle, Circle, FancyBboxPatch, Arc, Polygon
-from matplotlib.lines import Line2D
+import figure_settings
+plt = figure_settings.lazy_import('matplotlib.pyplot')
 import numpy as np
+from figure_export import save_figure
+from primitives import arc, draw_shapes, draw_strokes, rounded_box, triangle, zigzag
+from shape_batch import flush_shapes, shape_batch
 
 def draw_resistor(ax, x, y, width=0.8, height=0.2, label='', value='', vertical=False):
     """Draw a resistor symbol"""
     if vertical:
         # Vertical resistor
-        points = []
-        num_zigs = 6
-        for i in range(num_zigs + 1):
-            px = x + (0.15 if i % 2 == 1 else -0.15 if i % 2 == 0 and i > 0 else 0)
-            py = y + (i / num_zigs) * height
-            points.append([px, py])
-        points = np.array(points)
-        ax.plot(points[:, 0], points[:, 1], 'k-', linewidth=1.5)
+        draw_strokes(ax, zigzag(), x, y, 0.15, height, swap=True, fmt='k-', linewidth=1.5)
         if label:
             ax.text(x + 0.25, y + height/2, f'{label}\n{value}', fontsize=6, va='center')
     else:
         # Horizontal resistor
-        points = []
-        num_zigs = 6
-        for i in range(num_zigs + 1):
-            px = x + (i / num_zigs) * width
-            py = y + (0.1 if i % 2 == 1 else -0.1 if i % 2 == 0 and i > 0 else 0)
-            points.append([px, py])
-        points = np.array(points)
-        ax.plot(points[:, 0], points[:, 1], 'k-', linewidth=1.5)
+        draw_strokes(ax, zigzag(), x, y, width, 0.1, fmt='k-', linewidth=1.5)
         if label:
             ax.text(x + width/2, y + 0.25, f'{label}\n{value}', fontsize=6, ha='center')
 
 def draw_capacitor(ax, x, y, label='', value='', vertical=False):
     """Draw a capacitor symbol"""
     if vertical:
-        ax.plot([x-0.15, x+0.15], [y, y], 'k-', linewidth=2)
-        ax.plot([x-0.15, x+0.15], [y+0.1, y+0.1], 'k-', linewidth=2)
+        plates = [[(x-0.15, y), (x+0.15, y)], [(x-0.15, y+0.1), (x+0.15, y+0.1)]]
+        shape_batch(ax).segments(plates, 'k-', linewidth=2)
         if label:
             ax.text(x + 0.25, y + 0.05, f'{label}\n{value}', fontsize=6, va='center')
     else:
-        ax.plot([x, x], [y-0.15, y+0.15], 'k-', linewidth=2)
-        ax.plot([x+0.1, x+0.1], [y-0.15, y+0.15], 'k-', linewidth=2)
+        plates = [[(x, y-0.15), (x, y+0.15)], [(x+0.1, y-0.15), (x+0.1, y+0.15)]]
+        shape_batch(ax).segments(plates, 'k-', linewidth=2)
         if label:
             ax.text(x + 0.05, y + 0.3, f'{label}\n{value}', fontsize=6, ha='center')
 
 def draw_transistor_nmos(ax, x, y, label=''):
     """Draw N-channel MOSFET"""
-    # Gate
-    ax.plot([x-0.3, x], [y, y], 'k-', linewidth=1.5)
-    ax.plot([x, x], [y-0.2, y+0.2], 'k-', linewidth=2)
-    # Channel
-    ax.plot([x+0.1, x+0.1], [y-0.25, y+0.25], 'k-', linewidth=1.5)
-    # Source and Drain
-    ax.plot([x+0.1, x+0.3], [y-0.2, y-0.2], 'k-', linewidth=1.5)
-    ax.plot([x+0.1, x+0.3], [y+0.2, y+0.2], 'k-', linewidth=1.5)
-    ax.plot([x+0.3, x+0.3], [y-0.2, y-0.35], 'k-', linewidth=1.5)
-    ax.plot([x+0.3, x+0.3], [y+0.2, y+0.35], 'k-', linewidth=1.5)
+    batch = shape_batch(ax)
+    # Gate plate
+    batch.segments([[(x, y-0.2), (x, y+0.2)]], 'k-', linewidth=2)
+    # Gate lead, channel, source and drain
+    leads = np.array([
+        [(-0.3, 0), (0, 0)],
+        [(0.1, -0.25), (0.1, 0.25)],
+        [(0.1, -0.2), (0.3, -0.2)],
+        [(0.1, 0.2), (0.3, 0.2)],
+        [(0.3, -0.2), (0.3, -0.35)],
+        [(0.3, 0.2), (0.3, 0.35)],
+    ])
+    batch.segments(leads + (x, y), 'k-', linewidth=1.5)
     # Arrow
     ax.annotate('', xy=(x+0.2, y), xytext=(x+0.1, y),
                 arrowprops=dict(arrowstyle='->', color='black', lw=1))
@@ -70,9 +60,7 @@ def draw_transistor_nmos(ax, x, y, label=''):
 
 def draw_opamp(ax, x, y, label=''):
     """Draw op-amp triangle"""
-    triangle = Polygon([(x, y-0.4), (x, y+0.4), (x+0.6, y)], 
-                       fill=False, edgecolor='black', linewidth=1.5)
-    ax.add_patch(triangle)
+    draw_shapes(ax, triangle(), x, y, 0.6, 0.4, fill=False, edgecolor='black', linewidth=1.5)
     ax.text(x+0.1, y+0.15, '+', fontsize=8)
     ax.text(x+0.1, y-0.15, '-', fontsize=8)
     if label:
@@ -80,39 +68,43 @@ def draw_opamp(ax, x, y, label=''):
 
 def draw_transducer(ax, x, y, label='TX'):
     """Draw ultrasonic transducer symbol"""
+    batch = shape_batch(ax)
     # Main circle
-    circle = Circle((x, y), 0.35, fill=False, edgecolor='black', linewidth=2)
-    ax.add_patch(circle)
+    batch.circles(x, y, 0.35, fill=False, edgecolor='black', linewidth=2)
     # Inner element
-    inner = Circle((x, y), 0.2, fill=True, facecolor='lightgray', edgecolor='black', linewidth=1)
-    ax.add_patch(inner)
-    # Sound waves
-    for i in range(3):
-        arc = Arc((x + 0.5 + i*0.15, y), 0.2, 0.4, angle=0, theta1=60, theta2=300, 
-                 linewidth=1, color='blue')
-        ax.add_patch(arc)
+    batch.circles(x, y, 0.2, facecolor='lightgray', edgecolor='black', linewidth=1)
+    # Sound waves (three 60-300 degree arcs of a 0.2 x 0.4 ellipse)
+    draw_strokes(ax, arc(60, 300), x + 0.5 + 0.15 * np.arange(3), y, 0.1, 0.2,
+                 color='blue', linewidth=1, capstyle='butt')
     ax.text(x, y, label, fontsize=8, ha='center', va='center', fontweight='bold')
 
+def pin_leads(x0, x1, ys):
+    """Return horizontal segments from x0 to x1 at height ys, shape (n, 2, 2)
+
+    All arguments broadcast, so one call draws a whole row of pins or bars.
+    """
+    x0, x1, ys = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float))
+                                       for v in (x0, x1, ys)))
+    return np.stack([np.stack([x0, ys], axis=-1), np.stack([x1, ys], axis=-1)], axis=1)
+
 def draw_ic_package(ax, x, y, width, height, label, pins_left, pins_right):
     """Draw IC package with pins"""
-    rect = FancyBboxPatch((x, y), width, height, boxstyle="round,pad=0.02",
-                          facecolor='lightgray', edgecolor='black', linewidth=1.5)
-    ax.add_patch(rect)
+    draw_shapes(ax, rounded_box(width, height, 0.02), x + width/2, y + height/2,
+                facecolor='lightgray', edgecolor='black', linewidth=1.5, joinstyle='miter')
     ax.text(x + width/2, y + height/2, label, fontsize=8, ha='center', va='center', fontweight='bold')
     
+    batch = shape_batch(ax)
     # Left pins
-    pin_spacing = height / (len(pins_left) + 1)
-    for i, pin in enumerate(pins_left):
-        py = y + height - (i + 1) * pin_spacing
-        ax.plot([x-0.2, x], [py, py], 'k-', linewidth=1.5)
-        ax.text(x-0.25, py, pin, fontsize=5, ha='right', va='center')
+    py = y + height - np.arange(1, len(pins_left) + 1) * height / (len(pins_left) + 1)
+    batch.segments(pin_leads(x-0.2, x, py), 'k-', linewidth=1.5)
+    for pin, pin_y in zip(pins_left, py):
+        ax.text(x-0.25, pin_y, pin, fontsize=5, ha='right', va='center')
     
     # Right pins
-    pin_spacing = height / (len(pins_right) + 1)
-    for i, pin in enumerate(pins_right):
-        py = y + height - (i + 1) * pin_spacing
-        ax.plot([x+width, x+width+0.2], [py, py], 'k-', linewidth=1.5)
-        ax.text(x+width+0.25, py, pin, fontsize=5, ha='left', va='center')
+    py = y + height - np.arange(1, len(pins_right) + 1) * height / (len(pins_right) + 1)
+    batch.segments(pin_leads(x+width, x+width+0.2, py), 'k-', linewidth=1.5)
+    for pin, pin_y in zip(pins_right, py):
+        ax.text(x+width+0.25, pin_y, pin, fontsize=5, ha='left', va='center')
 
 def create_schematic():
     fig, ax = plt.subplots(1, 1, figsize=(16, 12))
@@ -120,6 +112,7 @@ def create_schematic():
     ax.set_ylim(-1, 12)
     ax.set_aspect('equal')
     ax.axis('off')
+    batch = shape_batch(ax)
     
     # Title
     ax.text(7.5, 11.5, 'Custom Ultrasonic Sensor - Complete Circuit Schematic', 
@@ -153,10 +146,10 @@ def create_schematic():
                    ['OUT_A', 'NC', 'OUT_B', 'NC'])
     
     # Connections from driver to transducer
-    ax.plot([1.35, 2.5, 2.5, 3.3], [8.5, 8.5, 9.0, 9.0], 'b-', linewidth=1.5)
-    ax.plot([3.3, 3.5], [9.0, 9.0], 'b-', linewidth=1.5)
-    ax.plot([5, 5.5, 5.5], [9.0, 9.0, 8.5], 'b-', linewidth=1.5)
-    ax.plot([5, 5.5, 5.5], [8.4, 8.4, 8.5], 'b-', linewidth=1.5)
+    batch.line([1.35, 2.5, 2.5, 3.3], [8.5, 8.5, 9.0, 9.0], 'b-', linewidth=1.5)
+    batch.line([3.3, 3.5], [9.0, 9.0], 'b-', linewidth=1.5)
+    batch.line([5, 5.5, 5.5], [9.0, 9.0, 8.5], 'b-', linewidth=1.5)
+    batch.line([5, 5.5, 5.5], [8.4, 8.4, 8.5], 'b-', linewidth=1.5)
     
     # Coupling capacitors
     draw_capacitor(ax, 2.5, 8.2, 'C1', '100nF')
@@ -171,28 +164,28 @@ def create_schematic():
     draw_opamp(ax, 3.5, 5.5, 'U2A')
     
     # Feedback resistor
-    ax.plot([3.5, 3.5, 4.5, 4.5], [5.9, 6.3, 6.3, 5.5], 'k-', linewidth=1)
+    batch.line([3.5, 3.5, 4.5, 4.5], [5.9, 6.3, 6.3, 5.5], 'k-', linewidth=1)
     draw_resistor(ax, 3.7, 6.3, 0.6, 0.15, 'R2', '100kΩ')
     
     # Input from RX transducer
-    ax.plot([1.35, 2.5, 2.5, 3.5], [6, 6, 5.65, 5.65], 'g-', linewidth=1.5)
+    batch.line([1.35, 2.5, 2.5, 3.5], [6, 6, 5.65, 5.65], 'g-', linewidth=1.5)
     
     # Coupling cap
     draw_capacitor(ax, 2.5, 5.65, 'C2', '100nF')
     
     # Bias resistor
     draw_resistor(ax, 2.8, 5.2, 0.5, 0.15, 'R1', '10kΩ')
-    ax.plot([2.8, 2.8], [5.2, 5.35], 'k-', linewidth=1)
-    ax.plot([2.8, 2.8], [5.05, 4.9], 'k-', linewidth=1)
+    batch.line([2.8, 2.8], [5.2, 5.35], 'k-', linewidth=1)
+    batch.line([2.8, 2.8], [5.05, 4.9], 'k-', linewidth=1)
     
     # Second stage - comparator
     draw_opamp(ax, 5, 5.5, 'U2B')
-    ax.plot([4.1, 4.5, 4.5, 5], [5.5, 5.5, 5.65, 5.65], 'k-', linewidth=1.5)
+    batch.line([4.1, 4.5, 4.5, 5], [5.5, 5.5, 5.65, 5.65], 'k-', linewidth=1.5)
     
     # Threshold reference
     draw_resistor(ax, 4.5, 4.8, 0.5, 0.15, 'R3', '10kΩ')
     draw_resistor(ax, 4.5, 4.4, 0.5, 0.15, 'R4', '10kΩ')
-    ax.plot([5, 4.75, 4.75], [5.35, 5.35, 4.95], 'k-', linewidth=1)
+    batch.line([5, 4.75, 4.75], [5.35, 5.35, 4.95], 'k-', linewidth=1)
     
     # =====================================================
     # SECTION 4: LEVEL SHIFTER (BSS138)
@@ -240,19 +233,18 @@ def create_schematic():
     draw_capacitor(ax, 6.8, 2.8, 'C5', '10µF', vertical=True)
     
     # Power rails
-    ax.plot([0.8, 2], [3, 3], 'r-', linewidth=2)
-    ax.plot([3.2, 5], [3, 3], 'r-', linewidth=2)
-    ax.plot([6.2, 7], [3, 3], 'orange', linewidth=2)
+    batch.line([0.8, 2], [3, 3], 'r-', linewidth=2)
+    batch.line([3.2, 5], [3, 3], 'r-', linewidth=2)
+    batch.line([6.2, 7], [3, 3], color='orange', linewidth=2)
     
     ax.text(3.5, 3.3, '5V Rail', fontsize=7, ha='center', color='red', fontweight='bold')
     ax.text(6.5, 3.3, '3.3V Rail', fontsize=7, ha='center', color='orange', fontweight='bold')
     
-    # Ground symbols
-    for gx in [1.3, 2.6, 3.8, 5.6, 6.8]:
-        ax.plot([gx, gx], [2.3, 2.1], 'k-', linewidth=2)
-        ax.plot([gx-0.1, gx+0.1], [2.1, 2.1], 'k-', linewidth=2)
-        ax.plot([gx-0.07, gx+0.07], [2.0, 2.0], 'k-', linewidth=1.5)
-        ax.plot([gx-0.04, gx+0.04], [1.9, 1.9], 'k-', linewidth=1)
+    # Ground symbols: a stub and three shrinking bars under each ground point
+    gx = np.array([1.3, 2.6, 3.8, 5.6, 6.8])
+    batch.segments(pin_leads(2.3, 2.1, gx)[..., ::-1], 'k-', linewidth=2)
+    for half_width, gy, lw in [(0.1, 2.1, 2), (0.07, 2.0, 1.5), (0.04, 1.9, 1)]:
+        batch.segments(pin_leads(gx - half_width, gx + half_width, gy), 'k-', linewidth=lw)
     
     # =====================================================
     # SECTION 6: ESP32-S3 CONNECTION HEADER
@@ -261,18 +253,16 @@ def create_schematic():
             bbox=dict(boxstyle='round', facecolor='lightgray'))
     
     # Connection header
-    header = FancyBboxPatch((10, 6), 2.5, 3.5, boxstyle="round,pad=0.05",
-                            facecolor='white', edgecolor='black', linewidth=2)
-    ax.add_patch(header)
+    draw_shapes(ax, rounded_box(2.5, 3.5, 0.05), 11.25, 7.75,
+                facecolor='white', edgecolor='black', linewidth=2, joinstyle='miter')
     ax.text(11.25, 9.3, 'ESP32-S3', fontsize=10, ha='center', fontweight='bold')
     
     pins = ['3.3V (Power)', 'GND', 'GPIO4 (TRIG)', 'GPIO5 (ECHO)', 'GPIO6 (TEMP)']
-    for i, pin in enumerate(pins):
-        py = 8.8 - i * 0.5
-        ax.plot([9.5, 10], [py, py], 'k-', linewidth=1.5)
-        circle = Circle((9.4, py), 0.08, fill=True, facecolor='gold', edgecolor='black')
-        ax.add_patch(circle)
-        ax.text(10.2, py, pin, fontsize=7, va='center')
+    py = 8.8 - np.arange(len(pins)) * 0.5
+    batch.segments(pin_leads(9.5, 10, py), 'k-', linewidth=1.5)
+    batch.circles(9.4, py, 0.08, facecolor='gold', edgecolor='black')
+    for pin, pin_y in zip(pins, py):
+        ax.text(10.2, pin_y, pin, fontsize=7, va='center')
     
     # =====================================================
     # SECTION 7: TEMPERATURE SENSOR
@@ -290,18 +280,18 @@ def create_schematic():
     # CONNECTION LINES
     # =====================================================
     # Level shifter to ESP32
-    ax.plot([8.3, 9.5], [8.5, 7.8], 'b-', linewidth=1.5)  # TRIG
-    ax.plot([8.3, 9.5], [6.5, 7.3], 'g-', linewidth=1.5)  # ECHO
+    batch.line([8.3, 9.5], [8.5, 7.8], 'b-', linewidth=1.5)  # TRIG
+    batch.line([8.3, 9.5], [6.5, 7.3], 'g-', linewidth=1.5)  # ECHO
     
     # RX amp output to level shifter
-    ax.plot([5.6, 6.5, 6.5, 7.2], [5.5, 5.5, 6.5, 6.5], 'g-', linewidth=1.5)
+    batch.line([5.6, 6.5, 6.5, 7.2], [5.5, 5.5, 6.5, 6.5], 'g-', linewidth=1.5)
     
     # Level shifter to TX driver
-    ax.plot([7.2, 6.5, 6.5, 5.5, 5.5, 5], [8.5, 8.5, 8.5, 8.5, 8.5, 8.7], 'b-', linewidth=1.5)
+    batch.line([7.2, 6.5, 6.5, 5.5, 5.5, 5], [8.5, 8.5, 8.5, 8.5, 8.5, 8.7], 'b-', linewidth=1.5)
     
     # Power connections
-    ax.plot([7, 7, 7.2], [3, 7.4, 7.4], 'orange', linewidth=1.5, linestyle='--')
-    ax.plot([3.5, 3.5, 3.5], [3.3, 4.5, 7.8], 'r-', linewidth=1.5, linestyle='--')
+    batch.line([7, 7, 7.2], [3, 7.4, 7.4], color='orange', linewidth=1.5, linestyle='--')
+    batch.line([3.5, 3.5, 3.5], [3.3, 4.5, 7.8], 'r--', linewidth=1.5)
     
     # =====================================================
     # NOTES
@@ -320,12 +310,13 @@ def create_schematic():
     # Revision info
     ax.text(14.5, 0.5, 'Rev: 1.0\nDate: 2025', fontsize=6, ha='center')
     
+    flush_shapes(ax)
+    
     plt.tight_layout()
-    plt.savefig('/workspaces/ultraman/research_paper/images/circuit_schematic.png', dpi=300, 
-                bbox_inches='tight', facecolor='white')
-    plt.savefig('/workspaces/ultraman/research_paper/images/circuit_schematic.pdf', 
-                bbox_inches='tight', facecolor='white')
+    outputs = save_figure(fig, 'circuit_schematic')
     print("Circuit schematic saved!")
+    return outputs
 
 if __name__ == "__main__":
+    figure_settings.parse_script_args(__doc__.strip().splitlines()[0])
     create_schematic()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo Accuracy Studies for the Test Result Charts
+
+Derives the curves of Figures accuracy_results and environmental_results
+by simulation instead of hand-entered numbers, for a chosen number of
+samples per burst N and outlier threshold sigma:
+
+    multishot   std. deviation of the filtered reading for N = 1..20
+                (measurement.simulate_durations noise model, millions of
+                bursts through the outlier/median pipeline)
+    rain        share of readings within TOLERANCE_CM of the truth at
+                each rain rate (echo_sim waveform model), per ping
+                (N = 1) by default as in the field tests
+    surface     the same for still to turbulent water surfaces
+
+Filtering a whole burst (--samples 15) rejects nearly every bad echo,
+so all conditions come out at 100%; a warning is printed when a study
+saturates like that.
+
+Each study is cut into shards that run in a process pool. Every shard
+draws from its own SeedSequence child of --seed, so results don't depend
+on the number of workers or the order shards finish in; shard results
+(count/mean/M2 moments, hit counts) are merged as they arrive.
+
+The results are written as the charts' datasets into --data-dir, which
+only needs the files it overrides, and --render then draws the charts
+from them:
+
+    python monte_carlo.py --sigma 2.5 --data-dir sites/malolos --render
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import numpy as np
+
+import figure_settings
+from datasets import write_csv
+from measurement import DEFAULT_SAMPLES, MULTISHOT_SAMPLES, simulate_durations, water_level
+from outlier_filter import DEFAULT_SIGMA
+
+CONDITION_SAMPLES = 1           # samples per reading for the rain and surface studies
+TOLERANCE_CM = 2.0
+SHARD_BURSTS = 50_000           # bursts per shard for the statistical model
+ECHO_SHARD_BURSTS = 500         # bursts per shard for the waveform model
+
+RAIN_CONDITIONS = [             # (chart label, rain rate mm/h, bar colour)
+    ('Clear', 0.0, 'green'),
+    ('Light Rain\n(2mm/hr)', 2.0, 'lightgreen'),
+    ('Moderate Rain\n(10mm/hr)', 10.0, 'yellow'),
+    ('Heavy Rain\n(25mm/hr)', 25.0, 'orange'),
+    ('Typhoon\n(50mm/hr)', 50.0, 'red'),
+]
+SURFACE_CONDITIONS = [          # (chart label, RMS surface height m)
+    ('Still Water', 0.0002),
+    ('Slow Flow\n(<0.5m/s)', 0.0005),
+    ('Moderate Flow\n(0.5-1m/s)', 0.001),
+    ('Fast Flow\n(>1m/s)', 0.002),
+    ('Turbulent', 0.003),
+]
+
+
+class Moments:
+    """Count, mean and sum of squared deviations, mergeable across shards"""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def of(cls, values):
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return cls()
+        mean = float(values.mean())
+        return cls(len(values), mean, float(np.sum((values - mean) ** 2)))
+
+    def merge(self, other):
+        """Combine with another shard (Chan et al. parallel update)"""
+        count = self.count + other.count
+        if not count:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        return self
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / self.count) if self.count else np.nan
+
+
+# -- shard workers (top level so the pool can pickle them) -------------------
+
+def _multishot_shard(seed, bursts, samples, sigma, noise_m, outlier_rate):
+    """Error moments (cm) of the filtered reading for each N"""
+    moments = {}
+    for n, child in zip(samples, seed.spawn(len(samples))):
+        durations, temperature, height, level = simulate_durations(
+            bursts, n, child, noise_m, outlier_rate)
+        error_cm = (water_level(durations, temperature, height, sigma) - level) * 100
+        moments[n] = Moments.of(error_cm)
+    return moments
+
+
+@lru_cache(maxsize=1)
+def _echo_simulator():
+    from echo_sim import EchoSimulator
+
+    return EchoSimulator()
+
+
+def _echo_shard(seed, bursts, samples, sigma, rain_mm_h, turbulence_m):
+    """(readings, readings within TOLERANCE_CM) for one condition"""
+    from echo_sim import simulate_bursts
+
+    durations, temperature, height, level = simulate_bursts(
+        bursts, samples, seed, rain_mm_h, turbulence_m, _echo_simulator())
+    error_cm = (water_level(durations, temperature, height, sigma) - level) * 100
+    return len(error_cm), int(np.sum(np.abs(error_cm) <= TOLERANCE_CM))
+
+
+# -- studies -----------------------------------------------------------------
+
+def _shards(total, shard_size):
+    sizes = [shard_size] * (total // shard_size)
+    if total % shard_size:
+        sizes.append(total % shard_size)
+    return sizes
+
+
+def run_shards(pool, tasks, merge, progress=None):
+    """Submit (func, args) tasks and merge(key, result) each as it completes"""
+    futures = {pool.submit(func, *args): key for key, func, args in tasks}
+    for done, future in enumerate(as_completed(futures), 1):
+        merge(futures[future], future.result())
+        if progress:
+            progress(done, len(futures))
+
+
+def multishot_study(pool, bursts, sigma=DEFAULT_SIGMA, seed=0, noise_m=0.015,
+                    outlier_rate=0.0, samples=MULTISHOT_SAMPLES, progress=None):
+    """{N: Moments of the reading error in cm} over `bursts` bursts per N"""
+    sizes = _shards(bursts, SHARD_BURSTS)
+    seeds = np.random.SeedSequence([seed, 1]).spawn(len(sizes))
+    totals = {n: Moments() for n in samples}
+
+    def merge(_, moments):
+        for n, m in moments.items():
+            totals[n].merge(m)
+
+    run_shards(pool, [(i, _multishot_shard, (s, size, samples, sigma, noise_m, outlier_rate))
+                      for i, (s, size) in enumerate(zip(seeds, sizes))], merge, progress)
+    return totals
+
+
+def condition_study(pool, conditions, bursts, samples=CONDITION_SAMPLES, sigma=DEFAULT_SIGMA,
+                    seed=0, progress=None):
+    """{condition: percent of readings within tolerance}; conditions map to (rain, turbulence)"""
+    sizes = _shards(bursts, ECHO_SHARD_BURSTS)
+    counts = {name: [0, 0] for name in conditions}
+    tasks = []
+    for c, (name, (rain, turbulence)) in enumerate(conditions.items()):
+        seeds = np.random.SeedSequence([seed, 2, c]).spawn(len(sizes))
+        tasks += [(name, _echo_shard, (s, size, samples, sigma, rain, turbulence))
+                  for s, size in zip(seeds, sizes)]
+
+    def merge(name, result):
+        counts[name][0] += result[0]
+        counts[name][1] += result[1]
+
+    run_shards(pool, tasks, merge, progress)
+    return {name: 100 * hits / total for name, (total, hits) in counts.items()}
+
+
+# -- datasets ----------------------------------------------------------------
+
+def write_datasets(directory, multishot=None, rain=None, surface=None):
+    """Write study results as the chart datasets in directory"""
+    directory.mkdir(parents=True, exist_ok=True)
+    if multishot is not None:
+        write_csv(directory / 'multishot_averaging.csv', ['samples', 'std_cm'],
+                   [(n, round(float(m.std), 3)) for n, m in multishot.items()])
+    if rain is not None:
+        write_csv(directory / 'rain_conditions.csv', ['condition', 'accuracy_pct', 'color'],
+                   [(label, round(rain[label], 1), color) for label, _, color in RAIN_CONDITIONS])
+    if surface is not None:
+        write_csv(directory / 'surface_types.csv', ['surface', 'success_rate_pct'],
+                   [(label, round(surface[label], 1)) for label, _ in SURFACE_CONDITIONS])
+
+
+def _progress(name):
+    if not sys.stdout.isatty():
+        return None
+
+    def report(done, total):
+        print(f'\r  {name}: {done}/{total} shards', end='\n' if done == total else '', flush=True)
+    return report
+
+
+def _print_conditions(study, percent, samples):
+    for label, value in percent.items():
+        print(f'  {label.replace(chr(10), " "):28s} {value:.1f}%')
+    if all(round(value, 1) == 100 for value in percent.values()):
+        print(f'warning: every {study} condition is at 100% with --samples {samples}, '
+              'so the chart shows no difference between them; --samples 1 gives '
+              'per-ping rates', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    figure_settings.add_output_arguments(parser)
+    parser.add_argument('--samples', type=int, default=CONDITION_SAMPLES,
+                        help='samples per reading for the rain and surface studies '
+                             f'(default: {CONDITION_SAMPLES}, single pings; a full burst is '
+                             f'{DEFAULT_SAMPLES})')
+    parser.add_argument('--sigma', type=float, default=DEFAULT_SIGMA, help='outlier threshold')
+    parser.add_argument('--bursts', type=int, default=1_000_000,
+                        help='bursts per N for the multi-shot study')
+    parser.add_argument('--echo-bursts', type=int, default=10_000,
+                        help='bursts per condition for the rain and surface studies')
+    parser.add_argument('--noise-cm', type=float, default=1.5, help='per-shot noise, multi-shot study')
+    parser.add_argument('--outlier-rate', type=float, default=0.0,
+                        help='spurious echo rate, multi-shot study')
+    parser.add_argument('--studies', default='multishot,rain,surface')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-j', '--jobs', type=int, default=None)
+    parser.add_argument('--render', action='store_true',
+                        help='redraw the accuracy and environmental charts from the results')
+    args = parser.parse_args()
+    if args.render and not args.data_dir:
+        parser.error('--render needs --data-dir to write the results to and draw them from')
+    figure_settings.apply_output_arguments(args)
+    studies = set(args.studies.split(','))
+
+    results = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs or os.cpu_count()) as pool:
+        if 'multishot' in studies:
+            results['multishot'] = multishot_study(
+                pool, args.bursts, args.sigma, args.seed, args.noise_cm / 100,
+                args.outlier_rate, progress=_progress('multishot'))
+            for n, m in results['multishot'].items():
+                print(f'  N = {n:2d}  std {m.std:.3f} cm  bias {m.mean:+.3f} cm  ({m.count} bursts)')
+        if 'rain' in studies:
+            conditions = {label: (rain, 0.0002) for label, rain, _ in RAIN_CONDITIONS}
+            results['rain'] = condition_study(pool, conditions, args.echo_bursts, args.samples,
+                                              args.sigma, args.seed, _progress('rain'))
+            _print_conditions('rain', results['rain'], args.samples)
+        if 'surface' in studies:
+            conditions = {label: (0.0, turbulence) for label, turbulence in SURFACE_CONDITIONS}
+            results['surface'] = condition_study(pool, conditions, args.echo_bursts, args.samples,
+                                                 args.sigma, args.seed, _progress('surface'))
+            _print_conditions('surface', results['surface'], args.samples)
+    print(f'studies done in {time.perf_counter() - start:.1f} s')
+
+    directory = figure_settings.data_dir()
+    if directory.resolve() == figure_settings.DEFAULT_DATA_DIR.resolve():
+        print('results not written: pass --data-dir to store them for a site')
+        return
+    write_datasets(directory, **results)
+    print(f'datasets written to {directory}')
+    if args.render:
+        from generate_charts import create_accuracy_chart, create_environmental_tests
+
+        create_accuracy_chart()
+        create_environmental_tests()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Batch 2-Sigma Outlier Rejection Kernel
+
+Pure-NumPy version of Algorithm alg:outlier (Figure flowchart_outlier)
+applied along one axis of an array, one burst per row by default:
+
+    mean, population std -> keep |x - mean| < sigma * std
+    -> upper median valid[n // 2] of the survivors
+
+Missing samples are NaN or masked (numpy.ma) and drop out of every
+reduction. When every burst in a batch keeps the same number of samples
+the median is a single-rank np.partition; otherwise the kernel sorts,
+which beats a multi-rank partition at burst widths. A burst whose
+samples are all identical (std = 0) keeps every sample; a burst with no
+valid samples yields NaN. filter_chunks() streams long or memory-mapped
+logs through the kernel a block of rows at a time.
+"""
+
+import numpy as np
+
+DEFAULT_SIGMA = 2.0
+DEFAULT_CHUNK_ROWS = 65536
+
+
+def _as_float(samples):
+    """Return samples as a float array with masked entries replaced by NaN"""
+    if np.ma.isMaskedArray(samples):
+        return samples.astype(float).filled(np.nan)
+    return np.asarray(samples, dtype=float)
+
+
+def outlier_mask(samples, sigma=DEFAULT_SIGMA, axis=-1):
+    """Return a boolean mask of the samples each burst keeps"""
+    samples = np.moveaxis(_as_float(samples), axis, -1)
+    finite = np.isfinite(samples)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if samples.shape[-1] and finite.all():
+            mean = samples.mean(axis=-1, keepdims=True)
+            deviation = samples - mean
+            std = np.sqrt(np.square(deviation).mean(axis=-1, keepdims=True))
+        else:
+            count = finite.sum(axis=-1, keepdims=True)
+            mean = np.where(finite, samples, 0.0).sum(axis=-1, keepdims=True) / count
+            deviation = np.where(finite, samples - mean, 0.0)
+            std = np.sqrt(np.square(deviation).sum(axis=-1, keepdims=True) / count)
+    keep = finite & ((np.abs(deviation) < sigma * std) | (std == 0))
+    return np.moveaxis(keep, -1, axis)
+
+
+def masked_median(samples, mask, axis=-1):
+    """Upper median valid[n // 2] of the masked samples in each burst; NaN if none"""
+    samples = np.moveaxis(_as_float(samples), axis, -1)
+    mask = np.moveaxis(np.asarray(mask, dtype=bool), axis, -1)
+    if samples.shape[-1] == 0:
+        return np.full(samples.shape[:-1], np.nan)
+    count = mask.sum(axis=-1)
+    rank = count // 2
+    # Rejected samples sort last, so rank n // 2 always lands on a survivor
+    values = np.where(mask, samples, np.inf)
+    if rank.size and rank.min() == rank.max():
+        kth = int(rank.flat[0])
+        return np.where(count > 0, np.partition(values, kth, axis=-1)[..., kth], np.nan)
+    # Ranks differ between bursts: a multi-kth partition is slower than
+    # NumPy's vectorized sort at burst widths, so sort instead
+    ordered = np.sort(values, axis=-1)
+    median = np.take_along_axis(ordered, rank[..., None], axis=-1)[..., 0]
+    return np.where(count > 0, median, np.nan)
+
+
+def reject_outliers(samples, sigma=DEFAULT_SIGMA, axis=-1):
+    """Return (median, keep mask, survivor count) for every burst along axis"""
+    samples = _as_float(samples)
+    keep = outlier_mask(samples, sigma, axis)
+    return masked_median(samples, keep, axis), keep, keep.sum(axis=axis)
+
+
+def burst_median(samples, sigma=DEFAULT_SIGMA, axis=-1):
+    """Filtered median of every burst along axis"""
+    samples = _as_float(samples)
+    return masked_median(samples, outlier_mask(samples, sigma, axis), axis)
+
+
+def filter_chunks(bursts, sigma=DEFAULT_SIGMA, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield the filtered medians of bursts one block of rows at a time
+
+    bursts is a 2-D array (including np.memmap, which is only paged in a
+    block at a time) or any iterable of 2-D row blocks.
+    """
+    blocks = bursts
+    if isinstance(bursts, np.ndarray):
+        blocks = (bursts[start:start + chunk_rows]
+                  for start in range(0, len(bursts), chunk_rows))
+    for block in blocks:
+        yield burst_median(block, sigma)
+
+
+def filter_stream(bursts, sigma=DEFAULT_SIGMA, chunk_rows=DEFAULT_CHUNK_ROWS, out=None):
+    """Filtered median of every row of a long 2-D array, computed in chunks"""
+    if out is None:
+        out = np.empty(len(bursts))
+    start = 0
+    for medians in filter_chunks(bursts, sigma, chunk_rows):
+        out[start:start + len(medians)] = medians
+        start += len(medians)
+    return out
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Cached Shape Geometry for the Diagram Scripts
+
+Symbol outlines (flowchart terminals, boxes and diamonds, rounded blocks,
+resistor zig-zags, op-amp triangles, sound-wave arcs) are built once as
+matplotlib Paths centred on the origin and cached. Drawing a symbol only
+places the cached vertices with an affine transform (scale, then
+translate, broadcast over any number of positions) and queues the result
+on the axes' ShapeBatch, so each style is drawn as one PathCollection
+and Bezier outlines such as ellipses and rounded corners stay exact.
+
+Shapes whose outline depends on their absolute size (rounded corners,
+a skew in data units) are cached per size instead of as a unit shape.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+import figure_settings
+from shape_batch import shape_batch
+mpatches = figure_settings.lazy_import('matplotlib.patches')
+mpath = figure_settings.lazy_import('matplotlib.path')
+
+
+def _closed(corners):
+    corners = np.asarray(corners, dtype=float)
+    return mpath.Path(np.vstack([corners, corners[:1]]), closed=True)
+
+
+@lru_cache(maxsize=None)
+def ellipse():
+    """Unit circle as four Bezier arcs; scale by the semi-axes"""
+    return mpath.Path.unit_circle()
+
+
+@lru_cache(maxsize=None)
+def diamond():
+    """Diamond with its corners on the unit axes"""
+    return _closed([(0, 1), (1, 0), (0, -1), (-1, 0)])
+
+
+@lru_cache(maxsize=None)
+def triangle():
+    """Op-amp triangle: a vertical base of height 2 at x = 0, apex at (1, 0)"""
+    return _closed([(0, -1), (0, 1), (1, 0)])
+
+
+@lru_cache(maxsize=None)
+def parallelogram(width, height, skew):
+    """Parallelogram whose top edge is shifted right by skew and bottom edge left"""
+    w, h = width / 2, height / 2
+    return _closed([(-w + skew, h), (w + skew, h), (w - skew, -h), (-w - skew, -h)])
+
+
+@lru_cache(maxsize=None)
+def rounded_box(width, height, pad):
+    """Outline of FancyBboxPatch(boxstyle='round,pad=...') for a width x height box"""
+    return mpatches.BoxStyle('round', pad=pad)(-width / 2, -height / 2, width, height, 1.0)
+
+
+@lru_cache(maxsize=None)
+def zigzag(zigs=6):
+    """Resistor zig-zag from (0, 0) to (1, 0) with peaks at +-1"""
+    steps = np.arange(zigs + 1)
+    offsets = np.where(steps % 2 == 1, 1.0, -1.0) * (steps > 0)
+    return mpath.Path(np.column_stack([steps / zigs, offsets]))
+
+
+@lru_cache(maxsize=None)
+def arc(theta1, theta2, points=49):
+    """Open arc of the unit circle between two angles in degrees"""
+    theta = np.radians(np.linspace(theta1, theta2, points))
+    return mpath.Path(np.column_stack([np.cos(theta), np.sin(theta)]))
+
+
+def place(unit, x, y, sx=1.0, sy=None, swap=False):
+    """Vertices of unit scaled by (sx, sy) and moved to each (x, y), shape (n, k, 2)
+
+    Every argument broadcasts; swap exchanges the unit's axes first, e.g.
+    to stand a horizontal symbol upright.
+    """
+    vertices = unit.vertices[:, ::-1] if swap else unit.vertices
+    x, y, sx, sy = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float))
+                                         for v in (x, y, sx, sx if sy is None else sy)))
+    scale = np.stack([sx, sy], axis=-1)[:, None, :]
+    offset = np.stack([x, y], axis=-1)[:, None, :]
+    return vertices[None, :, :] * scale + offset
+
+
+def draw_shapes(ax, unit, x, y, sx=1.0, sy=None, swap=False, **style):
+    """Queue unit placed at each (x, y) as closed, styled outlines (see place)"""
+    shape_batch(ax).paths(place(unit, x, y, sx, sy, swap), unit.codes, **style)
+
+
+def draw_strokes(ax, unit, x, y, sx=1.0, sy=None, swap=False, fmt='', **style):
+    """Queue unit placed at each (x, y) as polylines, with ax.plot style arguments"""
+    shape_batch(ax).segments(place(unit, x, y, sx, sy, swap), fmt, **style)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Opt-In Render Profiling for the create_* Figure Functions
+
+With --profile DIR (or $ULTRAMAN_PROFILE_DIR) every figure rendered by
+build_figures.py or a generate_*.py script is timed as a tree of frames:
+
+    create_*            the figure function; its self time is artist building
+    <helper>            functions and helper-class methods from the scripts
+                        directory that the figure module uses (draw_*,
+                        load_dataset, flush_shapes, save_figure, Flowchart...)
+    tight_layout        Figure.tight_layout
+    layout              Figure.draw_without_rendering (the layout pass of
+                        figure_export.tight_bbox)
+    tight_bbox          Figure.get_tightbbox
+    savefig:<fmt>       one backend pass; self time is encoding and writing
+    rasterize           the Agg canvas draw inside a raster savefig
+    draw:<type>         Artist.draw for each artist type, nested as drawn
+
+The instrumentation replaces those attributes for the duration of one
+figure and restores them afterwards, so unprofiled renders run the
+original code and the figure cache keys don't change.
+
+Each figure writes DIR/<figure>.folded, folded stacks of self time in
+microseconds (the input of flamegraph.pl, inferno and speedscope), and
+DIR/<figure>.json with phase totals, artist counts by type and the RSS
+at the start and peak of the render (the peak is reset per figure
+through /proc on Linux).
+"""
+
+import functools
+import inspect
+import json
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from figure_cache import is_local
+from figure_settings import profile_dir
+
+PHASES = ('tight_layout', 'layout', 'tight_bbox', 'rasterize')
+
+
+def reset_peak_rss():
+    """Start a new peak-RSS measurement; returns False where the OS can't"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def rss_mb(field='VmRSS'):
+    """VmRSS or VmHWM (peak) of this process from /proc, in MB; None elsewhere"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class RenderProfile:
+    """Frame timings and artist counts of one figure render"""
+
+    def __init__(self, name):
+        self.name = name
+        self.self_time = defaultdict(float)     # stack of frame names -> s
+        self.inclusive = defaultdict(float)     # frame name -> s, outermost calls only
+        self.artists = Counter()
+        self._names = []
+        self._frames = []
+
+    def enter(self, frame):
+        self._names.append(frame)
+        self._frames.append([time.perf_counter(), 0.0])
+
+    def exit(self):
+        start, children = self._frames.pop()
+        elapsed = time.perf_counter() - start
+        stack = tuple(self._names)
+        frame = self._names.pop()
+        self.self_time[stack] += elapsed - children
+        if self._frames:
+            self._frames[-1][1] += elapsed
+        if frame not in self._names:
+            self.inclusive[frame] += elapsed
+
+    def count_artists(self, fig):
+        if not self.artists:
+            self.artists.update(type(a).__name__ for a in fig.findobj())
+
+    def folded(self):
+        """Folded-stack lines: 'frame;frame;frame microseconds'"""
+        return [f"{';'.join(stack)} {round(seconds * 1e6)}"
+                for stack, seconds in sorted(self.self_time.items()) if seconds > 0]
+
+    def phases(self):
+        """Seconds per render phase; build is everything before and around the export"""
+        total = self.inclusive.get(self.name, 0.0)
+        phases = {'build': total - self.inclusive.get('save_figure', 0.0)
+                  - self.inclusive.get('tight_layout', 0.0)}
+        for frame, seconds in self.inclusive.items():
+            if frame in PHASES or frame.startswith('savefig:'):
+                phases[frame] = seconds
+        return total, phases
+
+
+class _Patches:
+    """Attribute replacements that can be undone in reverse order"""
+
+    def __init__(self):
+        self._undo = []
+
+    def replace(self, owner, attr, value):
+        own = attr in vars(owner)
+        self._undo.append((owner, attr, vars(owner).get(attr), own))
+        setattr(owner, attr, value)
+
+    def restore(self):
+        for owner, attr, original, own in reversed(self._undo):
+            if own:
+                setattr(owner, attr, original)
+            else:
+                delattr(owner, attr)
+        self._undo.clear()
+
+
+def _timed(profile, frame, func):
+    """Wrap func so each call is a frame; frame may be a function of the call's arguments"""
+    name = frame if isinstance(frame, str) else None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile.enter(name or frame(args, kwargs))
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.exit()
+    return wrapper
+
+
+def _savefig_frame(args, kwargs):
+    fmt = kwargs.get('format')
+    if fmt is None and len(args) > 1 and isinstance(args[1], str):
+        fmt = args[1].rsplit('.', 1)[-1]
+    return f'savefig:{fmt or "png"}'
+
+
+def _instrument_helpers(profile, patches, module):
+    """Time the local functions and helper-class methods the figure module uses"""
+    for name, value in list(vars(module).items()):
+        if not is_local(value) or name.startswith('create_'):
+            continue
+        if inspect.isfunction(value):
+            patches.replace(module, name, _timed(profile, name, value))
+            continue
+        for attr, method in list(vars(value).items()):
+            if inspect.isfunction(method) and not attr.startswith('__'):
+                patches.replace(value, attr, _timed(profile, f'{value.__name__}.{attr}', method))
+
+
+def _instrument_draws(profile, patches, fig, patched):
+    """Time Artist.draw of every artist type in fig, at the class defining it"""
+    for artist in fig.findobj():
+        owner = next((c for c in type(artist).__mro__ if 'draw' in vars(c)), None)
+        if owner is None or owner in patched:
+            continue
+        patched.add(owner)
+        patches.replace(owner, 'draw', _timed(
+            profile, lambda args, kwargs: f'draw:{type(args[0]).__name__}', vars(owner)['draw']))
+
+
+def _instrument_matplotlib(profile, patches):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    patched = set()
+
+    def prepare(func):
+        # Artist types are only known once the figure is built
+        @functools.wraps(func)
+        def wrapper(fig, *args, **kwargs):
+            profile.count_artists(fig)
+            _instrument_draws(profile, patches, fig, patched)
+            return func(fig, *args, **kwargs)
+        return wrapper
+
+    patches.replace(Figure, 'tight_layout', _timed(profile, 'tight_layout', Figure.tight_layout))
+    patches.replace(Figure, 'draw_without_rendering', prepare(_timed(
+        profile, 'layout', Figure.draw_without_rendering)))
+    patches.replace(Figure, 'get_tightbbox', _timed(profile, 'tight_bbox', Figure.get_tightbbox))
+    patches.replace(Figure, 'savefig', prepare(_timed(profile, _savefig_frame, Figure.savefig)))
+    patches.replace(FigureCanvasAgg, 'draw', _timed(profile, 'rasterize', FigureCanvasAgg.draw))
+
+
+@contextmanager
+def profiling(name, module, directory=None):
+    """Profile the figure rendered inside the with-block and write its traces"""
+    directory = directory or profile_dir()
+    profile = RenderProfile(name)
+    patches = _Patches()
+    _instrument_helpers(profile, patches, module)
+    _instrument_matplotlib(profile, patches)
+    peak_reset = reset_peak_rss()
+    rss_start = rss_mb()
+    profile.enter(name)
+    try:
+        yield profile
+    finally:
+        profile.exit()
+        patches.restore()
+        peak = rss_mb('VmHWM') if peak_reset else None
+        if directory is not None:
+            write_profile(profile, directory, rss_start, peak)
+
+
+def write_profile(profile, directory, rss_start=None, rss_peak=None):
+    """Write <name>.folded and <name>.json for one figure"""
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f'{profile.name}.folded').write_text('\n'.join(profile.folded()) + '\n')
+    total, phases = profile.phases()
+    summary = {
+        'figure': profile.name,
+        'total_s': total,
+        'phases_s': phases,
+        'frames_s': dict(sorted(profile.inclusive.items(), key=lambda item: -item[1])),
+        'artists': dict(profile.artists.most_common()),
+        'artist_count': sum(profile.artists.values()),
+        'rss_start_mb': rss_start,
+        'rss_peak_mb': rss_peak,
+    }
+    with open(directory / f'{profile.name}.json', 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+        f.write('\n')
+
+
+def install(module):
+    """Profile every create_* function of module when it is called (standalone scripts)"""
+    for name, func in list(vars(module).items()):
+        if name.startswith('create_') and inspect.isfunction(func):
+            setattr(module, name, _profiled(name, func, module))
+
+
+def _profiled(name, func, module):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profiling(name, module):
+            return func(*args, **kwargs)
+    return wrapper
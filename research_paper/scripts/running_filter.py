@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Streaming 2-Sigma Outlier Filter for Continuous Echo Streams
+
+RunningOutlierFilter keeps the last N distance samples of one sensor and
+returns the same filtered median as outlier_filter.burst_median() would
+for that window, but updates incrementally instead of recomputing mean,
+std and a sorted median for every burst:
+
+    - mean and variance use Welford's update, run forwards for the new
+      sample and backwards for the one leaving the window, O(1)
+    - the window is also held in an indexable skiplist, O(log N) to
+      insert, remove or look up a rank
+    - the survivors |x - mean| < 2 sigma form a contiguous run of ranks,
+      found with two rank searches; their upper median is one more
+      lookup, O(log N)
+
+FilterBank holds one filter per station for a gateway serving many
+sensors.
+"""
+
+import math
+import random
+from collections import deque
+
+import numpy as np
+
+from outlier_filter import DEFAULT_SIGMA
+
+DEFAULT_WINDOW = 15
+RESYNC_INTERVAL = 4096
+
+
+class _Node:
+    __slots__ = ('value', 'next', 'width')
+
+    def __init__(self, value, next, width):
+        self.value = value
+        self.next = next
+        self.width = width
+
+
+_TAIL = _Node(math.inf, [], [])
+
+
+class IndexableSkiplist:
+    """Sorted multiset with O(log n) insert, remove, rank and index lookup
+
+    Values must be finite floats; +inf is reserved for the tail sentinel.
+    """
+
+    def __init__(self, expected_size=DEFAULT_WINDOW, seed=None):
+        self.size = 0
+        self.levels = max(1, int(1 + math.log2(max(expected_size, 2))))
+        self.head = _Node(None, [_TAIL] * self.levels, [1] * self.levels)
+        self._random = random.Random(seed)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError('skiplist index out of range')
+        node = self.head
+        index += 1
+        for level in reversed(range(self.levels)):
+            while node.width[level] <= index:
+                index -= node.width[level]
+                node = node.next[level]
+        return node.value
+
+    def __iter__(self):
+        node = self.head.next[0]
+        while node is not _TAIL:
+            yield node.value
+            node = node.next[0]
+
+    def rank(self, value, inclusive=False):
+        """Number of stored values < value (or <= value if inclusive)"""
+        node = self.head
+        count = 0
+        for level in reversed(range(self.levels)):
+            while (node.next[level].value <= value if inclusive
+                   else node.next[level].value < value):
+                count += node.width[level]
+                node = node.next[level]
+        return count
+
+    def insert(self, value):
+        chain = [None] * self.levels
+        steps_at_level = [0] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].value <= value:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        height = min(self.levels, 1 - int(math.log2(1.0 - self._random.random())))
+        new = _Node(value, [None] * height, [None] * height)
+        steps = 0
+        for level in range(height):
+            previous = chain[level]
+            new.next[level] = previous.next[level]
+            previous.next[level] = new
+            new.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(height, self.levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value):
+        chain = [None] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target.value != value:
+            raise KeyError(value)
+
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), self.levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+
+class RunningOutlierFilter:
+    """Sliding-window 2-sigma filtered median of one sensor's echo distances"""
+
+    def __init__(self, window=DEFAULT_WINDOW, sigma=DEFAULT_SIGMA, seed=None):
+        if window < 1:
+            raise ValueError('window must hold at least one sample')
+        self.window = window
+        self.sigma = sigma
+        self.samples = deque()
+        self.sorted = IndexableSkiplist(window, seed)
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._updates = 0
+
+    def __len__(self):
+        return len(self.samples)
+
+    @property
+    def std(self):
+        """Population standard deviation of the window"""
+        n = len(self.samples)
+        return math.sqrt(max(self._m2, 0.0) / n) if n else math.nan
+
+    def _add(self, x):
+        self.samples.append(x)
+        self.sorted.insert(x)
+        delta = x - self.mean
+        self.mean += delta / len(self.samples)
+        self._m2 += delta * (x - self.mean)
+
+    def _drop_oldest(self):
+        x = self.samples.popleft()
+        self.sorted.remove(x)
+        n = len(self.samples)
+        if n == 0:
+            self.mean = self._m2 = 0.0
+            return
+        delta = x - self.mean
+        self.mean -= delta / n
+        self._m2 -= delta * (x - self.mean)
+
+    def _resync(self):
+        """Recompute mean and M2 exactly to shed accumulated rounding error"""
+        window = np.fromiter(self.samples, dtype=float, count=len(self.samples))
+        self.mean = float(window.mean()) if len(window) else 0.0
+        self._m2 = float(np.square(window - self.mean).sum())
+
+    def update(self, x):
+        """Add one echo distance and return the current filtered median
+
+        Missing echoes (NaN or inf) leave the window unchanged.
+        """
+        if math.isfinite(x):
+            if len(self.samples) == self.window:
+                self._drop_oldest()
+            self._add(float(x))
+            self._updates += 1
+            if self._updates % RESYNC_INTERVAL == 0:
+                self._resync()
+        return self.median()
+
+    def median(self):
+        """Upper median of the window samples within sigma * std of the mean; NaN if none"""
+        n = len(self.samples)
+        if n == 0:
+            return math.nan
+        spread = self.sigma * self.std
+        if spread == 0:
+            return self.sorted[n // 2]
+        low = self.sorted.rank(self.mean - spread, inclusive=True)
+        high = self.sorted.rank(self.mean + spread)
+        if high <= low:
+            return math.nan         # as burst_median: no sample survives
+        return self.sorted[low + (high - low) // 2]
+
+
+class FilterBank:
+    """One RunningOutlierFilter per station, indexed 0..stations-1"""
+
+    def __init__(self, stations, window=DEFAULT_WINDOW, sigma=DEFAULT_SIGMA, seed=0):
+        self.filters = [RunningOutlierFilter(window, sigma, seed=seed + i)
+                        for i in range(stations)]
+
+    def __len__(self):
+        return len(self.filters)
+
+    def update(self, station, x):
+        return self.filters[station].update(x)
+
+    def update_many(self, stations, values):
+        """Feed (station, distance) pairs in arrival order; return each new median"""
+        filters = self.filters
+        return np.array([filters[s].update(x)
+                         for s, x in zip(np.asarray(stations).tolist(),
+                                         np.asarray(values, dtype=float).tolist())])
+
+    def medians(self):
+        """Current filtered median of every station"""
+        return np.array([f.median() for f in self.filters])
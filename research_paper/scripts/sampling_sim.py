@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Discrete-Event Simulator for the Adaptive Sampling Scheduler
+
+Runs the policy of Figure flowchart_adaptive / Table tab:sampling_rates
+against flood hydrographs for a whole fleet of stations in one process:
+
+    level > CRITICAL (80%)        -> next sample in 10 s
+    level > WARNING (50%)         -> 30 s
+    rise faster than 5 cm/min     -> 60 s
+    otherwise                     -> 300 s
+
+Each station's hydrograph is piecewise linear (synthetic flood events,
+or recorded levels on a time grid). A heapq event queue visits stations
+only when they are due to sample, so the cost scales with the number of
+samples taken, not with simulated seconds times stations. The report
+covers samples per station, alert latency (first sample above CRITICAL
+minus the true crossing time), energy use and the gateway message rate.
+"""
+
+import argparse
+import heapq
+import time
+from bisect import bisect_right
+
+import numpy as np
+
+CRITICAL_LEVEL = 0.8            # fraction of capacity
+WARNING_LEVEL = 0.5
+RAPID_RISE_CM_PER_MIN = 5.0
+CRITICAL_INTERVAL = 10          # seconds
+WARNING_INTERVAL = 30
+RAPID_RISE_INTERVAL = 60
+NORMAL_INTERVAL = 300
+
+# Fitted to the measured averages of 5 mW at 5-minute and 45 mW at
+# 10-second intervals: P = SLEEP_POWER + SAMPLE_ENERGY / interval
+SAMPLE_ENERGY_J = 40e-3 / (1 / CRITICAL_INTERVAL - 1 / NORMAL_INTERVAL)
+SLEEP_POWER_W = 5e-3 - SAMPLE_ENERGY_J / NORMAL_INTERVAL
+
+
+def adaptive_interval(fraction, rise_cm_per_min):
+    """Next sampling interval (s) for a level fraction and rise rate"""
+    if fraction > CRITICAL_LEVEL:
+        return CRITICAL_INTERVAL
+    if fraction > WARNING_LEVEL:
+        return WARNING_INTERVAL
+    if rise_cm_per_min > RAPID_RISE_CM_PER_MIN:
+        return RAPID_RISE_INTERVAL
+    return NORMAL_INTERVAL
+
+
+def adaptive_intervals(fraction, rise_cm_per_min):
+    """Vectorized adaptive_interval() over arrays of readings"""
+    fraction = np.asarray(fraction, dtype=float)
+    rise = np.asarray(rise_cm_per_min, dtype=float)
+    return np.select([fraction > CRITICAL_LEVEL, fraction > WARNING_LEVEL,
+                      rise > RAPID_RISE_CM_PER_MIN],
+                     [CRITICAL_INTERVAL, WARNING_INTERVAL, RAPID_RISE_INTERVAL],
+                     NORMAL_INTERVAL)
+
+
+def fixed_interval(seconds):
+    """Policy that ignores the readings and samples every `seconds`"""
+    return lambda fraction, rise_cm_per_min: seconds
+
+
+class Hydrographs:
+    """Piecewise-linear water level (m) per station
+
+    times and levels are (stations, k) breakpoint arrays with times
+    increasing along each row; capacity is the level (m) of 100%.
+    Levels hold their end values outside the breakpoints.
+    """
+
+    def __init__(self, times, levels, capacity):
+        self.levels = np.asarray(levels, dtype=float)
+        self.times = np.broadcast_to(np.asarray(times, dtype=float), self.levels.shape)
+        self.capacity = np.broadcast_to(np.asarray(capacity, dtype=float), self.levels.shape[:1])
+        # Plain lists make the per-event lookups in the event loop cheap
+        self._times = self.times.tolist()
+        self._levels = self.levels.tolist()
+
+    def __len__(self):
+        return len(self.levels)
+
+    @classmethod
+    def recorded(cls, times, levels, capacity):
+        """Hydrographs from levels sampled on one shared time grid"""
+        return cls(times, levels, capacity)
+
+    def level(self, station, t):
+        """Water level (m) of one station at time t"""
+        times, levels = self._times[station], self._levels[station]
+        i = bisect_right(times, t)
+        if i == 0:
+            return levels[0]
+        if i == len(times):
+            return levels[-1]
+        t0, t1 = times[i - 1], times[i]
+        return levels[i - 1] + (levels[i] - levels[i - 1]) * (t - t0) / (t1 - t0)
+
+    def crossing_times(self, fraction):
+        """First time each station rises above fraction of capacity (NaN if never)"""
+        threshold = (fraction * self.capacity)[:, None]
+        above = self.levels > threshold
+        first = np.argmax(above, axis=1)
+        crosses = above.any(axis=1)
+        rows = np.arange(len(self))
+        previous = np.maximum(first - 1, 0)
+        t0, t1 = self.times[rows, previous], self.times[rows, first]
+        l0, l1 = self.levels[rows, previous], self.levels[rows, first]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.where(l1 > l0, t0 + (threshold[:, 0] - l0) * (t1 - t0) / (l1 - l0), t1)
+        t = np.where(first == 0, self.times[:, 0], t)
+        return np.where(crosses, t, np.nan)
+
+
+def synthetic_hydrographs(stations, duration_s=86400, flood_fraction=0.5, seed=0):
+    """Random flood events: baseline, linear rise, crest, slower recession"""
+    rng = np.random.default_rng(seed)
+    capacity = rng.uniform(1.0, 3.0, stations)
+    base = rng.uniform(0.05, 0.3, stations) * capacity
+    flooded = rng.random(stations) < flood_fraction
+    peak = np.where(flooded, rng.uniform(0.4, 1.05, stations) * capacity, base)
+    rise_rate = rng.uniform(0.5, 15.0, stations) / 6000.0       # m/s from cm/min
+    start = rng.uniform(0.0, 0.6 * duration_s, stations)
+    crest = start + (peak - base) / rise_rate
+    hold = rng.uniform(0.0, 7200.0, stations)
+    recede = crest + hold + (peak - base) / (0.3 * rise_rate)
+    times = np.column_stack([np.zeros(stations), start, crest, crest + hold,
+                             np.maximum(recede, crest + hold + 1.0)])
+    levels = np.column_stack([base, base, peak, peak, base])
+    return Hydrographs(times, levels, capacity)
+
+
+class SimulationResult:
+    """Per-station sample counts, energy and alert latency from simulate()"""
+
+    def __init__(self, samples, energy_j, alert_time, crossing_time, duration_s, load,
+                 activity=None, activity_step_s=None):
+        self.samples = samples
+        self.energy_j = energy_j
+        self.alert_time = alert_time
+        self.crossing_time = crossing_time
+        self.duration_s = duration_s
+        # Messages reaching the gateway in each minute of the run
+        self.load = load
+        # Samples per (time step, station), if simulate() was asked to record them
+        self.activity = activity
+        self.activity_step_s = activity_step_s
+
+    @property
+    def alert_latency(self):
+        return self.alert_time - self.crossing_time
+
+    @property
+    def missed_alerts(self):
+        """Stations that crossed CRITICAL but were never sampled above it"""
+        return int((np.isfinite(self.crossing_time) & np.isnan(self.alert_time)).sum())
+
+    def summary(self):
+        latency = self.alert_latency[np.isfinite(self.alert_latency)]
+        power_mw = self.energy_j / self.duration_s * 1e3
+        return {
+            'stations': len(self.samples),
+            'samples': int(self.samples.sum()),
+            'samples_per_station_mean': float(self.samples.mean()),
+            'samples_per_station_max': int(self.samples.max()),
+            'alerts': len(latency),
+            'missed_alerts': self.missed_alerts,
+            'alert_latency_mean_s': float(latency.mean()) if len(latency) else None,
+            'alert_latency_p95_s': float(np.percentile(latency, 95)) if len(latency) else None,
+            'alert_latency_max_s': float(latency.max()) if len(latency) else None,
+            'energy_total_j': float(self.energy_j.sum()),
+            'average_power_mw_mean': float(power_mw.mean()),
+            'average_power_mw_max': float(power_mw.max()),
+            'gateway_peak_per_minute': int(self.load.max()),
+            'gateway_mean_per_minute': float(self.load.mean()),
+        }
+
+
+def simulate(hydrographs, duration_s=86400, policy=adaptive_interval, seed=0,
+             activity_step_s=None):
+    """Run the sampling policy for every station until duration_s
+
+    With activity_step_s, samples are also counted per time step and
+    station (for the battery model in energy.py).
+    """
+    stations = len(hydrographs)
+    rng = np.random.default_rng(seed)
+    capacity = hydrographs.capacity.tolist()
+    level = hydrographs.level
+
+    samples = [0] * stations
+    previous = [None] * stations
+    alert_time = [np.nan] * stations
+    load = [0] * (int(duration_s // 60) + 1)
+    activity = None
+    if activity_step_s:
+        activity = np.zeros((int(np.ceil(duration_s / activity_step_s)), stations), dtype=np.int32)
+
+    # Stations boot at random offsets within one normal interval
+    queue = list(zip(rng.uniform(0, NORMAL_INTERVAL, stations).tolist(), range(stations)))
+    heapq.heapify(queue)
+    pop, push = heapq.heappop, heapq.heappush
+    while queue:
+        t, s = pop(queue)
+        if t >= duration_s:
+            continue
+        h = level(s, t)
+        fraction = h / capacity[s]
+        last = previous[s]
+        rise = (h - last[1]) * 6000.0 / (t - last[0]) if last else 0.0
+        previous[s] = (t, h)
+        samples[s] += 1
+        load[int(t // 60)] += 1
+        if activity is not None:
+            activity[int(t // activity_step_s), s] += 1
+        if fraction > CRITICAL_LEVEL and alert_time[s] != alert_time[s]:
+            alert_time[s] = t
+        push(queue, (t + policy(fraction, rise), s))
+
+    samples = np.array(samples)
+    energy_j = samples * SAMPLE_ENERGY_J + SLEEP_POWER_W * duration_s
+    return SimulationResult(samples, energy_j, np.array(alert_time),
+                            hydrographs.crossing_times(CRITICAL_LEVEL),
+                            duration_s, np.array(load), activity, activity_step_s)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--stations', type=int, default=10_000)
+    parser.add_argument('--hours', type=float, default=24.0)
+    parser.add_argument('--flood-fraction', type=float, default=0.5)
+    parser.add_argument('--fixed', type=float, default=None,
+                        help='compare against a fixed sampling interval (s)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    duration = args.hours * 3600
+    hydrographs = synthetic_hydrographs(args.stations, duration, args.flood_fraction, args.seed)
+    policy = fixed_interval(args.fixed) if args.fixed else adaptive_interval
+    start = time.perf_counter()
+    result = simulate(hydrographs, duration, policy, args.seed)
+    elapsed = time.perf_counter() - start
+
+    for key, value in result.summary().items():
+        print(f'{key:28s} {value:.2f}' if isinstance(value, float) else f'{key:28s} {value}')
+    print(f'{"simulated in":28s} {elapsed:.2f} s '
+          f'({result.samples.sum() / elapsed / 1e6:.2f} M events/s)')
+
+
+if __name__ == "__main__":
+    main()
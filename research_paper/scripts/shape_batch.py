@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Batched Drawing Primitives
+
+Drawing helpers queue geometry here as NumPy arrays instead of adding one
+patch or Line2D per shape. flush_shapes() turns each style's queued
+geometry into a single collection, so the artist count (and draw time)
+scales with the number of distinct styles rather than the number of
+pins, pads, traces or symbols. Symbol outlines are cached and placed by
+primitives.py.
+"""
+
+import weakref
+from collections import defaultdict
+
+import numpy as np
+
+import figure_settings
+mcollections = figure_settings.lazy_import('matplotlib.collections')
+mpath = figure_settings.lazy_import('matplotlib.path')
+
+_FMT_COLORS = {'b': 'blue', 'g': 'green', 'r': 'red', 'c': 'cyan', 'm': 'magenta',
+               'y': 'yellow', 'k': 'black', 'w': 'white'}
+_FMT_LINESTYLES = ('--', '-.', '-', ':')
+
+_batches = weakref.WeakKeyDictionary()
+
+
+def _style_key(style):
+    return tuple(sorted(style.items()))
+
+
+def _parse_fmt(fmt):
+    """Translate a plot format string such as 'k-' or 'b--' into line style kwargs"""
+    style = {}
+    for linestyle in _FMT_LINESTYLES:
+        if linestyle in fmt:
+            style['linestyle'] = linestyle
+            fmt = fmt.replace(linestyle, '')
+            break
+    if fmt:
+        style['color'] = _FMT_COLORS.get(fmt, fmt)
+    return style
+
+
+def _patch_style(style):
+    """Map Patch keyword arguments onto their collection equivalents"""
+    style = dict(style)
+    if not style.pop('fill', True):
+        style['facecolor'] = 'none'
+    return style
+
+
+def _line_style(fmt, style):
+    """Map ax.plot arguments onto LineCollection keyword arguments"""
+    style = {**_parse_fmt(fmt), **style}
+    if 'solid_capstyle' in style:
+        style['capstyle'] = style.pop('solid_capstyle')
+    # Line2D draws solid lines with projecting caps; collections default to butt
+    style.setdefault('capstyle', 'projecting' if style.get('linestyle', '-') == '-' else 'butt')
+    return style
+
+
+class ShapeBatch:
+    """Per-axes queue of shapes, grouped by style and drawn as collections"""
+
+    def __init__(self, ax):
+        self.ax = ax
+        self._polygons = defaultdict(list)
+        self._paths = defaultdict(list)
+        self._circles = defaultdict(list)
+        self._lines = defaultdict(list)
+
+    def polygons(self, vertices, **style):
+        """Queue closed polygons given as an (n, k, 2) array or a list of (k, 2) arrays"""
+        self._polygons[_style_key(_patch_style(style))].extend(vertices)
+
+    def paths(self, vertices, codes=None, **style):
+        """Queue outlines sharing one set of Path codes, vertices shaped (n, k, 2)"""
+        self._paths[_style_key(_patch_style(style))].extend(mpath.Path(v, codes) for v in vertices)
+
+    def rectangles(self, x, y, width, height, **style):
+        """Queue axis-aligned rectangles; every argument broadcasts over arrays"""
+        x, y, width, height = np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(v, dtype=float)) for v in (x, y, width, height)))
+        corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=float)
+        origin = np.stack([x, y], axis=-1)[:, None, :]
+        size = np.stack([width, height], axis=-1)[:, None, :]
+        self.polygons(origin + corners[None, :, :] * size, **style)
+
+    def circles(self, x, y, radius, **style):
+        """Queue circles in data units; every argument broadcasts over arrays"""
+        x, y, radius = np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(v, dtype=float)) for v in (x, y, radius)))
+        self._circles[_style_key(_patch_style(style))].append(np.stack([x, y, radius], axis=-1))
+
+    def line(self, xs, ys, fmt='', **style):
+        """Queue one polyline, accepting the same arguments as ax.plot"""
+        key = _style_key(_line_style(fmt, style))
+        self._lines[key].append(np.column_stack([xs, ys]).astype(float))
+
+    def segments(self, segments, fmt='', **style):
+        """Queue many polylines of equal length given as an (n, k, 2) array"""
+        key = _style_key(_line_style(fmt, style))
+        self._lines[key].extend(np.asarray(segments, dtype=float))
+
+    def flush(self):
+        """Add one collection per queued style to the axes and clear the queue"""
+        ax = self.ax
+        for key, vertices in self._polygons.items():
+            ax.add_collection(mcollections.PolyCollection(vertices, **dict(key)), autolim=False)
+        for key, paths in self._paths.items():
+            ax.add_collection(mcollections.PathCollection(paths, **dict(key)), autolim=False)
+        for key, chunks in self._circles.items():
+            circles = np.concatenate(chunks)
+            ax.add_collection(mcollections.EllipseCollection(
+                2 * circles[:, 2], 2 * circles[:, 2], np.zeros(len(circles)),
+                units='xy', offsets=circles[:, :2], offset_transform=ax.transData,
+                **dict(key)), autolim=False)
+        for key, lines in self._lines.items():
+            ax.add_collection(mcollections.LineCollection(lines, **dict(key)), autolim=False)
+        self._polygons.clear()
+        self._paths.clear()
+        self._circles.clear()
+        self._lines.clear()
+
+
+def shape_batch(ax):
+    """Return the shared ShapeBatch for ax, creating it on first use"""
+    batch = _batches.get(ax)
+    if batch is None:
+        batch = _batches[ax] = ShapeBatch(ax)
+    return batch
+
+
+def flush_shapes(*axes):
+    """Draw everything queued for the given axes"""
+    for ax in axes:
+        batch = _batches.get(ax)
+        if batch is not None:
+            batch.flush()
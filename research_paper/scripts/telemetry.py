@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Binary Telemetry Log for Raw Echo Bursts
+
+Fixed-size records, one per measurement burst, appended to a .ulog file
+and read back zero-copy through np.memmap:
+
+    time         float64   seconds since the Unix epoch
+    station      uint32
+    temperature  int16     raw DS18B20 reading, 1/16 °C per count
+    humidity     uint8     %RH (255 = not measured)
+    flags        uint8
+    durations    uint16[N] round-trip echo times in µs, 0 = no echo
+
+A 512-byte header holds a magic number and the JSON metadata (format
+version, N, record dtype). A sidecar .tidx file gets one entry per
+block of INDEX_BLOCK records: (first record, min time, max time). Both
+files are append-only, and a torn final record from an interrupted
+write is ignored on open, so a crash never corrupts earlier data.
+
+The measurement pipeline consumes logs through TelemetryLog.bursts(),
+and datasets.load_dataset() opens .ulog files as named columns.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b'ULTRALOG'
+FORMAT_VERSION = 1
+HEADER_SIZE = 512
+INDEX_BLOCK = 4096
+INDEX_SUFFIX = '.tidx'
+NO_ECHO = 0
+NO_HUMIDITY = 255
+
+INDEX_DTYPE = np.dtype([('first', '<u8'), ('t_min', '<f8'), ('t_max', '<f8')])
+
+
+def record_dtype(samples=15):
+    """Packed structured dtype of one burst record with `samples` echoes"""
+    return np.dtype([('time', '<f8'), ('station', '<u4'), ('temperature', '<i2'),
+                     ('humidity', 'u1'), ('flags', 'u1'), ('durations', '<u2', (samples,))])
+
+
+def index_path(path):
+    return Path(str(path) + INDEX_SUFFIX)
+
+
+def _read_header(f):
+    raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE or raw[:8] != MAGIC:
+        raise ValueError(f'{getattr(f, "name", "log")} is not a telemetry log')
+    length = int.from_bytes(raw[8:12], 'little')
+    meta = json.loads(raw[12:12 + length].decode('utf-8'))
+    if meta['version'] > FORMAT_VERSION:
+        raise ValueError(f'telemetry log version {meta["version"]} is newer than this reader')
+    return meta
+
+
+def _header_bytes(samples):
+    meta = json.dumps({'version': FORMAT_VERSION, 'samples': samples,
+                       'dtype': record_dtype(samples).descr}).encode('utf-8')
+    if 12 + len(meta) > HEADER_SIZE:
+        raise ValueError('telemetry header metadata too large')
+    return (MAGIC + len(meta).to_bytes(4, 'little') + meta).ljust(HEADER_SIZE, b'\0')
+
+
+def encode_bursts(time, station, durations_us, temperature_c, humidity=None, flags=0):
+    """Pack burst arrays into records; NaN durations become NO_ECHO"""
+    durations_us = np.atleast_2d(np.asarray(durations_us, dtype=float))
+    records = np.zeros(len(durations_us), dtype=record_dtype(durations_us.shape[1]))
+    records['time'] = time
+    records['station'] = station
+    records['temperature'] = np.rint(np.asarray(temperature_c, dtype=float) * 16)
+    records['humidity'] = NO_HUMIDITY if humidity is None else np.rint(humidity)
+    records['flags'] = flags
+    records['durations'] = np.where(np.isfinite(durations_us),
+                                    np.clip(np.rint(durations_us), 1, 65535), NO_ECHO)
+    return records
+
+
+class TelemetryWriter:
+    """Append-only writer; reopening an existing log continues it"""
+
+    def __init__(self, path, samples=15):
+        self.path = Path(path)
+        if self.path.exists() and self.path.stat().st_size >= HEADER_SIZE:
+            with open(self.path, 'rb') as f:
+                samples = _read_header(f)['samples']
+            self.dtype = record_dtype(samples)
+            self._truncate_torn_record()
+        else:
+            self.dtype = record_dtype(samples)
+            with open(self.path, 'wb') as f:
+                f.write(_header_bytes(samples))
+            index_path(self.path).write_bytes(b'')
+        self.samples = samples
+        self.count = (self.path.stat().st_size - HEADER_SIZE) // self.dtype.itemsize
+        self._file = open(self.path, 'ab')
+        self._index = open(index_path(self.path), 'ab')
+        self._indexed = self._truncate_index()
+        self._index_pending()
+
+    def _truncate_torn_record(self):
+        size = self.path.stat().st_size
+        whole = HEADER_SIZE + (size - HEADER_SIZE) // self.dtype.itemsize * self.dtype.itemsize
+        if whole != size:
+            os.truncate(self.path, whole)
+
+    def _truncate_index(self):
+        """Cut the index to whole entries for complete blocks; returns the entry count"""
+        path = index_path(self.path)
+        size = os.path.getsize(path)
+        entries = min(size // INDEX_DTYPE.itemsize, self.count // INDEX_BLOCK)
+        if entries * INDEX_DTYPE.itemsize != size:
+            os.truncate(path, entries * INDEX_DTYPE.itemsize)
+        return entries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, records):
+        """Append an array of records (see record_dtype/encode_bursts)"""
+        records = np.asarray(records)
+        if records.dtype != self.dtype:
+            records = records.astype(self.dtype)
+        self._file.write(records.tobytes())
+        self.count += len(records)
+        # Index entries can only cover flushed records
+        if self.count // INDEX_BLOCK > self._indexed:
+            self._file.flush()
+            self._index_pending()
+
+    def _index_pending(self):
+        """Write index entries for every completed block not yet indexed"""
+        complete = self.count // INDEX_BLOCK
+        if complete <= self._indexed:
+            return
+        records = _map_records(self.path, self.dtype, complete * INDEX_BLOCK)
+        times = records['time'][self._indexed * INDEX_BLOCK:].reshape(-1, INDEX_BLOCK)
+        entries = np.empty(len(times), dtype=INDEX_DTYPE)
+        entries['first'] = (self._indexed + np.arange(len(times))) * INDEX_BLOCK
+        entries['t_min'] = times.min(axis=1)
+        entries['t_max'] = times.max(axis=1)
+        self._index.write(entries.tobytes())
+        self._index.flush()
+        self._indexed = complete
+
+    def flush(self):
+        self._file.flush()
+        self._index.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            self._index.close()
+
+
+def _map_records(path, dtype, count=None):
+    size = os.path.getsize(path)
+    available = (size - HEADER_SIZE) // dtype.itemsize
+    count = available if count is None else min(count, available)
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+
+class TelemetryLog:
+    """Read-only, memory-mapped view of a telemetry log"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self.meta = _read_header(f)
+        self.samples = self.meta['samples']
+        self.dtype = record_dtype(self.samples)
+        self.records = _map_records(self.path, self.dtype)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        """Sidecar block index, with the unindexed tail summarised on the fly"""
+        path = index_path(self.path)
+        blocks = len(self.records) // INDEX_BLOCK
+        entries = np.zeros(0, dtype=INDEX_DTYPE)
+        if path.exists():
+            entries = np.fromfile(path, dtype=INDEX_DTYPE,
+                                  count=os.path.getsize(path) // INDEX_DTYPE.itemsize)[:blocks]
+        if len(entries) < blocks:
+            # Index missing or behind (e.g. copied without its sidecar): rebuild it
+            times = self.records['time'][:blocks * INDEX_BLOCK].reshape(-1, INDEX_BLOCK)
+            entries = np.empty(blocks, dtype=INDEX_DTYPE)
+            entries['first'] = np.arange(blocks) * INDEX_BLOCK
+            entries['t_min'] = times.min(axis=1)
+            entries['t_max'] = times.max(axis=1)
+        tail = self.records['time'][blocks * INDEX_BLOCK:]
+        if len(tail):
+            entries = np.append(entries, np.array(
+                [(blocks * INDEX_BLOCK, tail.min(), tail.max())], dtype=INDEX_DTYPE))
+        return entries
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, key):
+        return self.records[key]
+
+    @property
+    def temperature_c(self):
+        return self.records['temperature'] * (1 / 16)
+
+    def bursts(self, records=None):
+        """Return (durations_us with NaN for missing echoes, temperature_c) for records"""
+        records = self.records if records is None else records
+        durations = records['durations'].astype(float)
+        durations[durations == NO_ECHO] = np.nan
+        return durations, records['temperature'] * (1 / 16)
+
+    def iter_bursts(self, chunk_rows=65536):
+        """Yield (records, durations_us, temperature_c) a block of records at a time"""
+        for start in range(0, len(self.records), chunk_rows):
+            chunk = self.records[start:start + chunk_rows]
+            yield (chunk,) + self.bursts(chunk)
+
+    def water_levels(self, sensor_height, sigma=None, chunk_rows=65536):
+        """Run the measurement pipeline over every burst; sensor_height may be per station"""
+        from measurement import water_level
+        from outlier_filter import DEFAULT_SIGMA
+
+        sigma = DEFAULT_SIGMA if sigma is None else sigma
+        heights = np.asarray(sensor_height, dtype=float)
+        levels = np.empty(len(self.records))
+        start = 0
+        for chunk, durations, temperature in self.iter_bursts(chunk_rows):
+            height = heights[chunk['station']] if heights.ndim else heights
+            levels[start:start + len(chunk)] = water_level(durations, temperature, height, sigma)
+            start += len(chunk)
+        return levels
+
+
+def open_log(path):
+    return TelemetryLog(path)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Time and Station Queries over Telemetry Logs
+
+Answers "station X from t0 to t1" against an archive of .ulog files
+without scanning them:
+
+    - files whose sidecar block index says they end before t0 or start
+      after t1 are never opened past their header
+    - inside a file, the (first record, min time, max time) block index
+      narrows the search to the blocks overlapping [t0, t1); if those
+      blocks are in time order a binary search over them gives a
+      contiguous range, returned as a zero-copy memmap slice
+    - per-station lookups use a station index sidecar (<log>.sidx.npz):
+      record numbers grouped by station and ordered by time, so a
+      station-day is two binary searches and a gather of only the
+      matching records
+
+The station index is built on first use and rebuilt whenever the log
+has grown; it is read from the sidecar beside the log on later opens.
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+
+from telemetry import TelemetryLog, record_dtype
+
+STATION_INDEX_SUFFIX = '.sidx.npz'
+
+
+class LogIndex:
+    """Time and station index over one telemetry log"""
+
+    def __init__(self, log):
+        self.log = log if isinstance(log, TelemetryLog) else TelemetryLog(log)
+        self.blocks = self.log.index
+        self._station = None
+
+    @property
+    def t_min(self):
+        return float(self.blocks['t_min'].min()) if len(self.blocks) else np.inf
+
+    @property
+    def t_max(self):
+        return float(self.blocks['t_max'].max()) if len(self.blocks) else -np.inf
+
+    def _block_rows(self, t0, t1):
+        """Record ranges (start, stop) of the blocks that can hold [t0, t1)"""
+        hit = np.flatnonzero((self.blocks['t_max'] >= t0) & (self.blocks['t_min'] < t1))
+        starts = self.blocks['first'][hit].astype(np.intp)
+        stops = np.append(self.blocks['first'][1:], len(self.log))[hit].astype(np.intp)
+        return starts, stops
+
+    def time_range(self, t0, t1):
+        """Records with t0 <= time < t1: a zero-copy slice if the log is time-sorted"""
+        starts, stops = self._block_rows(t0, t1)
+        if len(starts) == 0:
+            return self.log.records[0:0]
+        times = self.log.records['time']
+        lo, hi = starts[0], stops[-1]
+        window = times[lo:hi]
+        # Every match lies in [lo, hi), so a sorted window can be bisected
+        if np.all(window[1:] >= window[:-1]):
+            return self.log.records[lo + np.searchsorted(window, t0, 'left'):
+                                    lo + np.searchsorted(window, t1, 'left')]
+        rows = np.concatenate([np.arange(a, b) for a, b in zip(starts, stops)])
+        rows = rows[(times[rows] >= t0) & (times[rows] < t1)]
+        return self.log.records[rows]
+
+    def station_rows(self, station, t0=-np.inf, t1=np.inf):
+        """Record numbers of one station with t0 <= time < t1, in time order"""
+        index = self.station_index
+        k = np.searchsorted(index['stations'], station)
+        if k == len(index['stations']) or index['stations'][k] != station:
+            return np.zeros(0, dtype=np.intp)
+        lo, hi = int(index['offsets'][k]), int(index['offsets'][k + 1])
+        times = index['times'][lo:hi]
+        a = lo + np.searchsorted(times, t0, 'left')
+        b = lo + np.searchsorted(times, t1, 'left')
+        return np.asarray(index['positions'][a:b], dtype=np.intp)
+
+    def station_range(self, station, t0=-np.inf, t1=np.inf):
+        """Records of one station with t0 <= time < t1, in time order"""
+        return self.log.records[self.station_rows(station, t0, t1)]
+
+    @property
+    def station_index(self):
+        if self._station is None:
+            self._station = self._load_station_index()
+        return self._station
+
+    def _load_station_index(self):
+        path = Path(str(self.log.path) + STATION_INDEX_SUFFIX)
+        if path.exists():
+            index = _read_station_index(path)
+            if int(index['count'][0]) == len(self.log):
+                return index
+        return build_station_index(self.log, path)
+
+
+def _read_station_index(path):
+    with np.load(path, allow_pickle=False) as archive:
+        return {name: archive[name] for name in archive.files}
+
+
+def build_station_index(log, path):
+    """Write the station index sidecar for log and return it opened"""
+    records = log.records
+    times = np.asarray(records['time'])
+    stations = np.asarray(records['station'])
+    order = np.lexsort((times, stations))
+    grouped = stations[order]
+    ids, starts = np.unique(grouped, return_index=True)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp.npz')
+    np.savez(tmp, count=np.array([len(records)]),
+             stations=ids, offsets=np.append(starts, len(order)),
+             positions=order, times=times[order])
+    os.replace(tmp, path)
+    return _read_station_index(path)
+
+
+class TelemetryArchive:
+    """Queries across a set of telemetry logs, e.g. one file per day"""
+
+    def __init__(self, paths):
+        if isinstance(paths, (str, Path)):
+            # A directory of logs, or a single log file
+            paths = sorted(Path(paths).glob('*.ulog')) if Path(paths).is_dir() else [paths]
+        self.logs = [LogIndex(p) for p in paths]
+
+    def _overlapping(self, t0, t1):
+        return [log for log in self.logs if log.t_max >= t0 and log.t_min < t1]
+
+    def iter_query(self, t0, t1, station=None):
+        """Yield each file's matching records (zero-copy where the file allows)"""
+        for log in self._overlapping(t0, t1):
+            chunk = (log.time_range(t0, t1) if station is None
+                     else log.station_range(station, t0, t1))
+            if len(chunk):
+                yield chunk
+
+    def query(self, t0, t1, station=None):
+        """All matching records across the archive as one array"""
+        chunks = list(self.iter_query(t0, t1, station))
+        if len(chunks) == 1:
+            return chunks[0]
+        if not chunks:
+            dtype = self.logs[0].log.dtype if self.logs else record_dtype()
+            return np.zeros(0, dtype=dtype)
+        return np.concatenate(chunks)
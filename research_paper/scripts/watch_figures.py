@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Watch the Figure Sources and Re-Render Changed Figures
+
+A long-lived build_figures process for editing sessions. It loads
+matplotlib, NumPy, the fonts and every figure script once, builds what
+is stale, then waits for changes to the scripts directory and the data
+directories (--data-dir and research_paper/data). After each change the
+edited scripts, and every script that imports them, are reloaded in
+place and only the figures whose cache key changed are rendered, in
+this process, so a save turns into an updated image in the time of that
+one figure's render. Edits to watch_figures.py and build_figures.py
+themselves need a restart.
+
+Changes are read from inotify on Linux and by polling modification
+times elsewhere (or with --poll). Editors save in several steps, so
+events are collected until the sources have been quiet for DEBOUNCE_S.
+Hidden files and directories are ignored, which covers the datasets
+column caches and editor swap files.
+
+After a rebuild that wrote files, --exec runs a command from
+research_paper with the written paths in $ULTRAMAN_UPDATED, e.g. to
+rebuild the paper:
+
+    python watch_figures.py --formats png --exec 'latexmk -pdf main.tex'
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import importlib
+import os
+import select
+import shlex
+import struct
+import subprocess
+import sys
+import time
+import traceback
+
+import figure_settings
+from build_figures import (SCRIPTS_DIR, build_stale, discover_figures, reload_changed, report,
+                           select_figures, script_mtimes)
+
+DEBOUNCE_S = 0.05
+POLL_INTERVAL_S = 0.25
+UPDATED_ENV = 'ULTRAMAN_UPDATED'
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _ignored(path):
+    return path.name.startswith('.') or path.name.endswith(('~', '.tmp', '.swp'))
+
+
+def _source_dirs(data_dirs):
+    """(directory, recursive) pairs to watch"""
+    dirs = [(SCRIPTS_DIR, False)]
+    for directory in data_dirs:
+        if directory.is_dir() and directory not in [d for d, _ in dirs]:
+            dirs.append((directory, True))
+    return dirs
+
+
+def _walk(directory, recursive):
+    """directory and, if recursive, its non-hidden subdirectories"""
+    yield directory
+    if recursive:
+        try:
+            children = sorted(directory.iterdir())
+        except OSError:
+            return              # removed since it was listed
+        for child in children:
+            if child.is_dir() and not _ignored(child):
+                yield from _walk(child, True)
+
+
+class InotifyWatcher:
+    """Changed paths under the source directories, from inotify through ctypes"""
+
+    def __init__(self, dirs):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._dirs = {}                 # watch descriptor -> (directory, recursive)
+        for directory, recursive in dirs:
+            for path in _walk(directory, recursive):
+                self._add(path, recursive)
+
+    def _add(self, directory, recursive):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(directory))
+        self._dirs[wd] = (directory, recursive)
+
+    def _read(self, timeout):
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return set()
+        try:
+            buffer = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if wd not in self._dirs or not name:
+                continue
+            directory, recursive = self._dirs[wd]
+            path = directory / os.fsdecode(name)
+            if _ignored(path):
+                continue
+            if mask & IN_ISDIR:
+                if recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    for sub in _walk(path, True):
+                        try:
+                            self._add(sub, True)
+                        except OSError:
+                            pass        # deleted again before it could be watched
+                continue
+            changed.add(path)
+        return changed
+
+    def changes(self):
+        """Block until sources change; returns the changed paths"""
+        changed = set()
+        while not changed:
+            changed = self._read(None)
+        while True:
+            more = self._read(DEBOUNCE_S)
+            if not more:
+                return changed
+            changed |= more
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Changed paths under the source directories, by comparing modification times"""
+
+    def __init__(self, dirs):
+        self._dirs = dirs
+        self._state = self._scan()
+
+    def _scan(self):
+        state = {}
+        for directory, recursive in self._dirs:
+            for path in _walk(directory, recursive):
+                for child in path.iterdir():
+                    if child.is_file() and not _ignored(child):
+                        stat = child.stat()
+                        state[child] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def changes(self):
+        """Block until sources change; returns the changed paths"""
+        while True:
+            time.sleep(POLL_INTERVAL_S)
+            state = self._scan()
+            changed = {path for path in state.keys() | self._state.keys()
+                       if state.get(path) != self._state.get(path)}
+            self._state = state
+            if changed:
+                return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(dirs, poll=False):
+    """An inotify watcher, or a polling one where inotify isn't available"""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(dirs)
+        except (OSError, AttributeError) as error:
+            print(f'inotify unavailable ({error}), polling instead', file=sys.stderr)
+    return PollingWatcher(dirs)
+
+
+def warm_up(figures):
+    """Import the figure scripts and pyplot and draw some text, so fonts are loaded"""
+    import matplotlib.pyplot as plt
+
+    for module_name in sorted({module_name for module_name, _ in figures}):
+        importlib.import_module(module_name)
+    fig, ax = plt.subplots()
+    ax.set_title('warm-up $x^2$')
+    ax.plot([0, 1])
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def notify(command, results):
+    """Run command with the paths written by results in $ULTRAMAN_UPDATED"""
+    written = [path for _, _, outputs, error in results if not error for path in outputs]
+    if not command or not written:
+        return
+    env = dict(os.environ, **{UPDATED_ENV: ' '.join(shlex.quote(str(p)) for p in written)})
+    subprocess.run(command, shell=True, cwd=SCRIPTS_DIR.parent, env=env)
+
+
+def rebuild(names, mtimes, command):
+    """Reload edited scripts and render the stale figures; returns the new mtimes"""
+    try:
+        mtimes = reload_changed(mtimes)
+        results, _, total = build_stale(select_figures(names, discover_figures()))
+    except Exception:
+        # e.g. a script saved mid-edit; it is reloaded again on the next change
+        traceback.print_exc()
+        return mtimes
+    for func_name, elapsed, outputs, error in results:
+        if error:
+            print(f'{func_name} failed:\n{error}', file=sys.stderr)
+        else:
+            print(f'{func_name}: {elapsed:.2f} s')
+    if not results:
+        print(f'nothing to render ({total:.2f} s)')
+    sys.stdout.flush()
+    notify(command, results)
+    return mtimes
+
+
+def watch(names=(), force=False, command=None, poll=False):
+    """Build, then rebuild after every change until interrupted"""
+    figures = select_figures(names)
+    warm_up(figures)
+    mtimes = script_mtimes()
+    results, up_to_date, total = build_stale(figures, force, jobs=1)
+    report(results, up_to_date, total)
+    notify(command, results)
+
+    data_dirs = [figure_settings.data_dir().resolve(), figure_settings.DEFAULT_DATA_DIR.resolve()]
+    watcher = open_watcher(_source_dirs(data_dirs), poll)
+    print(f'watching {SCRIPTS_DIR} and {", ".join(map(str, data_dirs))} '
+          f'({type(watcher).__name__})', flush=True)
+    try:
+        while True:
+            # Only the Python files of the scripts directory are sources
+            changed = {path for path in watcher.changes()
+                       if path.parent != SCRIPTS_DIR or path.suffix == '.py'}
+            if not changed:
+                continue
+            print(f"changed: {', '.join(sorted(p.name for p in changed))}", flush=True)
+            mtimes = rebuild(names, mtimes, command)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        watcher.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('figures', nargs='*',
+                        help='create_* function names to keep up to date (default: all)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='render every figure once at startup, ignoring the build cache')
+    parser.add_argument('--exec', dest='command', default=None,
+                        help='shell command to run from research_paper after figures are written')
+    parser.add_argument('--poll', action='store_true',
+                        help='poll modification times instead of using inotify')
+    figure_settings.add_output_arguments(parser)
+    args = parser.parse_args(argv)
+    figure_settings.apply_output_arguments(args)
+    try:
+        select_figures(args.figures)
+    except ValueError as error:
+        parser.error(str(error))
+    return watch(args.figures, args.force, args.command, args.poll)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+Shared Test Fixtures
+
+Puts the scripts directory on sys.path, as running a script from it
+does, and provides scratch copies of the tree for tests that edit
+sources.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+RESEARCH_DIR = Path(__file__).resolve().parent.parent
+SCRIPTS_DIR = RESEARCH_DIR / 'scripts'
+
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+
+@pytest.fixture
+def scripts_copy(tmp_path):
+    """A scratch copy of research_paper/scripts (and data) that a test may edit"""
+    root = tmp_path / 'research_paper'
+    shutil.copytree(SCRIPTS_DIR, root / 'scripts', ignore=shutil.ignore_patterns('__pycache__'))
+    shutil.copytree(RESEARCH_DIR / 'data', root / 'data')
+    return root / 'scripts'
+
+
+@pytest.fixture
+def run_python():
+    """Run code in a fresh interpreter from a scripts directory; returns its stdout"""
+    def run(scripts_dir, code, *args, **env):
+        result = subprocess.run([sys.executable, '-c', textwrap.dedent(code), *map(str, args)],
+                                cwd=scripts_dir, capture_output=True, text=True,
+                                env=dict(os.environ, MPLBACKEND='Agg', **env))
+        assert result.returncode == 0, result.stderr
+        return result.stdout
+    return run
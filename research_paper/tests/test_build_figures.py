@@ -0,0 +1,51 @@
+"""Warm rebuilds after a script edit must match a cold build of the edited tree"""
+
+# Makes flush_shapes draw nothing; shape_batch is imported by primitives
+# and flowchart_layout, not only by the generate_* scripts
+EDIT_SHAPE_BATCH = '''
+import os
+path = build_figures.SCRIPTS_DIR / 'shape_batch.py'
+header = 'def flush_shapes(*axes):\\n    """Draw everything queued for the given axes"""\\n'
+source = path.read_text()
+assert header in source
+path.write_text(source.replace(header, header + '    return\\n'))
+stat = path.stat()
+os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+'''
+
+WARM_BUILD = '''
+import sys
+import figure_settings
+figure_settings.set_images_dir(sys.argv[1])
+import build_figures
+figures = build_figures.select_figures(['create_main_flowchart'])
+mtimes = build_figures.script_mtimes()
+results, _, _ = build_figures.build_stale(figures, jobs=1)
+assert results and not results[0][3], results
+''' + EDIT_SHAPE_BATCH
+
+
+def cold_build(run_python, scripts_dir, output_dir):
+    return run_python(scripts_dir, '''
+        import sys
+        import build_figures
+        sys.exit(build_figures.main(['create_main_flowchart', '-o', sys.argv[1]]))
+        ''', output_dir, FIGURE_FORMATS='png')
+
+
+def test_reload_picks_up_nested_helper_edit(scripts_copy, run_python, tmp_path):
+    warm, cold = tmp_path / 'warm', tmp_path / 'cold'
+    run_python(scripts_copy, WARM_BUILD + '''
+mtimes = build_figures.reload_changed(mtimes)
+import flowchart_layout, primitives, shape_batch
+assert flowchart_layout.flush_shapes is shape_batch.flush_shapes
+assert primitives.shape_batch is shape_batch.shape_batch
+results, up_to_date, _ = build_figures.build_stale(figures, jobs=1)
+assert not up_to_date and not results[0][3], results
+''', warm, FIGURE_FORMATS='png')
+    cold_build(run_python, scripts_copy, cold)
+
+    image = 'flowchart_main.png'
+    assert (warm / image).read_bytes() == (cold / image).read_bytes()
+    # The key the warm process recorded is the one a cold build computes
+    assert 'create_main_flowchart: up to date' in cold_build(run_python, scripts_copy, warm)
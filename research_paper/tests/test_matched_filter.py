@@ -0,0 +1,26 @@
+"""Echo detection on captures too short to hold an echo"""
+
+import numpy as np
+import pytest
+
+from echo_sim import EchoSimulator
+from matched_filter import NOMINAL_SPEED, MatchedFilter
+
+
+@pytest.fixture(scope='module')
+def detector():
+    return MatchedFilter()
+
+
+@pytest.mark.parametrize('length', [0, 1, 5, 100])
+def test_short_capture_is_nan(detector, length):
+    assert np.isnan(detector.detect(np.zeros((3, length)))).all()
+    assert np.isnan(detector.detect(np.zeros(length))).all()
+
+
+def test_detects_clear_echo(detector):
+    simulator = EchoSimulator()
+    distance = np.array([0.5, 1.5, 3.0])
+    signal, true_us = simulator.capture(distance, 25.0, rng=np.random.default_rng(0))
+    tolerance_us = 2e6 * 0.02 / NOMINAL_SPEED      # within 2 cm
+    assert np.all(np.abs(detector.detect(signal) - true_us) < tolerance_us)
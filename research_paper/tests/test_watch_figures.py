@@ -0,0 +1,23 @@
+"""A save seen by the watcher re-renders with the new code of nested helpers"""
+
+from test_build_figures import WARM_BUILD, cold_build
+
+
+def test_watch_rebuild_after_shape_batch_save(scripts_copy, run_python, tmp_path):
+    warm, cold = tmp_path / 'warm', tmp_path / 'cold'
+    # The watcher is opened before the save, as watch() does after its first build
+    run_python(scripts_copy, WARM_BUILD.replace('mtimes = build_figures.script_mtimes()', '''
+mtimes = build_figures.script_mtimes()
+import watch_figures
+watcher = watch_figures.open_watcher(watch_figures._source_dirs([]))
+''') + '''
+changed = watcher.changes()
+watcher.close()
+assert path in changed, changed
+watch_figures.rebuild(['create_main_flowchart'], mtimes, None)
+''', warm, FIGURE_FORMATS='png')
+    cold_build(run_python, scripts_copy, cold)
+
+    image = 'flowchart_main.png'
+    assert (warm / image).read_bytes() == (cold / image).read_bytes()
+    assert 'create_main_flowchart: up to date' in cold_build(run_python, scripts_copy, warm)